@@ -0,0 +1,218 @@
+import itertools
+import os
+import re
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from typing import Any, Dict, List, Sequence, Set, Tuple
+
+import psycopg2
+import psycopg2.errors
+import psycopg2.extensions
+
+import instrument
+
+POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '4'))
+POOL_IDLE_TIMEOUT = float(os.environ.get('DB_POOL_IDLE_TIMEOUT', '300'))
+POOL_HEALTHCHECK_INTERVAL = float(os.environ.get('DB_POOL_HEALTHCHECK_INTERVAL', '30'))
+POOL_ACQUIRE_TIMEOUT = float(os.environ.get('DB_POOL_ACQUIRE_TIMEOUT', '10'))
+# Off behind a transaction-mode pooler, where session-level PREPARE can't be relied on
+PREPARED_STATEMENTS = os.environ.get('DB_PREPARED_STATEMENTS', '1') == '1'
+
+# Latest db_migrations/V<N> version the handlers rely on
+SCHEMA_VERSION = 24
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class SchemaError(Exception):
+    pass
+
+
+class ConnectionPool:
+    """
+    Connection pool that lives for the lifetime of a warm function container.
+    Idle connections are health-checked before reuse, evicted after
+    POOL_IDLE_TIMEOUT seconds, and broken ones are replaced transparently.
+    """
+
+    def __init__(self, dsn: str, max_size: int = POOL_MAX_SIZE,
+                 idle_timeout: float = POOL_IDLE_TIMEOUT,
+                 healthcheck_interval: float = POOL_HEALTHCHECK_INTERVAL):
+        self.dsn = dsn
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.healthcheck_interval = healthcheck_interval
+        self._idle: List[Tuple[Any, float]] = []
+        self._in_use = 0
+        self._cond = threading.Condition()
+        self.schema_version = None
+
+    def acquire(self, timeout: float = POOL_ACQUIRE_TIMEOUT):
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._evict_idle()
+            while not self._idle and self._in_use >= self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeout('Database pool exhausted')
+                self._cond.wait(remaining)
+                self._evict_idle()
+            conn, last_used = self._idle.pop() if self._idle else (None, 0.0)
+            self._in_use += 1
+
+        try:
+            if conn is not None and not self._is_healthy(conn, last_used):
+                self._close_quietly(conn)
+                conn = None
+            if conn is None:
+                conn = psycopg2.connect(self.dsn, cursor_factory=instrument.Cursor)
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        return conn
+
+    def release(self, conn, discard: bool = False) -> None:
+        if not discard and not conn.closed:
+            try:
+                status = conn.get_transaction_status()
+                if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                    discard = True
+                elif status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                discard = True
+
+        with self._cond:
+            self._in_use -= 1
+            if discard or conn.closed:
+                self._close_quietly(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        discard = False
+        try:
+            if self.schema_version is None:
+                self._check_schema(conn)
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            discard = True
+            raise
+        finally:
+            self.release(conn, discard=discard)
+
+    def close_all(self) -> None:
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._close_quietly(conn)
+
+    def _check_schema(self, conn) -> None:
+        """
+        Runs once per process: DDL lives in db_migrations, so requests only
+        verify that the expected migrations have been applied.
+        """
+        try:
+            with conn.cursor() as cur:
+                cur.execute('SELECT MAX(version) FROM schema_version')
+                version = cur.fetchone()[0] or 0
+        except psycopg2.errors.UndefinedTable:
+            version = 0
+        conn.rollback()
+        if version < SCHEMA_VERSION:
+            raise SchemaError(
+                f'Database schema is at version {version}, expected {SCHEMA_VERSION}; apply db_migrations'
+            )
+        self.schema_version = version
+
+    def _evict_idle(self) -> None:
+        now = time.monotonic()
+        fresh = []
+        for conn, last_used in self._idle:
+            if now - last_used > self.idle_timeout or conn.closed:
+                self._close_quietly(conn)
+            else:
+                fresh.append((conn, last_used))
+        self._idle = fresh
+
+    def _is_healthy(self, conn, last_used: float) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - last_used < self.healthcheck_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute('SELECT 1')
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    @staticmethod
+    def _close_quietly(conn) -> None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(dsn: str) -> ConnectionPool:
+    pool = _pools.get(dsn)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(dsn)
+            if pool is None:
+                pool = ConnectionPool(dsn)
+                _pools[dsn] = pool
+    return pool
+
+
+def connection(dsn: str):
+    return get_pool(dsn).connection()
+
+
+# name -> (text for cur.execute, text for PREPARE with $n, parameter count)
+_statements: Dict[str, Tuple[str, str, int]] = {}
+# connection -> names already prepared in its session
+_prepared: 'weakref.WeakKeyDictionary[Any, Set[str]]' = weakref.WeakKeyDictionary()
+_prepared_lock = threading.Lock()
+_PLACEHOLDER = re.compile(r'%s')
+
+
+def prepare(name: str, sql: str) -> str:
+    """
+    Registers a hot-path statement, written with %s placeholders like any
+    cur.execute call. execute() sends PREPARE on the first use per pooled
+    connection and only EXECUTE with the parameters after that, so Postgres
+    skips parsing and planning on every call.
+    """
+    numbers = itertools.count(1)
+    server_sql = _PLACEHOLDER.sub(lambda _: f'${next(numbers)}', sql)
+    _statements[name] = (sql, server_sql, next(numbers) - 1)
+    return name
+
+
+def execute(cur, name: str, args: Sequence[Any] = ()) -> None:
+    sql, server_sql, count = _statements[name]
+    if not PREPARED_STATEMENTS:
+        cur.execute(sql, args)
+        return
+    with _prepared_lock:
+        prepared = _prepared.setdefault(cur.connection, set())
+    if name not in prepared:
+        cur.execute(f'PREPARE {name} AS {server_sql}')
+        prepared.add(name)
+    cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * count)})" if count else f'EXECUTE {name}', args)
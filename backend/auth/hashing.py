@@ -0,0 +1,94 @@
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+import bcrypt
+
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', '12'))
+HASH_WORKERS = int(os.environ.get('HASH_WORKERS', str(os.cpu_count() or 1)))
+HASH_QUEUE_LIMIT = int(os.environ.get('HASH_QUEUE_LIMIT', str(HASH_WORKERS * 4)))
+HASH_TIMEOUT = float(os.environ.get('HASH_TIMEOUT', '10'))
+
+
+class HashingBusy(Exception):
+    """
+    Raised instead of queueing when HASH_QUEUE_LIMIT jobs are already
+    pending, and when a job times out or the worker pool has crashed.
+    """
+
+
+_executor: Optional[Executor] = None
+_pending = 0
+_lock = threading.Lock()
+
+
+def _hash(password: bytes, rounds: int) -> bytes:
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+
+def _check(password: bytes, hashed: bytes) -> bool:
+    return bcrypt.checkpw(password, hashed)
+
+
+def _get_executor() -> Executor:
+    global _executor
+    if _executor is None:
+        try:
+            _executor = ProcessPoolExecutor(max_workers=HASH_WORKERS)
+        except (OSError, NotImplementedError):
+            # Sandboxes without /dev/shm or fork; bcrypt releases the GIL,
+            # so threads still keep the request thread free.
+            _executor = ThreadPoolExecutor(max_workers=HASH_WORKERS)
+    return _executor
+
+
+def _reset_executor(broken: Executor) -> None:
+    global _executor
+    with _lock:
+        if _executor is not broken:
+            return
+        _executor = None
+    broken.shutdown(wait=False)
+
+
+def _run(fn, *args):
+    global _pending
+    with _lock:
+        if _pending >= HASH_QUEUE_LIMIT:
+            raise HashingBusy()
+        _pending += 1
+    try:
+        executor = _get_executor()
+        return executor.submit(fn, *args).result(timeout=HASH_TIMEOUT)
+    except FutureTimeout:
+        raise HashingBusy()
+    except BrokenProcessPool:
+        # A worker died (e.g. OOM-killed); the pool is unusable from now on, so replace it
+        _reset_executor(executor)
+        raise HashingBusy()
+    finally:
+        with _lock:
+            _pending -= 1
+
+
+def hash_password(password: str) -> str:
+    return _run(_hash, password.encode('utf-8'), BCRYPT_ROUNDS).decode('utf-8')
+
+
+def check_password(password: str, hashed: str) -> bool:
+    return _run(_check, password.encode('utf-8'), hashed.encode('utf-8'))
+
+
+def hash_rounds(hashed: str) -> int:
+    # $2b$12$<salt+hash>
+    try:
+        return int(hashed.split('$')[2])
+    except (IndexError, ValueError):
+        return 0
+
+
+def needs_rehash(hashed: str) -> bool:
+    return hash_rounds(hashed) != BCRYPT_ROUNDS
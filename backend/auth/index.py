@@ -1,8 +1,12 @@
 import json
 import os
 import re
-import bcrypt
 import psycopg2
+import db
+import hashing
+import instrument
+import ratelimit
+import tokens
 from typing import Dict, Any
 
 def handler(event, context):
@@ -33,15 +37,37 @@ def handler(event, context):
         'Access-Control-Allow-Origin': '*'
     }
     
+    request = instrument.begin(context, 'auth', 'auth', method)
+    return instrument.finish(request, dispatch(event, method, cors_headers))
+
+def dispatch(event: Dict[str, Any], method: str, cors_headers: Dict[str, str]) -> Dict[str, Any]:
     if method == 'POST':
         try:
             body_data = json.loads(event.get('body', '{}'))
             action = body_data.get('action', 'register')
+            instrument.current().resource = action
             
-            if action == 'register':
-                return register_user(body_data, cors_headers)
-            elif action == 'login':
-                return login_user(body_data, cors_headers)
+            if action in ('register', 'login'):
+                # Shed abusive clients before any lookup or bcrypt work
+                retry_after = ratelimit.check(event, action, body_data)
+                if retry_after or not ratelimit.admit(event):
+                    return {
+                        'statusCode': 429,
+                        'headers': {**cors_headers, 'Retry-After': str(retry_after or 1)},
+                        'body': json.dumps({'error': 'Слишком много попыток, попробуйте позже'}),
+                        'isBase64Encoded': False
+                    }
+                try:
+                    if action == 'register':
+                        return register_user(body_data, cors_headers)
+                    response = login_user(body_data, cors_headers)
+                    if response['statusCode'] == 401:
+                        ratelimit.record_failure(event)
+                    return response
+                finally:
+                    ratelimit.release(event)
+            elif action == 'logout':
+                return logout_user(event, cors_headers)
             else:
                 return {
                     'statusCode': 400,
@@ -49,6 +75,13 @@ def handler(event, context):
                     'body': json.dumps({'error': 'Invalid action'}),
                     'isBase64Encoded': False
                 }
+        except hashing.HashingBusy:
+            return {
+                'statusCode': 503,
+                'headers': {**cors_headers, 'Retry-After': '1'},
+                'body': json.dumps({'error': 'Сервер перегружен, попробуйте позже'}),
+                'isBase64Encoded': False
+            }
         except json.JSONDecodeError:
             return {
                 'statusCode': 400,
@@ -57,10 +90,11 @@ def handler(event, context):
                 'isBase64Encoded': False
             }
         except Exception as e:
+            instrument.record_error(e)
             return {
                 'statusCode': 500,
                 'headers': cors_headers,
-                'body': json.dumps({'error': str(e)}),
+                'body': json.dumps({'error': str(e), 'request_id': instrument.current().request_id}),
                 'isBase64Encoded': False
             }
     
@@ -71,6 +105,24 @@ def handler(event, context):
         'isBase64Encoded': False
     }
 
+db.prepare('auth_register', """
+    INSERT INTO users (username, email, password_hash, display_name, region, age, show_age, points, level)
+    VALUES (%s, %s, %s, %s, %s, %s, true, 100, 1)
+    ON CONFLICT DO NOTHING
+    RETURNING id, username, email, display_name, region, age, show_age, points, level, created_at, is_admin
+""")
+# Only runs after auth_register hit a unique index, to say which one
+db.prepare('auth_register_conflict', """
+    SELECT bool_or(username = %s), bool_or(email = %s) FROM users WHERE username = %s OR email = %s
+""")
+db.prepare('auth_login', """
+    SELECT id, username, email, password_hash, display_name, region, age, show_age,
+           avatar_url, points, level, wins, losses, is_admin
+    FROM users
+    WHERE (username = %s OR email = %s) AND is_active = true
+""")
+db.prepare('auth_rehash', "UPDATE users SET password_hash = %s WHERE id = %s")
+
 def validate_email(email: str) -> bool:
     pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
     return re.match(pattern, email) is not None
@@ -97,6 +149,11 @@ def error_response(message: str, status: int, headers: Dict[str, str]) -> Dict[s
         'isBase64Encoded': False
     }
 
+def session_payload(user_id: int, is_admin: bool) -> Dict[str, Any]:
+    if not tokens.enabled():
+        return {}
+    return tokens.issue(user_id, is_admin)
+
 def register_user(data: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
     username = data.get('username', '').strip()
     email = data.get('email', '').strip().lower()
@@ -136,70 +193,53 @@ def register_user(data: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, An
         return error_response('Database connection error', 500, headers)
     
     try:
-        conn = psycopg2.connect(database_url)
-        conn.autocommit = True
-        cur = conn.cursor()
+        password_hash = hashing.hash_password(password)
         
-        cur.execute("""
-            ALTER TABLE users 
-            ADD COLUMN IF NOT EXISTS region VARCHAR(100),
-            ADD COLUMN IF NOT EXISTS age INTEGER,
-            ADD COLUMN IF NOT EXISTS show_age BOOLEAN DEFAULT true,
-            ADD COLUMN IF NOT EXISTS avatar_url TEXT
-        """)
+        with db.connection(database_url) as conn:
+            conn.autocommit = True
+            cur = conn.cursor()
+            
+            # One statement: a concurrent signup for the same login or email
+            # loses on the unique index instead of racing a separate SELECT
+            db.execute(cur, 'auth_register', (username, email, password_hash, display_name, region, age))
+            new_user = cur.fetchone()
+            
+            if new_user is None:
+                db.execute(cur, 'auth_register_conflict', (username, email, username, email))
+                taken_username, taken_email = cur.fetchone() or (False, False)
+                cur.close()
+                if taken_username and not taken_email:
+                    return error_response('Пользователь с таким логином уже существует', 409, headers)
+                if taken_email and not taken_username:
+                    return error_response('Пользователь с таким email уже существует', 409, headers)
+                return error_response('Пользователь с таким логином или email уже существует', 409, headers)
         
-        username_esc = username.replace("'", "''")
-        email_esc = email.replace("'", "''")
-        cur.execute(f"SELECT id FROM users WHERE username = '{username_esc}' OR email = '{email_esc}'")
-        existing_user = cur.fetchone()
+            user_data = {
+                'id': new_user[0],
+                'username': new_user[1],
+                'email': new_user[2],
+                'displayName': new_user[3],
+                'region': new_user[4],
+                'age': new_user[5],
+                'showAge': new_user[6],
+                'points': new_user[7],
+                'level': new_user[8],
+                'createdAt': new_user[9].isoformat(),
+                'isAdmin': new_user[10] if len(new_user) > 10 else False
+            }
         
-        if existing_user:
             cur.close()
-            conn.close()
-            return error_response('Пользователь с таким логином или email уже существует', 409, headers)
-        
-        password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-        
-        username_esc = username.replace("'", "''")
-        email_esc = email.replace("'", "''")
-        password_hash_esc = password_hash.replace("'", "''")
-        display_name_esc = display_name.replace("'", "''")
-        region_esc = region.replace("'", "''")
-        
-        cur.execute(f"""
-            INSERT INTO users (username, email, password_hash, display_name, region, age, show_age, points, level)
-            VALUES ('{username_esc}', '{email_esc}', '{password_hash_esc}', '{display_name_esc}', '{region_esc}', {age}, true, 100, 1)
-            RETURNING id, username, email, display_name, region, age, show_age, points, level, created_at, is_admin
-        """)
-        
-        new_user = cur.fetchone()
-        
-        user_data = {
-            'id': new_user[0],
-            'username': new_user[1],
-            'email': new_user[2],
-            'displayName': new_user[3],
-            'region': new_user[4],
-            'age': new_user[5],
-            'showAge': new_user[6],
-            'points': new_user[7],
-            'level': new_user[8],
-            'createdAt': new_user[9].isoformat(),
-            'isAdmin': new_user[10] if len(new_user) > 10 else False
-        }
         
-        cur.close()
-        conn.close()
-        
-        return {
-            'statusCode': 201,
-            'headers': headers,
-            'body': json.dumps({
-                'message': 'Регистрация прошла успешно',
-                'user': user_data
-            }),
-            'isBase64Encoded': False
-        }
+            return {
+                'statusCode': 201,
+                'headers': headers,
+                'body': json.dumps({
+                    'message': 'Регистрация прошла успешно',
+                    'user': user_data,
+                    **session_payload(user_data['id'], user_data['isAdmin'])
+                }),
+                'isBase64Encoded': False
+            }
         
     except psycopg2.Error as e:
         return error_response(f'Database error: {str(e)}', 500, headers)
@@ -216,28 +256,28 @@ def login_user(data: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
         return error_response('Database connection error', 500, headers)
     
     try:
-        conn = psycopg2.connect(database_url)
-        conn.autocommit = True
-        cur = conn.cursor()
-        
-        login_esc = login.replace("'", "''")
-        cur.execute(f"""
-            SELECT id, username, email, password_hash, display_name, region, age, show_age, 
-                   avatar_url, points, level, wins, losses, is_admin 
-            FROM users 
-            WHERE (username = '{login_esc}' OR email = '{login_esc}') AND is_active = true
-        """)
-        
-        user = cur.fetchone()
-        cur.close()
-        conn.close()
+        with db.connection(database_url) as conn:
+            conn.autocommit = True
+            cur = conn.cursor()
         
+            db.execute(cur, 'auth_login', (login, login))
+            user = cur.fetchone()
+            cur.close()
+    
         if not user:
             return error_response('Неверный логин или пароль', 401, headers)
-        
-        if not bcrypt.checkpw(password.encode('utf-8'), user[3].encode('utf-8')):
+    
+        if not hashing.check_password(password, user[3]):
             return error_response('Неверный логин или пароль', 401, headers)
-        
+    
+        if hashing.needs_rehash(user[3]):
+            new_hash = hashing.hash_password(password)
+            with db.connection(database_url) as conn:
+                conn.autocommit = True
+                cur = conn.cursor()
+                db.execute(cur, 'auth_rehash', (new_hash, user[0]))
+                cur.close()
+    
         user_data = {
             'id': user[0],
             'username': user[1],
@@ -253,16 +293,45 @@ def login_user(data: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
             'losses': user[12],
             'isAdmin': user[13] if len(user) > 13 else False
         }
-        
+    
         return {
             'statusCode': 200,
             'headers': headers,
             'body': json.dumps({
                 'message': 'Вход выполнен успешно',
-                'user': user_data
+                'user': user_data,
+                **session_payload(user_data['id'], user_data['isAdmin'])
             }),
             'isBase64Encoded': False
         }
-        
+    
     except psycopg2.Error as e:
-        return error_response(f'Database error: {str(e)}', 500, headers)
\ No newline at end of file
+        return error_response(f'Database error: {str(e)}', 500, headers)
+
+def logout_user(event: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    token = tokens.bearer_token(event)
+    if not token:
+        return error_response('Требуется токен сессии', 401, headers)
+    
+    try:
+        claims = tokens.verify(token)
+    except tokens.TokenError as e:
+        return error_response(str(e), 401, headers)
+    
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        return error_response('Database connection error', 500, headers)
+    
+    try:
+        with db.connection(database_url) as conn:
+            conn.autocommit = True
+            tokens.revoke(conn, claims)
+    except psycopg2.Error as e:
+        return error_response(f'Database error: {str(e)}', 500, headers)
+    
+    return {
+        'statusCode': 200,
+        'headers': headers,
+        'body': json.dumps({'message': 'Выход выполнен'}),
+        'isBase64Encoded': False
+    }
\ No newline at end of file
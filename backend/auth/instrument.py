@@ -0,0 +1,127 @@
+import contextvars
+import json
+import os
+import re
+import sys
+import time
+import traceback
+from typing import Any, Dict, List, Optional
+
+import psycopg2.extensions
+
+LOG_REQUESTS = os.environ.get('LOG_REQUESTS', '1') == '1'
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '200'))
+SERVER_TIMING = os.environ.get('SERVER_TIMING', '0') == '1'
+MAX_QUERIES_LOGGED = 50
+
+_SPACES = re.compile(r'\s+')
+
+
+class Request:
+    """Everything measured for one invocation; filled in by Cursor as queries run."""
+
+    def __init__(self, request_id: str, function: str, resource: str, method: str) -> None:
+        self.request_id = request_id
+        self.function = function
+        self.resource = resource
+        self.method = method
+        self.started = time.perf_counter()
+        self.round_trips = 0
+        self.rows = 0
+        self.db_ms = 0.0
+        self.queries: List[Dict[str, Any]] = []
+        self.error: Optional[str] = None
+
+
+_current: 'contextvars.ContextVar[Optional[Request]]' = contextvars.ContextVar('request', default=None)
+
+
+def statement(query: Any) -> str:
+    """Query text for logs: whitespace collapsed, inlined VALUES lists and EXECUTE arguments cut off."""
+    text = query.decode('utf-8', 'replace') if isinstance(query, bytes) else str(query)
+    text = _SPACES.sub(' ', text).strip()
+    if text.startswith('EXECUTE '):
+        # Prepared statements (db.prepare) log by name; the arguments may be credentials
+        return text.partition(' (')[0]
+    head, sep, _ = text.partition(' VALUES (')
+    return (head + ' VALUES ...' if sep else text)[:300]
+
+
+class Cursor(psycopg2.extensions.cursor):
+    """Cursor that reports every execute to the current Request, if any."""
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            _record(query, started, self.rowcount)
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            _record(query, started, self.rowcount)
+
+
+def _record(query: Any, started: float, rowcount: int) -> None:
+    request = _current.get()
+    if request is None:
+        return
+    elapsed = (time.perf_counter() - started) * 1000
+    rows = max(rowcount, 0)
+    request.round_trips += 1
+    request.rows += rows
+    request.db_ms += elapsed
+    if len(request.queries) < MAX_QUERIES_LOGGED:
+        request.queries.append({'sql': statement(query), 'ms': round(elapsed, 2), 'rows': rows})
+    if elapsed >= SLOW_QUERY_MS:
+        _emit({
+            'type': 'slow_query', 'request_id': request.request_id, 'function': request.function,
+            'resource': request.resource, 'ms': round(elapsed, 2), 'rows': rows, 'sql': statement(query)
+        })
+
+
+def begin(context: Any, function: str, resource: str, method: str) -> Request:
+    request = Request(getattr(context, 'request_id', None) or '-', function, resource, method)
+    _current.set(request)
+    return request
+
+
+def current() -> Optional[Request]:
+    return _current.get()
+
+
+def record_error(error: BaseException) -> None:
+    request = _current.get()
+    if request is not None:
+        request.error = ''.join(traceback.format_exception(type(error), error, error.__traceback__))
+
+
+def finish(request: Request, response: Dict[str, Any]) -> Dict[str, Any]:
+    _current.set(None)
+    total_ms = (time.perf_counter() - request.started) * 1000
+    if SERVER_TIMING:
+        response['headers'] = {
+            **response.get('headers', {}),
+            'Server-Timing': f'db;dur={request.db_ms:.1f};desc="{request.round_trips} queries", '
+                             f'total;dur={total_ms:.1f}'
+        }
+    if LOG_REQUESTS:
+        line = {
+            'type': 'request', 'request_id': request.request_id, 'function': request.function,
+            'resource': request.resource, 'method': request.method, 'status': response.get('statusCode'),
+            'ms': round(total_ms, 2), 'db_ms': round(request.db_ms, 2),
+            'round_trips': request.round_trips, 'rows': request.rows, 'queries': request.queries
+        }
+        if request.error:
+            line['error'] = request.error
+        _emit(line)
+    return response
+
+
+def _emit(line: Dict[str, Any]) -> None:
+    line['ts'] = round(time.time(), 3)
+    sys.stdout.write(json.dumps(line, ensure_ascii=False, separators=(',', ':'), default=str) + '\n')
+    sys.stdout.flush()
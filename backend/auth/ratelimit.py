@@ -0,0 +1,204 @@
+import hashlib
+import math
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import psycopg2
+import psycopg2.extras
+
+import db
+
+
+class Limit(NamedTuple):
+    capacity: float
+    rate: float  # tokens per second
+
+
+def parse_limit(spec: str) -> Optional[Limit]:
+    """"30/60" is a burst of 30 refilled at 30 per 60 seconds; "" or "0" disables the bucket."""
+    count, _, seconds = spec.partition('/')
+    if not count or float(count) <= 0:
+        return None
+    return Limit(float(count), float(count) / float(seconds or 1))
+
+
+# action -> (bucket kind, limit); per IP and per login identifier
+LIMITS: Dict[str, List[Tuple[str, Optional[Limit]]]] = {
+    'login': [
+        ('ip', parse_limit(os.environ.get('RATE_LIMIT_LOGIN_IP', '30/60'))),
+        ('id', parse_limit(os.environ.get('RATE_LIMIT_LOGIN_ID', '10/300'))),
+    ],
+    'register': [
+        ('ip', parse_limit(os.environ.get('RATE_LIMIT_REGISTER_IP', '5/600'))),
+    ],
+}
+# Failed passwords per IP: an IP that keeps guessing is refused before bcrypt
+# long before its attempt bucket runs dry. Only consumed by record_failure().
+FAILURE_LIMIT = parse_limit(os.environ.get('RATE_LIMIT_LOGIN_FAILURES_IP', '5/300'))
+# bcrypt jobs one IP may have in flight; a burst queues behind itself, not ahead of everyone
+MAX_IN_FLIGHT_PER_IP = int(os.environ.get('RATE_LIMIT_IN_FLIGHT_PER_IP', '1'))
+# "memory" keeps buckets per warm instance; "postgres" also checks the shared
+# rate_limits table (V0024) so the limit holds across instances
+RATE_LIMIT_STORE = os.environ.get('RATE_LIMIT_STORE', 'memory')
+MAX_LOCAL_BUCKETS = int(os.environ.get('RATE_LIMIT_MAX_BUCKETS', '100000'))
+# Fraction of shared-store checks that also purge idle buckets
+PURGE_PROBABILITY = 0.001
+
+
+class LocalBuckets:
+    """Token buckets in process memory, LRU-bounded so key spraying can't grow it without limit."""
+
+    def __init__(self, maxsize: int = MAX_LOCAL_BUCKETS) -> None:
+        self.maxsize = maxsize
+        self._buckets: 'OrderedDict[str, Tuple[float, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, limit: Limit, now: Optional[float] = None) -> float:
+        """Takes a token; returns 0 if allowed, else seconds until one is available."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (limit.capacity, now))
+            tokens = min(limit.capacity, tokens + (now - updated) * limit.rate)
+            allowed = tokens >= 1
+            self._buckets[key] = (tokens - 1 if allowed else tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return 0.0 if allowed else (1 - tokens) / limit.rate
+
+    def wait(self, key: str, limit: Limit, now: Optional[float] = None) -> float:
+        """Like take() but without consuming: seconds until a token is available."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (limit.capacity, now))
+        tokens = min(limit.capacity, tokens + (now - updated) * limit.rate)
+        return 0.0 if tokens >= 1 else (1 - tokens) / limit.rate
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+
+_local = LocalBuckets()
+_in_flight: Dict[str, int] = {}
+_in_flight_lock = threading.Lock()
+
+# Refill since the last update, capped at capacity; evaluated against the old row
+_REFILLED = 'LEAST(EXCLUDED.capacity, b.tokens + EXTRACT(EPOCH FROM NOW() - b.updated_at)::float8 * EXCLUDED.refill_rate)'
+_TAKE_SQL = f"""
+    INSERT INTO rate_limits AS b (key, tokens, capacity, refill_rate, allowed, updated_at)
+    VALUES %s
+    ON CONFLICT (key) DO UPDATE SET
+        tokens = {_REFILLED} - CASE WHEN {_REFILLED} >= 1 THEN 1 ELSE 0 END,
+        allowed = {_REFILLED} >= 1,
+        updated_at = NOW()
+    RETURNING allowed, tokens, refill_rate
+"""
+
+
+def take_shared(conn, buckets: Sequence[Tuple[str, Limit]]) -> float:
+    """
+    Takes a token from every bucket in one round trip; returns the longest
+    wait among the buckets that refused. Keys are locked in sorted order so
+    concurrent checks over overlapping buckets can't deadlock.
+    """
+    cur = conn.cursor()
+    rows = psycopg2.extras.execute_values(cur, _TAKE_SQL, [
+        (key, limit.capacity, limit.capacity, limit.rate) for key, limit in sorted(buckets)
+    ], template='(%s, %s - 1, %s, %s, true, NOW())', fetch=True)
+    if random.random() < PURGE_PROBABILITY:
+        cur.execute("DELETE FROM rate_limits WHERE updated_at < NOW() - INTERVAL '1 day'")
+    cur.close()
+    return max([(1 - tokens) / rate for allowed, tokens, rate in rows if not allowed], default=0.0)
+
+
+def client_ip(event: Dict[str, Any]) -> Optional[str]:
+    """
+    The address the gateway saw. Without it, the right-most X-Forwarded-For
+    hop, the one our proxy appended: everything left of it is whatever the
+    client sent, and rotating it would dodge every per-IP bucket.
+    """
+    identity = (event.get('requestContext') or {}).get('identity') or {}
+    if identity.get('sourceIp'):
+        return identity['sourceIp']
+    headers = event.get('headers') or {}
+    forwarded = next((v for k, v in headers.items() if k.lower() == 'x-forwarded-for'), '')
+    return forwarded.rsplit(',', 1)[-1].strip() or None
+
+
+def _key(action: str, kind: str, value: str) -> str:
+    # Identifiers are hashed so the shared table never holds logins or emails
+    digest = hashlib.blake2b(value.encode('utf-8'), digest_size=12).hexdigest()
+    return f'{action}:{kind}:{digest}'
+
+
+def buckets_for(event: Dict[str, Any], action: str, data: Dict[str, Any]) -> List[Tuple[str, Limit]]:
+    values = {'ip': client_ip(event), 'id': str(data.get('login') or '').strip().lower() or None}
+    return [(_key(action, kind, values[kind]), limit)
+            for kind, limit in LIMITS.get(action, ()) if limit is not None and values[kind]]
+
+
+def check(event: Dict[str, Any], action: str, data: Dict[str, Any]) -> Optional[int]:
+    """
+    Seconds the client should wait (for Retry-After), or None if the attempt
+    may proceed. Runs before any database lookup or bcrypt work; the local
+    buckets answer a burst without a round trip, and the shared store is only
+    consulted once they allow. A shared store outage fails open to the local
+    limits.
+    """
+    buckets = buckets_for(event, action, data)
+    if not buckets:
+        return None
+    now = time.monotonic()
+    ip = client_ip(event)
+    if action == 'login' and ip and FAILURE_LIMIT:
+        penalty = _local.wait(_key('login', 'fail', ip), FAILURE_LIMIT, now)
+        if penalty:
+            return max(math.ceil(penalty), 1)
+    wait = max(_local.take(key, limit, now) for key, limit in buckets)
+    if not wait and RATE_LIMIT_STORE == 'postgres' and os.environ.get('DATABASE_URL'):
+        try:
+            with db.connection(os.environ['DATABASE_URL']) as conn:
+                conn.autocommit = True
+                wait = take_shared(conn, buckets)
+        except (psycopg2.Error, db.PoolTimeout):
+            wait = 0.0
+    return max(math.ceil(wait), 1) if wait else None
+
+
+def record_failure(event: Dict[str, Any]) -> None:
+    """Counts a wrong password against the client IP's failure bucket."""
+    ip = client_ip(event)
+    if ip and FAILURE_LIMIT:
+        _local.take(_key('login', 'fail', ip), FAILURE_LIMIT)
+
+
+def admit(event: Dict[str, Any]) -> bool:
+    """
+    Reserves one of the client IP's MAX_IN_FLIGHT_PER_IP hashing slots;
+    False means refuse now. Pair every True with release().
+    """
+    ip = client_ip(event)
+    if not ip or MAX_IN_FLIGHT_PER_IP <= 0:
+        return True
+    with _in_flight_lock:
+        if _in_flight.get(ip, 0) >= MAX_IN_FLIGHT_PER_IP:
+            return False
+        _in_flight[ip] = _in_flight.get(ip, 0) + 1
+    return True
+
+
+def release(event: Dict[str, Any]) -> None:
+    ip = client_ip(event)
+    if not ip or MAX_IN_FLIGHT_PER_IP <= 0:
+        return
+    with _in_flight_lock:
+        count = _in_flight.get(ip, 0) - 1
+        if count > 0:
+            _in_flight[ip] = count
+        else:
+            _in_flight.pop(ip, None)
@@ -0,0 +1,186 @@
+import csv
+import io
+import json
+import os
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+import profiles
+import serialize
+
+# Admin-only and rarely hit: loaded lazily by the content router
+
+USERS_PAGE = 100
+USERS_MAX_PAGE = 500
+BULK_MAX_IDS = 10000
+# Rows per export page; larger exports follow X-Next-Cursor like the listing.
+# Keeps one response body within what the function runtime will return
+EXPORT_MAX_ROWS = int(os.environ.get('USERS_EXPORT_MAX_ROWS', '20000'))
+EXPORT_FETCH_SIZE = 5000
+
+# Leading characters that make spreadsheet apps treat a cell as a formula
+CSV_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+USER_COLUMNS = serialize.Columns(
+    ('id', 'id'), ('username', 'username'), ('displayName', 'display_name'), ('email', 'email'),
+    ('points', 'points'), ('level', 'level'), ('region', 'region'), ('is_active', 'is_active'),
+    ('is_admin', 'is_admin'), ('created_at', 'created_at')
+)
+
+# action -> (column, default value); every action accepts user_id or user_ids
+BULK_ACTIONS = {
+    'toggle_admin': ('is_admin', False),
+    'toggle_active': ('is_active', True),
+}
+
+
+def _flag(value: Any) -> bool:
+    return str(value).lower() in ('1', 'true', 'yes')
+
+
+def _bad_request(message: str, headers: Dict[str, str]) -> Dict[str, Any]:
+    return {'statusCode': 400, 'headers': headers, 'body': serialize.dumps({'error': message}), 'isBase64Encoded': False}
+
+
+def _csv_cell(value: Any) -> Any:
+    if isinstance(value, str) and value.startswith(CSV_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _filters(params: Dict[str, Any]) -> Tuple[List[str], List[Any]]:
+    """WHERE clauses for the listing and export; raises ValueError on a bad cursor."""
+    where, args = [], []
+    if params.get('active') not in (None, ''):
+        where.append('is_active = %s')
+        args.append(_flag(params['active']))
+    if params.get('admin') not in (None, ''):
+        where.append('is_admin = %s')
+        args.append(_flag(params['admin']))
+    if params.get('region'):
+        where.append('region = %s')
+        args.append(params['region'])
+    if params.get('created_from'):
+        where.append('created_at >= %s::timestamptz')
+        args.append(params['created_from'])
+    if params.get('created_to'):
+        where.append('created_at < %s::timestamptz')
+        args.append(params['created_to'])
+    if params.get('after'):
+        after_created, after_id = serialize.parse_cursor(params['after'])
+        where.append('(created_at, id) < (%s::timestamptz, %s)')
+        args += [after_created, after_id]
+    return where, args
+
+
+def _next_cursor(last: Optional[Tuple], headers: Dict[str, str]) -> Dict[str, str]:
+    """Adds X-Next-Cursor after a full page; last is None when there is nothing more."""
+    if last is None:
+        return headers
+    return {**headers, 'X-Next-Cursor': serialize.cursor(last[USER_COLUMNS.index('created_at')], last[0]),
+            'Access-Control-Expose-Headers': 'X-Next-Cursor'}
+
+
+def handle(event, method, conn, headers):
+    if method == 'GET':
+        params = event.get('queryStringParameters') or {}
+        try:
+            if params.get('format') == 'csv':
+                return export_csv(conn, params, headers)
+            return list_users(conn, params, headers)
+        except ValueError as e:
+            return _bad_request(str(e), headers)
+
+    body = json.loads(event.get('body', '{}'))
+    action = body.get('action')
+    if action not in BULK_ACTIONS:
+        return _bad_request('Unknown action', headers)
+
+    ids = body.get('user_ids')
+    if ids is None and body.get('user_id') is not None:
+        ids = [body['user_id']]
+    if not isinstance(ids, list) or not ids:
+        return _bad_request('user_id or user_ids required', headers)
+    if len(ids) > BULK_MAX_IDS:
+        return _bad_request(f'at most {BULK_MAX_IDS} ids per request', headers)
+    try:
+        ids = [int(i) for i in ids]
+    except (TypeError, ValueError):
+        return _bad_request('user ids must be integers', headers)
+
+    column, default = BULK_ACTIONS[action]
+    value = bool(body.get(column, default))
+    cur = conn.cursor()
+    # One statement for the whole list; rows already in the target state are not rewritten
+    cur.execute(f"""
+        UPDATE users SET {column} = %s
+        WHERE id = ANY(%s::int[]) AND {column} IS DISTINCT FROM %s
+        RETURNING id
+    """, (value, ids, value))
+    updated = [row[0] for row in cur.fetchall()]
+    conn.commit()
+    cur.close()
+    profiles.invalidate(updated)
+    return {'statusCode': 200, 'headers': headers, 'body': serialize.dumps({
+        'message': 'Updated', 'updated': len(updated), 'ids': updated
+    }), 'isBase64Encoded': False}
+
+
+def list_users(conn, params, headers):
+    try:
+        limit = min(max(int(params.get('limit', USERS_PAGE)), 1), USERS_MAX_PAGE)
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    where, args = _filters(params)
+
+    cur = conn.cursor()
+    cur.execute(f"""
+        SELECT {USER_COLUMNS.sql}
+        FROM users
+        {'WHERE ' + ' AND '.join(where) if where else ''}
+        ORDER BY created_at DESC, id DESC
+        LIMIT %s
+    """, args + [limit])
+    rows = cur.fetchall()
+    cur.close()
+
+    headers = _next_cursor(rows[-1] if len(rows) == limit else None, headers)
+    return {'statusCode': 200, 'headers': headers, 'body': serialize.dumps(USER_COLUMNS.all(rows)), 'isBase64Encoded': False}
+
+
+def export_csv(conn, params, headers):
+    """
+    Same filters and cursor as the listing, EXPORT_MAX_ROWS rows per page;
+    X-Next-Cursor points at the next page. A server-side cursor streams the
+    rows in EXPORT_FETCH_SIZE batches into the CSV writer. Text cells that
+    a spreadsheet would run as a formula are prefixed with a quote.
+    """
+    where, args = _filters(params)
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(USER_COLUMNS.keys)
+
+    cur = conn.cursor(name=f'users_export_{uuid.uuid4().hex[:8]}')
+    cur.itersize = EXPORT_FETCH_SIZE
+    cur.execute(f"""
+        SELECT {USER_COLUMNS.sql}
+        FROM users
+        {'WHERE ' + ' AND '.join(where) if where else ''}
+        ORDER BY created_at DESC, id DESC
+        LIMIT %s
+    """, args + [EXPORT_MAX_ROWS])
+    last = None
+    count = 0
+    for row in cur:
+        writer.writerow([_csv_cell(value) for value in row])
+        last = row
+        count += 1
+    cur.close()
+    conn.rollback()
+
+    headers = _next_cursor(last if count == EXPORT_MAX_ROWS else None, headers)
+    return {'statusCode': 200, 'headers': {
+        **headers,
+        'Content-Type': 'text/csv; charset=utf-8',
+        'Content-Disposition': 'attachment; filename="users.csv"'
+    }, 'body': out.getvalue(), 'isBase64Encoded': False}
@@ -0,0 +1,19 @@
+from typing import Any, Dict, List
+
+import psycopg2.extras
+
+BATCH_MAX_ITEMS = 1000
+
+
+def bulk_insert(cur, query: str, rows: List[tuple]) -> List[tuple]:
+    """Single multi-row INSERT ... VALUES %s RETURNING; rows come back in input order."""
+    if not rows:
+        return []
+    return psycopg2.extras.execute_values(cur, query, rows, page_size=len(rows), fetch=True)
+
+
+def batch_result(results: Dict[int, Dict[str, Any]], total: int) -> Dict[str, Any]:
+    for i in range(BATCH_MAX_ITEMS, total):
+        results[i] = {'index': i, 'error': f'batch limit is {BATCH_MAX_ITEMS} items'}
+    ordered = [results[i] for i in range(total)]
+    return {'inserted': sum(1 for r in ordered if 'id' in r), 'results': ordered}
@@ -0,0 +1,469 @@
+import json
+import math
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import psycopg2.extras
+
+FORMATS = ('single-elimination', 'double-elimination', 'swiss')
+MIN_PARTICIPANTS = 2
+REGISTRATION_OPEN = ('upcoming', 'registration')
+
+# A match side is fed by a seed, or by the winner/loser of an earlier match,
+# packed into one int: index * 3 + kind
+SEED, WINNER, LOSER = 0, 1, 2
+
+Outcome = Tuple[int, Dict[str, Any]]
+
+
+class TournamentError(Exception):
+    def __init__(self, message: str, status: int = 409):
+        super().__init__(message)
+        self.status = status
+
+
+def _src(kind: int, index: int) -> int:
+    return index * 3 + kind
+
+
+def seed_order(size: int) -> List[int]:
+    """0-based seeds in bracket order for a power-of-two size: 1v16, 8v9, 5v12, ..."""
+    order = [0]
+    while len(order) < size:
+        n = len(order) * 2
+        order = [seed for s in order for seed in (s, n - 1 - s)]
+    return order
+
+
+def elimination_layout(participants: int, double: bool = False) -> Dict[str, Any]:
+    """
+    Static bracket for single or double elimination. Matches are listed in
+    dependency order (every source points at an earlier match), so the whole
+    bracket resolves in one forward pass. Missing seeds are byes.
+
+    sources: flat [a0, b0, a1, b1, ...] packed sources per match
+    rounds:  round number of each match within its side
+    sides:   one char per match, W(inners), L(osers) or F(inal)
+    """
+    size = 1 << max(math.ceil(math.log2(max(participants, MIN_PARTICIPANTS))), 1)
+    sources: List[int] = []
+    rounds: List[int] = []
+    sides: List[str] = []
+
+    def add(a: int, b: int, side: str, round_no: int) -> int:
+        sources.extend((a, b))
+        rounds.append(round_no)
+        sides.append(side)
+        return len(rounds) - 1
+
+    order = seed_order(size)
+    winners = [[add(_src(SEED, order[i]), _src(SEED, order[i + 1]), 'W', 1) for i in range(0, size, 2)]]
+    while len(winners[-1]) > 1:
+        prev = winners[-1]
+        winners.append([
+            add(_src(WINNER, prev[i]), _src(WINNER, prev[i + 1]), 'W', len(winners) + 1)
+            for i in range(0, len(prev), 2)
+        ])
+    if not double:
+        return {'size': size, 'sources': sources, 'rounds': rounds, 'sides': ''.join(sides)}
+
+    if len(winners) == 1:
+        champion = _src(LOSER, winners[0][0])
+    else:
+        first = winners[0]
+        lower = [add(_src(LOSER, first[i]), _src(LOSER, first[i + 1]), 'L', 1) for i in range(0, len(first), 2)]
+        lb_round = 1
+        for r in range(1, len(winners)):
+            # Losers dropping in are reversed every other round so early rematches are rare
+            dropped = winners[r] if r % 2 else winners[r][::-1]
+            lb_round += 1
+            lower = [add(_src(WINNER, m), _src(LOSER, d), 'L', lb_round) for m, d in zip(lower, dropped)]
+            if len(lower) > 1:
+                lb_round += 1
+                lower = [
+                    add(_src(WINNER, lower[i]), _src(WINNER, lower[i + 1]), 'L', lb_round)
+                    for i in range(0, len(lower), 2)
+                ]
+        champion = _src(WINNER, lower[0])
+    add(_src(WINNER, winners[-1][0]), champion, 'F', 1)
+    return {'size': size, 'sources': sources, 'rounds': rounds, 'sides': ''.join(sides)}
+
+
+def resolve(layout: Dict[str, Any], seeds: Sequence[int],
+            results: Dict[int, Optional[int]]) -> List[Tuple[Optional[int], Optional[int], Optional[int], bool]]:
+    """
+    Replays the bracket from seeds and recorded results (slot -> winner_id).
+    Returns (player_a, player_b, winner, decided) per slot; a slot with both
+    players known and decided False is ready to be played. Byes decide
+    themselves; a drawn or unknown winner advances the better seed.
+    """
+    sources = layout['sources']
+    count = len(layout['rounds'])
+    rank = {user_id: i for i, user_id in enumerate(seeds)}
+    state: List[Tuple[Optional[int], Optional[int], Optional[int], bool]] = []
+
+    def value(src: int) -> Tuple[bool, Optional[int]]:
+        index, kind = divmod(src, 3)
+        if kind == SEED:
+            return True, seeds[index] if index < len(seeds) else None
+        a, b, winner, decided = state[index]
+        if not decided:
+            return False, None
+        if kind == WINNER:
+            return True, winner
+        return True, b if winner == a else a if winner == b else None
+
+    for slot in range(count):
+        known_a, a = value(sources[2 * slot])
+        known_b, b = value(sources[2 * slot + 1])
+        if not (known_a and known_b):
+            state.append((a, b, None, False))
+        elif a is None or b is None:
+            state.append((a, b, a if a is not None else b, True))
+        elif slot in results:
+            winner = results[slot]
+            if winner not in (a, b):
+                winner = a if rank.get(a, 0) <= rank.get(b, 0) else b
+            state.append((a, b, winner, True))
+        else:
+            state.append((a, b, None, False))
+    return state
+
+
+def swiss_rounds(participants: int) -> int:
+    return max(math.ceil(math.log2(max(participants, MIN_PARTICIPANTS))), 1)
+
+
+def swiss_standings(seeds: Sequence[int], history: Sequence[Tuple[int, Optional[int], Optional[int]]]
+                    ) -> List[Tuple[int, float]]:
+    """(user_id, score) best first; win or bye = 1, draw = 0.5, ties broken by seed."""
+    score = {user_id: 0.0 for user_id in seeds}
+    for p1, p2, winner in history:
+        if p2 is None or winner is not None:
+            if winner in score:
+                score[winner] += 1.0
+            elif p2 is None and p1 in score:
+                score[p1] += 1.0
+        else:
+            for p in (p1, p2):
+                if p in score:
+                    score[p] += 0.5
+    rank = {user_id: i for i, user_id in enumerate(seeds)}
+    return sorted(score.items(), key=lambda item: (-item[1], rank[item[0]]))
+
+
+def swiss_pairings(seeds: Sequence[int], history: Sequence[Tuple[int, Optional[int], Optional[int]]]
+                   ) -> List[Tuple[int, Optional[int]]]:
+    """
+    Next round: players ordered by score then seed, each paired with the
+    closest-ranked opponent they have not met yet. With an odd count the
+    lowest-ranked player who has not had a bye sits out with a win.
+    """
+    order = [user_id for user_id, _ in swiss_standings(seeds, history)]
+    played = set()
+    had_bye = set()
+    for p1, p2, _ in history:
+        if p2 is None:
+            had_bye.add(p1)
+        else:
+            played.add((p1, p2))
+            played.add((p2, p1))
+
+    pairs: List[Tuple[int, Optional[int]]] = []
+    if len(order) % 2:
+        bye = next((p for p in reversed(order) if p not in had_bye), order[-1])
+        order.remove(bye)
+        pairs.append((bye, None))
+
+    unpaired = order[::-1]
+    while unpaired:
+        p = unpaired.pop()
+        j = next((j for j in range(len(unpaired) - 1, -1, -1) if (p, unpaired[j]) not in played),
+                 len(unpaired) - 1)
+        pairs.append((p, unpaired.pop(j)))
+    return pairs
+
+
+def _seeds(cur, tournament_id: int) -> List[int]:
+    cur.execute("""
+        SELECT tp.user_id
+        FROM tournament_participants tp
+        JOIN users u ON u.id = tp.user_id
+        WHERE tp.tournament_id = %s AND NOT tp.waitlisted
+        ORDER BY u.rating DESC NULLS LAST, tp.joined_at, tp.user_id
+    """, (tournament_id,))
+    return [row[0] for row in cur.fetchall()]
+
+
+def _create_matches(cur, tournament_id: int, game_mode: str, rows: List[Tuple]) -> int:
+    """rows: (slot, round, player1_id, player2_id, winner_id); a completed row is a bye."""
+    if not rows:
+        return 0
+    created = psycopg2.extras.execute_values(cur, """
+        INSERT INTO matches (match_id, game_mode, status, player1_id, player2_id, winner_id,
+                             tournament_id, tournament_round, bracket_slot, finished_at)
+        VALUES %s
+        ON CONFLICT DO NOTHING
+        RETURNING id
+    """, [
+        (f't{tournament_id}_{slot}', game_mode, 'completed' if winner_id else 'waiting',
+         player1_id, player2_id, winner_id, tournament_id, round_no, slot, bool(winner_id))
+        for slot, round_no, player1_id, player2_id, winner_id in rows
+    ], template="(%s, %s, %s, %s, %s, %s, %s, %s, %s, CASE WHEN %s THEN NOW() END)",
+        page_size=len(rows), fetch=True)
+    return len(created)
+
+
+def _finish(cur, tournament_id: int, placements: List[Tuple[int, int]]) -> None:
+    cur.execute("""
+        UPDATE tournaments SET status = 'completed', end_date = NOW() WHERE id = %s
+    """, (tournament_id,))
+    if placements:
+        psycopg2.extras.execute_values(cur, """
+            UPDATE tournament_participants AS tp
+            SET placement = v.placement
+            FROM (VALUES %s) AS v(tournament_id, user_id, placement)
+            WHERE tp.tournament_id = v.tournament_id AND tp.user_id = v.user_id
+        """, [(tournament_id, user_id, place) for user_id, place in placements], page_size=len(placements))
+
+
+def _advance(cur, tournament_id: int) -> Outcome:
+    cur.execute("""
+        SELECT format, game_mode, status, bracket FROM tournaments WHERE id = %s FOR UPDATE
+    """, (tournament_id,))
+    row = cur.fetchone()
+    if row is None:
+        raise TournamentError('Tournament not found', 404)
+    format_, game_mode, status, bracket = row
+    if status != 'active' or not bracket:
+        raise TournamentError('Tournament is not running')
+
+    cur.execute("""
+        SELECT bracket_slot, tournament_round, player1_id, player2_id, winner_id, status
+        FROM matches WHERE tournament_id = %s
+    """, (tournament_id,))
+    matches = cur.fetchall()
+    seeds = bracket['seeds']
+    game_mode = game_mode or '1v1'
+
+    if format_ == 'swiss':
+        current = max((m[1] for m in matches), default=0)
+        if any(m[1] == current and m[5] != 'completed' for m in matches):
+            return 200, {'created': 0, 'round': current, 'completed': False}
+        history = [(m[2], m[3], m[4]) for m in matches]
+        if current >= bracket['rounds']:
+            standings = swiss_standings(seeds, history)
+            _finish(cur, tournament_id, [(user_id, place) for place, (user_id, _) in enumerate(standings, 1)])
+            return 200, {'created': 0, 'round': current, 'completed': True, 'winner_id': standings[0][0]}
+        next_slot = max((m[0] for m in matches), default=-1) + 1
+        rows = [
+            (next_slot + i, current + 1, p1, p2, p1 if p2 is None else None)
+            for i, (p1, p2) in enumerate(swiss_pairings(seeds, history))
+        ]
+        return 200, {'created': _create_matches(cur, tournament_id, game_mode, rows),
+                     'round': current + 1, 'completed': False}
+
+    results = {m[0]: m[4] for m in matches if m[5] == 'completed'}
+    existing = {m[0] for m in matches}
+    state = resolve(bracket, seeds, results)
+    a, b, champion, decided = state[-1]
+    if decided:
+        runner_up = b if champion == a else a
+        placements = [(champion, 1)] + ([(runner_up, 2)] if runner_up is not None else [])
+        _finish(cur, tournament_id, placements)
+        return 200, {'created': 0, 'completed': True, 'winner_id': champion}
+
+    rows = [
+        (slot, bracket['rounds'][slot], a, b, None)
+        for slot, (a, b, _, done) in enumerate(state)
+        if not done and a is not None and b is not None and slot not in existing
+    ]
+    return 200, {'created': _create_matches(cur, tournament_id, game_mode, rows), 'completed': False}
+
+
+def _start(cur, tournament_id: int) -> Outcome:
+    cur.execute("""
+        SELECT format, status FROM tournaments WHERE id = %s FOR UPDATE
+    """, (tournament_id,))
+    row = cur.fetchone()
+    if row is None:
+        raise TournamentError('Tournament not found', 404)
+    format_, status = row
+    if status not in REGISTRATION_OPEN:
+        raise TournamentError('Tournament already started')
+    format_ = format_ or FORMATS[0]
+    if format_ not in FORMATS:
+        raise TournamentError(f'Unsupported format: {format_}', 400)
+
+    seeds = _seeds(cur, tournament_id)
+    if len(seeds) < MIN_PARTICIPANTS:
+        raise TournamentError('Not enough participants', 400)
+    if format_ == 'swiss':
+        bracket: Dict[str, Any] = {'rounds': swiss_rounds(len(seeds))}
+    else:
+        bracket = elimination_layout(len(seeds), double=format_ == 'double-elimination')
+    bracket['seeds'] = seeds
+
+    cur.execute("""
+        UPDATE tournaments SET status = 'active', format = %s, bracket = %s::jsonb WHERE id = %s
+    """, (format_, json.dumps(bracket, separators=(',', ':')), tournament_id))
+    return _advance(cur, tournament_id)
+
+
+def _register(cur, tournament_id: int, user_id: int) -> Outcome:
+    # The conditional increment is the capacity check: it takes the row lock,
+    # and waiters re-evaluate the WHERE after the holder commits, so the
+    # counter can never pass max_participants however many requests race.
+    cur.execute("""
+        UPDATE tournaments SET participants_count = participants_count + 1
+        WHERE id = %s AND status IN %s AND participants_count < max_participants
+        RETURNING participants_count
+    """, (tournament_id, REGISTRATION_OPEN))
+    waitlisted = cur.fetchone() is None
+    if waitlisted:
+        cur.execute("""
+            SELECT status FROM tournaments WHERE id = %s FOR UPDATE
+        """, (tournament_id,))
+        row = cur.fetchone()
+        if row is None:
+            raise TournamentError('Tournament not found', 404)
+        if row[0] not in REGISTRATION_OPEN:
+            raise TournamentError('Registration is closed')
+
+    cur.execute("""
+        INSERT INTO tournament_participants (tournament_id, user_id, waitlisted)
+        VALUES (%s, %s, %s)
+        ON CONFLICT (tournament_id, user_id) DO NOTHING
+        RETURNING id
+    """, (tournament_id, user_id, waitlisted))
+    if cur.fetchone() is None:
+        raise TournamentError('Already registered')
+    if waitlisted:
+        return 202, {'message': 'Tournament is full, added to waitlist', 'waitlisted': True}
+    return 201, {'message': 'Registered successfully', 'waitlisted': False}
+
+
+def _withdraw(cur, tournament_id: int, user_id: int) -> Outcome:
+    # Lock the tournament first so a promotion cannot race a new registration
+    cur.execute("""
+        SELECT status FROM tournaments WHERE id = %s FOR UPDATE
+    """, (tournament_id,))
+    row = cur.fetchone()
+    if row is None:
+        raise TournamentError('Tournament not found', 404)
+    if row[0] not in REGISTRATION_OPEN:
+        raise TournamentError('Registration is closed')
+
+    cur.execute("""
+        DELETE FROM tournament_participants
+        WHERE tournament_id = %s AND user_id = %s
+        RETURNING waitlisted
+    """, (tournament_id, user_id))
+    row = cur.fetchone()
+    if row is None:
+        raise TournamentError('Not registered', 404)
+    if row[0]:
+        return 200, {'message': 'Removed from waitlist'}
+
+    cur.execute("""
+        UPDATE tournament_participants SET waitlisted = false
+        WHERE id = (
+            SELECT id FROM tournament_participants
+            WHERE tournament_id = %s AND waitlisted
+            ORDER BY joined_at, id
+            LIMIT 1
+        )
+        RETURNING user_id
+    """, (tournament_id,))
+    promoted = cur.fetchone()
+    if promoted is None:
+        cur.execute("""
+            UPDATE tournaments SET participants_count = participants_count - 1 WHERE id = %s
+        """, (tournament_id,))
+    return 200, {'message': 'Registration cancelled', 'promoted_user_id': promoted[0] if promoted else None}
+
+
+def _run(conn, operation, *args) -> Outcome:
+    cur = conn.cursor()
+    try:
+        result = operation(cur, *args)
+        conn.commit()
+        return result
+    except TournamentError as e:
+        conn.rollback()
+        return e.status, {'error': str(e)}
+    finally:
+        cur.close()
+
+
+def start(conn, tournament_id: int) -> Outcome:
+    """Seeds registered players by rating, stores the bracket and opens the first round."""
+    return _run(conn, _start, tournament_id)
+
+
+def advance(conn, tournament_id: int) -> Outcome:
+    """Creates every match that became playable; finishes the tournament after the final."""
+    return _run(conn, _advance, tournament_id)
+
+
+def register(conn, tournament_id: int, user_id: int) -> Outcome:
+    """Takes a seat if one is free, otherwise joins the waitlist (202)."""
+    return _run(conn, _register, tournament_id, user_id)
+
+
+def withdraw(conn, tournament_id: int, user_id: int) -> Outcome:
+    """Frees a seat; the longest-waiting player on the waitlist takes it."""
+    return _run(conn, _withdraw, tournament_id, user_id)
+
+
+def advance_for_matches(conn, match_ids: List[str]) -> None:
+    if not match_ids:
+        return
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT DISTINCT tournament_id FROM matches
+        WHERE match_id = ANY(%s) AND tournament_id IS NOT NULL
+    """, (match_ids,))
+    tournament_ids = [row[0] for row in cur.fetchall()]
+    cur.close()
+    conn.rollback()
+    for tournament_id in tournament_ids:
+        advance(conn, tournament_id)
+
+
+def view(conn, tournament_id: int) -> Optional[Dict[str, Any]]:
+    cur = conn.cursor()
+    cur.execute("SELECT format, status, bracket FROM tournaments WHERE id = %s", (tournament_id,))
+    row = cur.fetchone()
+    if row is None or not row[2]:
+        cur.close()
+        return None if row is None else {'format': row[0], 'status': row[1], 'matches': []}
+    cur.execute("""
+        SELECT bracket_slot, tournament_round, player1_id, player2_id, winner_id, status, match_id
+        FROM matches WHERE tournament_id = %s ORDER BY bracket_slot
+    """, (tournament_id,))
+    matches = cur.fetchall()
+    cur.close()
+    format_, status, bracket = row
+
+    if format_ == 'swiss':
+        items = [
+            {'slot': m[0], 'side': 'S', 'round': m[1], 'player1_id': m[2], 'player2_id': m[3],
+             'winner_id': m[4], 'status': m[5], 'match_id': m[6]}
+            for m in matches
+        ]
+        standings = swiss_standings(bracket['seeds'], [(m[2], m[3], m[4]) for m in matches if m[5] == 'completed'])
+        return {'format': format_, 'status': status, 'rounds': bracket['rounds'], 'matches': items,
+                'standings': [{'user_id': u, 'score': s} for u, s in standings]}
+
+    rows = {m[0]: m for m in matches}
+    state = resolve(bracket, bracket['seeds'], {m[0]: m[4] for m in matches if m[5] == 'completed'})
+    items = []
+    for slot, (a, b, winner, decided) in enumerate(state):
+        match = rows.get(slot)
+        items.append({
+            'slot': slot, 'side': bracket['sides'][slot], 'round': bracket['rounds'][slot],
+            'player1_id': a, 'player2_id': b, 'winner_id': winner,
+            'status': match[5] if match else ('bye' if decided else 'pending'),
+            'match_id': match[6] if match else None
+        })
+    return {'format': format_, 'status': status, 'matches': items}
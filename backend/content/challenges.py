@@ -0,0 +1,256 @@
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, Iterable, Tuple
+
+import psycopg2.extras
+
+# Share of the combined stakes paid to the winner; the rest is the site fee
+REWARD_RATE = float(os.environ.get('CHALLENGE_REWARD_RATE', '0.9'))
+# Accepted or started challenges with no result after this long are aborted and refunded
+CHALLENGE_TIMEOUT = int(os.environ.get('CHALLENGE_TIMEOUT', str(3 * 3600)))
+# How often an instance sweeps for timed-out challenges, piggybacking on requests
+EXPIRE_INTERVAL = float(os.environ.get('CHALLENGE_EXPIRE_INTERVAL', '60'))
+EXPIRE_BATCH = 500
+
+Outcome = Tuple[int, Dict[str, Any]]
+
+
+class ChallengeError(Exception):
+    def __init__(self, message: str, status: int = 409):
+        super().__init__(message)
+        self.status = status
+
+
+def reward_for(stake: int) -> int:
+    return int(stake * 2 * REWARD_RATE)
+
+
+def _debit(cur, user_id, amount: int) -> None:
+    if not amount:
+        return
+    cur.execute("""
+        UPDATE users SET points = points - %s
+        WHERE id = %s AND points >= %s
+        RETURNING id
+    """, (amount, user_id, amount))
+    if cur.fetchone() is None:
+        raise ChallengeError('Недостаточно очков для ставки')
+
+
+def _credit(cur, user_id, amount: int) -> None:
+    if amount:
+        cur.execute("UPDATE users SET points = points + %s WHERE id = %s", (amount, user_id))
+
+
+def _refund(cur, stakes: Iterable[Tuple[int, int]]) -> None:
+    """
+    Returns (user_id, amount) stakes. Rows are locked in user id order first
+    so concurrent refunds and payouts over the same players can't deadlock.
+    """
+    totals: Dict[int, int] = defaultdict(int)
+    for user_id, amount in stakes:
+        if user_id is not None and amount:
+            totals[user_id] += amount
+    if not totals:
+        return
+    ids = sorted(totals)
+    cur.execute("SELECT id FROM users WHERE id = ANY(%s) ORDER BY id FOR UPDATE", (ids,))
+    psycopg2.extras.execute_values(cur, """
+        UPDATE users u SET points = u.points + v.amount
+        FROM (VALUES %s) AS v(id, amount)
+        WHERE u.id = v.id
+    """, [(user_id, totals[user_id]) for user_id in ids])
+
+
+def _run(conn, operation, *args) -> Outcome:
+    """Runs one lifecycle step as a single transaction; rolls back on ChallengeError."""
+    cur = conn.cursor()
+    try:
+        result = operation(cur, *args)
+        conn.commit()
+        return result
+    except ChallengeError as e:
+        conn.rollback()
+        return e.status, {'error': str(e)}
+    finally:
+        cur.close()
+
+
+def _create(cur, creator_id, game_mode: str, stake: int) -> Outcome:
+    if stake < 0:
+        raise ChallengeError('Ставка не может быть отрицательной', 400)
+    _debit(cur, creator_id, stake)
+    cur.execute("""
+        INSERT INTO challenges (creator_id, game_mode, stake, reward, status, escrowed)
+        VALUES (%s, %s, %s, %s, 'open', true)
+        RETURNING id, creator_id, game_mode, stake, reward
+    """, (creator_id, game_mode, stake, reward_for(stake)))
+    challenge = cur.fetchone()
+    return 201, {
+        'id': challenge[0],
+        'creator_id': challenge[1],
+        'game_mode': challenge[2],
+        'stake': challenge[3],
+        'status': 'open',
+        'reward': challenge[4]
+    }
+
+
+def _accept(cur, challenge_id, user_id) -> Outcome:
+    # SKIP LOCKED: during a burst of accepts only the first transaction gets
+    # the row; everyone else fails fast instead of queueing on the lock and
+    # re-checking status afterwards.
+    cur.execute("""
+        SELECT creator_id, stake, escrowed FROM challenges
+        WHERE id = %s AND status = 'open'
+        FOR UPDATE SKIP LOCKED
+    """, (challenge_id,))
+    row = cur.fetchone()
+    if row is None:
+        raise ChallengeError('Challenge not available')
+    creator_id, stake, escrowed = row
+    if creator_id == user_id:
+        raise ChallengeError('Нельзя принять собственный вызов', 400)
+
+    # Status first, stake second: the status change locks site_stats through
+    # trg_site_stats_challenges, and every other step (complete, abort, expire)
+    # takes challenge -> site_stats -> users in that order too. A short balance
+    # raises after the UPDATE and _run rolls both back.
+    cur.execute("""
+        UPDATE challenges SET opponent_id = %s, status = 'accepted', accepted_at = NOW()
+        WHERE id = %s
+    """, (user_id, challenge_id))
+    if escrowed:
+        _debit(cur, user_id, stake or 0)
+    return 201, {'message': 'Challenge accepted'}
+
+
+def _cancel(cur, challenge_id, user_id) -> Outcome:
+    cur.execute("""
+        DELETE FROM challenges
+        WHERE id = %s AND creator_id = %s AND status = 'open'
+        RETURNING stake, escrowed
+    """, (challenge_id, user_id))
+    row = cur.fetchone()
+    if row is None:
+        raise ChallengeError('Cannot cancel this challenge')
+    if row[1]:
+        _credit(cur, user_id, row[0] or 0)
+    return 201, {'message': 'Challenge cancelled'}
+
+
+def _start(cur, challenge_id, server_id, server_host) -> Outcome:
+    cur.execute("""
+        UPDATE challenges
+        SET status = 'in_progress', server_id = %s, server_host = %s, match_started_at = NOW()
+        WHERE id = %s AND status = 'accepted'
+        RETURNING id
+    """, (server_id, server_host, challenge_id))
+    if cur.fetchone() is None:
+        raise ChallengeError('Challenge is not ready to start')
+    return 201, {'message': 'Challenge started'}
+
+
+def _complete(cur, challenge_id, winner_id) -> Outcome:
+    cur.execute("""
+        SELECT creator_id, opponent_id, reward, escrowed FROM challenges
+        WHERE id = %s AND status IN ('accepted', 'in_progress')
+        FOR UPDATE
+    """, (challenge_id,))
+    row = cur.fetchone()
+    if row is None:
+        raise ChallengeError('Challenge cannot be completed')
+    creator_id, opponent_id, reward, escrowed = row
+    # Challenges created before escrow existed never took stakes, so pay nothing
+    reward = reward if escrowed else 0
+    if winner_id not in (creator_id, opponent_id):
+        raise ChallengeError('Winner must be a participant', 400)
+
+    cur.execute("""
+        UPDATE challenges SET status = 'completed', winner_id = %s, completed_at = NOW()
+        WHERE id = %s
+    """, (winner_id, challenge_id))
+    _credit(cur, winner_id, reward or 0)
+    return 201, {'message': 'Challenge completed', 'winner_id': winner_id, 'reward': reward or 0}
+
+
+def _abort(cur, challenge_id) -> Outcome:
+    cur.execute("""
+        UPDATE challenges SET status = 'aborted', completed_at = NOW()
+        WHERE id = %s AND status IN ('accepted', 'in_progress')
+        RETURNING creator_id, opponent_id, stake, escrowed
+    """, (challenge_id,))
+    row = cur.fetchone()
+    if row is None:
+        raise ChallengeError('Challenge cannot be aborted')
+    creator_id, opponent_id, stake, escrowed = row
+    if escrowed:
+        _refund(cur, [(creator_id, stake), (opponent_id, stake)])
+    return 201, {'message': 'Challenge aborted', 'refunded': (stake or 0) if escrowed else 0}
+
+
+def _expire(cur, timeout: int) -> Outcome:
+    # SKIP LOCKED: a challenge being completed right now is left to that transaction
+    cur.execute("""
+        WITH stale AS (
+            SELECT id FROM challenges
+            WHERE status IN ('accepted', 'in_progress')
+              AND COALESCE(match_started_at, accepted_at) < NOW() - %s * INTERVAL '1 second'
+            ORDER BY id
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        )
+        UPDATE challenges c SET status = 'aborted', completed_at = NOW()
+        FROM stale WHERE c.id = stale.id
+        RETURNING c.id, c.creator_id, c.opponent_id, c.stake, c.escrowed
+    """, (timeout, EXPIRE_BATCH))
+    rows = cur.fetchall()
+    _refund(cur, [(user_id, stake) for _, creator_id, opponent_id, stake, escrowed in rows if escrowed
+                  for user_id in (creator_id, opponent_id)])
+    return 200, {'aborted': [row[0] for row in rows]}
+
+
+def create(conn, creator_id, game_mode: str, stake: int) -> Outcome:
+    return _run(conn, _create, creator_id, game_mode, stake)
+
+
+def accept(conn, challenge_id, user_id) -> Outcome:
+    return _run(conn, _accept, challenge_id, user_id)
+
+
+def cancel(conn, challenge_id, user_id) -> Outcome:
+    return _run(conn, _cancel, challenge_id, user_id)
+
+
+def start(conn, challenge_id, server_id=None, server_host=None) -> Outcome:
+    return _run(conn, _start, challenge_id, server_id, server_host)
+
+
+def complete(conn, challenge_id, winner_id) -> Outcome:
+    return _run(conn, _complete, challenge_id, winner_id)
+
+
+def abort(conn, challenge_id) -> Outcome:
+    return _run(conn, _abort, challenge_id)
+
+
+def expire(conn, timeout: int = CHALLENGE_TIMEOUT) -> Outcome:
+    return _run(conn, _expire, timeout)
+
+
+_expired_at = float('-inf')
+_expire_lock = threading.Lock()
+
+
+def expire_if_due(conn) -> None:
+    """Runs expire() at most every EXPIRE_INTERVAL seconds per instance."""
+    global _expired_at
+    if time.monotonic() - _expired_at < EXPIRE_INTERVAL:
+        return
+    with _expire_lock:
+        if time.monotonic() - _expired_at < EXPIRE_INTERVAL:
+            return
+        _expired_at = time.monotonic()
+    expire(conn)
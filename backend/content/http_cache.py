@@ -0,0 +1,110 @@
+import hashlib
+import os
+import threading
+from typing import Any, Dict, Hashable, NamedTuple, Optional, Tuple
+
+from cache import TTLCache
+
+
+class Policy(NamedTuple):
+    cache_control: str
+    ttl: float
+    bypass: Tuple[str, ...] = ()
+
+
+# Public, session-independent reads. ttl is how long this instance reuses a
+# serialized body; other instances only see writes once their copy expires,
+# so it never exceeds what max-age already allows clients to keep.
+POLICIES: Dict[str, Policy] = {
+    'news': Policy('public, max-age=30', 30.0),
+    'tournaments': Policy('public, max-age=15', 15.0),
+    'leaderboard': Policy('public, max-age=5', 5.0),
+    'stats': Policy('public, max-age=15', 15.0, bypass=('action',)),
+}
+DEFAULT_CACHE_CONTROL = 'no-store'
+
+# Headers that describe one particular request (routes.timed); they go out on
+# the response that produced the body but are never stored with it
+PER_REQUEST_HEADERS = frozenset(('x-response-time',))
+
+# Resources whose cached bodies a successful POST makes stale
+INVALIDATES: Dict[str, Tuple[str, ...]] = {
+    'news': ('news',),
+    'tournaments': ('tournaments', 'stats'),
+    'challenges': ('stats',),
+    'match_results': ('leaderboard', 'tournaments', 'stats'),
+    'ratings': ('leaderboard',),
+    'user': ('leaderboard',),
+    'users': ('leaderboard', 'stats'),
+}
+
+Entry = Tuple[str, str, Dict[str, str]]
+
+_bodies = TTLCache(maxsize=int(os.environ.get('HTTP_CACHE_SIZE', '256')), ttl=5.0)
+_generations: Dict[str, int] = {}
+_generations_lock = threading.Lock()
+
+
+def etag_for(body: str) -> str:
+    return '"' + hashlib.blake2b(body.encode('utf-8'), digest_size=16).hexdigest() + '"'
+
+
+def _key(resource: str, params: Dict[str, Any]) -> Optional[Hashable]:
+    policy = POLICIES.get(resource)
+    if policy is None or any(params.get(name) for name in policy.bypass):
+        return None
+    # Bumping the generation orphans every cached variant of the resource at once;
+    # the LRU drops them as new entries come in
+    return resource, _generations.get(resource, 0), tuple(sorted(params.items()))
+
+
+def _if_none_match(event: Dict[str, Any]) -> Optional[str]:
+    headers = event.get('headers') or {}
+    return next((v for k, v in headers.items() if k.lower() == 'if-none-match'), None)
+
+
+def respond(event: Dict[str, Any], entry: Entry) -> Dict[str, Any]:
+    body, etag, headers = entry
+    candidates = _if_none_match(event)
+    if candidates and (candidates.strip() == '*' or etag in (c.strip() for c in candidates.split(','))):
+        return {'statusCode': 304, 'headers': headers, 'body': '', 'isBase64Encoded': False}
+    return {'statusCode': 200, 'headers': headers, 'body': body, 'isBase64Encoded': False}
+
+
+def lookup(event: Dict[str, Any], resource: str, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    key = _key(resource, params)
+    entry = _bodies.get(key) if key is not None else None
+    return respond(event, entry) if entry is not None else None
+
+
+def finish(event: Dict[str, Any], method: str, resource: str, params: Dict[str, Any],
+           response: Dict[str, Any]) -> Dict[str, Any]:
+    """Adds validators and Cache-Control to GET 200s, caches them, and invalidates on writes."""
+    status = response.get('statusCode')
+    if method == 'POST' and 200 <= status < 300:
+        invalidate(*INVALIDATES.get(resource, ()))
+        return response
+    if method != 'GET' or status != 200:
+        return response
+
+    policy = POLICIES.get(resource)
+    key = _key(resource, params)
+    body = response['body']
+    etag = etag_for(body)
+    headers = {
+        **{k: v for k, v in response['headers'].items() if k.lower() not in PER_REQUEST_HEADERS},
+        'ETag': etag,
+        'Cache-Control': policy.cache_control if key is not None else DEFAULT_CACHE_CONTROL
+    }
+    entry = (body, etag, headers)
+    if key is not None:
+        _bodies.set(key, entry, ttl=policy.ttl)
+    fresh = respond(event, entry)
+    fresh['headers'] = {**response['headers'], **headers}
+    return fresh
+
+
+def invalidate(*resources: str) -> None:
+    with _generations_lock:
+        for resource in resources:
+            _generations[resource] = _generations.get(resource, 0) + 1
@@ -1,9 +1,38 @@
 import json
 import os
-import psycopg2
+import select
+import time
+import brackets
+import challenges
+import db
+import http_cache
+import instrument
+import leaderboard
+import match_results
+import matchmaking
+import presence
+import profiles
+import routes
+import serialize
+import tokens
+from batch import BATCH_MAX_ITEMS, batch_result, bulk_insert
+from cache import TTLCache
 # v2
 from typing import Dict, Any
 
+CHAT_MAX_PAGE = 200
+CHAT_MAX_WAIT = float(os.environ.get('CHAT_MAX_WAIT', '25'))
+
+TOURNAMENTS_PAGE = 50
+TOURNAMENTS_MAX_PAGE = 200
+
+NEWS_PAGE = 50
+NEWS_MAX_PAGE = 100
+NEWS_EXCERPT_LENGTH = 280
+
+SEARCH_MAX_LENGTH = 50
+_search_cache = TTLCache(maxsize=512, ttl=float(os.environ.get('SEARCH_CACHE_TTL', '30')))
+
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """
     Business: Universal content API - tournaments, news, friends, challenges
@@ -19,7 +48,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, Authorization, X-Server-Key, If-None-Match',
                 'Access-Control-Max-Age': '86400'
             },
             'body': '',
@@ -33,96 +62,111 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     
     params = event.get('queryStringParameters') or {}
     resource = params.get('resource', 'tournaments')
+    request = instrument.begin(context, 'content', resource, method)
     
     database_url = os.environ.get('DATABASE_URL')
     if not database_url:
-        return {
-            'statusCode': 500,
-            'headers': cors_headers,
-            'body': json.dumps({'error': 'Database connection error'}),
-            'isBase64Encoded': False
-        }
+        return instrument.finish(request, routes.json_response(500, {'error': 'Database connection error'}, cors_headers))
+    
+    if method == 'GET':
+        cached = http_cache.lookup(event, resource, params)
+        if cached is not None:
+            return instrument.finish(request, cached)
+    
+    response = dispatch(event, method, resource, database_url, cors_headers)
+    return instrument.finish(request, http_cache.finish(event, method, resource, params, response))
+
+def dispatch(event, method, resource, database_url, cors_headers):
+    route = ROUTES.resolve(event, resource, method)
+    if route is None:
+        if ROUTES.knows(resource):
+            return routes.json_response(405, {'error': 'Method not allowed'}, cors_headers)
+        return routes.json_response(400, {'error': 'Invalid resource'}, cors_headers)
+    
+    token = tokens.bearer_token(event)
     
     try:
-        if resource == 'tournaments':
-            return handle_tournaments(event, method, database_url, cors_headers)
-        elif resource == 'news':
-            return handle_news(event, method, database_url, cors_headers)
-        elif resource == 'friends':
-            return handle_friends(event, method, database_url, cors_headers)
-        elif resource == 'challenges':
-            return handle_challenges(event, method, database_url, cors_headers)
-        elif resource == 'chat':
-            return handle_chat(event, method, database_url, cors_headers)
-        elif resource == 'user':
-            return handle_user(event, method, database_url, cors_headers)
-        elif resource == 'stats':
-            return handle_stats(event, method, database_url, cors_headers)
-        elif resource == 'leaderboard':
-            return handle_leaderboard(event, method, database_url, cors_headers)
-        elif resource == 'users':
-            return handle_users(event, method, database_url, cors_headers)
-        else:
-            return {
-                'statusCode': 400,
-                'headers': cors_headers,
-                'body': json.dumps({'error': 'Invalid resource'}),
-                'isBase64Encoded': False
-            }
+        with db.connection(database_url) as conn:
+            event['session'] = None
+            if token:
+                tokens.refresh_revocations(conn)
+                try:
+                    event['session'] = tokens.verify(token)
+                except tokens.TokenError as e:
+                    return routes.json_response(401, {'error': str(e)}, cors_headers)
+            
+            return route(event, method, conn, cors_headers)
     except Exception as e:
-        return {
-            'statusCode': 500,
-            'headers': cors_headers,
-            'body': json.dumps({'error': str(e)}),
-            'isBase64Encoded': False
-        }
+        instrument.record_error(e)
+        request = instrument.current()
+        return routes.json_response(500, {'error': str(e), 'request_id': request and request.request_id}, cors_headers)
 
-def handle_tournaments(event, method, database_url, headers):
-    conn = psycopg2.connect(database_url)
-    cur = conn.cursor()
-    
+def server_or_admin(event):
+    return match_results.authorized(event) or (event.get('session') or {}).get('adm')
+
+def forbidden(headers, message='Admin session or server key required'):
+    return {'statusCode': 403, 'headers': headers, 'body': serialize.dumps({'error': message}), 'isBase64Encoded': False}
+
+TOURNAMENT_COLUMNS = serialize.Columns(
+    ('id', 't.id'), ('name', 't.name'), ('status', 't.status'), ('prize_pool', 't.prize_pool'),
+    ('max_participants', 't.max_participants'), ('start_date', 't.start_date'), ('format', 't.format'),
+    ('participants_count', 't.participants_count'), ('_sort_key', 'COALESCE(t.start_date, t.created_at)')
+)
+
+def handle_tournaments(event, method, conn, headers):
     if method == 'GET':
         params = event.get('queryStringParameters') or {}
-        status = params.get('status')
         
-        if status:
-            cur.execute("""
-                SELECT t.*, COUNT(tp.user_id) as participants
-                FROM tournaments t
-                LEFT JOIN tournament_participants tp ON t.id = tp.tournament_id
-                WHERE t.status = %s
-                GROUP BY t.id
-                ORDER BY t.start_date DESC
-            """, (status,))
-        else:
-            cur.execute("""
-                SELECT t.*, COUNT(tp.user_id) as participants
-                FROM tournaments t
-                LEFT JOIN tournament_participants tp ON t.id = tp.tournament_id
-                GROUP BY t.id
-                ORDER BY t.start_date DESC
-            """)
+        if params.get('id'):
+            bracket = brackets.view(conn, int(params['id']))
+            if bracket is None:
+                return {'statusCode': 404, 'headers': headers, 'body': serialize.dumps({'error': 'Tournament not found'}), 'isBase64Encoded': False}
+            return {'statusCode': 200, 'headers': headers, 'body': serialize.dumps(bracket), 'isBase64Encoded': False}
+        
+        try:
+            limit = min(max(int(params.get('limit', TOURNAMENTS_PAGE)), 1), TOURNAMENTS_MAX_PAGE)
+            after = serialize.parse_cursor(params['after']) if params.get('after') else None
+        except ValueError:
+            return {'statusCode': 400, 'headers': headers, 'body': serialize.dumps({'error': 'limit must be an integer and after a cursor from X-Next-Cursor'}), 'isBase64Encoded': False}
+        where, args = [], []
+        if params.get('status'):
+            where.append('t.status = %s')
+            args.append(params['status'])
+        if after:
+            after_key, after_id = after
+            where.append('(COALESCE(t.start_date, t.created_at), t.id) < (%s::timestamptz, %s)')
+            args += [after_key, after_id]
         
+        cur = conn.cursor()
+        cur.execute(f"""
+            SELECT {TOURNAMENT_COLUMNS.sql}
+            FROM tournaments t
+            {'WHERE ' + ' AND '.join(where) if where else ''}
+            ORDER BY COALESCE(t.start_date, t.created_at) DESC, t.id DESC
+            LIMIT %s
+        """, args + [limit])
         tournaments = cur.fetchall()
-        result = [
-            {
-                'id': t[0],
-                'name': t[1],
-                'status': t[2],
-                'prize_pool': t[3],
-                'max_participants': t[4],
-                'start_date': t[5].isoformat() if t[5] else None,
-                'format': t[7],
-                'participants_count': t[9]
-            }
-            for t in tournaments
-        ]
+        cur.close()
+        
+        result = TOURNAMENT_COLUMNS.all(tournaments)
+        # The body stays a plain list for existing clients; the cursor travels in a header
+        if len(tournaments) == limit:
+            last = tournaments[-1]
+            sort_key = last[TOURNAMENT_COLUMNS.index('_sort_key')]
+            headers = {**headers, 'X-Next-Cursor': serialize.cursor(sort_key, last[0]),
+                       'Access-Control-Expose-Headers': 'X-Next-Cursor'}
+        return {'statusCode': 200, 'headers': headers, 'body': serialize.dumps(result), 'isBase64Encoded': False}
         
     elif method == 'POST':
         body = json.loads(event.get('body', '{}'))
         action = body.get('action', 'create')
         
         if action == 'create':
+            format_ = body.get('format', 'single-elimination')
+            if format_ not in brackets.FORMATS:
+                return {'statusCode': 400, 'headers': headers, 'body': serialize.dumps({'error': f'Unsupported format: {format_}'}), 'isBase64Encoded': False}
+            
+            cur = conn.cursor()
             cur.execute("""
                 INSERT INTO tournaments (name, status, prize_pool, max_participants, start_date, format)
                 VALUES (%s, %s, %s, %s, %s, %s)
@@ -133,178 +177,136 @@ def handle_tournaments(event, method, database_url, headers):
                 body.get('prize_pool', 0),
                 body.get('max_participants', 16),
                 body.get('start_date'),
-                body.get('format', 'single-elimination')
+                format_
             ))
             
             tournament = cur.fetchone()
             conn.commit()
-            result = {
+            cur.close()
+            status_code, result = 201, {
                 'id': tournament[0],
                 'name': tournament[1],
                 'status': tournament[2],
                 'prize_pool': tournament[3]
             }
             
-        elif action == 'register':
-            cur.execute("""
-                INSERT INTO tournament_participants (tournament_id, user_id)
-                VALUES (%s, %s)
-                RETURNING id
-            """, (body.get('tournament_id'), body.get('user_id')))
-            
-            conn.commit()
-            result = {'message': 'Registered successfully'}
+        elif action in ('register', 'withdraw'):
+            user_id = (event.get('session') or {}).get('sub') or body.get('user_id')
+            if not (user_id and body.get('tournament_id')):
+                return {'statusCode': 400, 'headers': headers, 'body': serialize.dumps({'error': 'tournament_id and user_id required'}), 'isBase64Encoded': False}
+            operation = brackets.register if action == 'register' else brackets.withdraw
+            status_code, result = operation(conn, int(body['tournament_id']), int(user_id))
+        
+        elif action in ('start', 'advance'):
+            # Progression normally follows match results; this is the manual override.
+            # The route already requires SERVER_OR_ADMIN; checked again in case of misrouting
+            if not server_or_admin(event):
+                return forbidden(headers)
+            operation = brackets.start if action == 'start' else brackets.advance
+            status_code, result = operation(conn, int(body['tournament_id']))
+        else:
+            status_code, result = 400, {'error': 'Unknown action'}
     else:
-        result = {'error': 'Method not allowed'}
-    
-    cur.close()
-    conn.close()
+        status_code, result = 405, {'error': 'Method not allowed'}
     
     return {
-        'statusCode': 200 if method == 'GET' else 201,
+        'statusCode': status_code,
         'headers': headers,
-        'body': json.dumps(result),
+        'body': serialize.dumps(result),
         'isBase64Encoded': False
     }
 
-def handle_news(event, method, database_url, headers):
-    conn = psycopg2.connect(database_url)
-    cur = conn.cursor()
-    
-    # Создаем таблицу если не существует
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS news (
-            id SERIAL PRIMARY KEY,
-            title VARCHAR(255) NOT NULL,
-            category VARCHAR(50),
-            content TEXT,
-            author_id INTEGER REFERENCES users(id),
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-    conn.commit()
-    
-    if method == 'GET':
-        cur.execute("""
-            SELECT n.*, u.username, u.display_name
+def handle_news(event, method, conn, headers):
+    params = event.get('queryStringParameters') or {}
+    where, args = [], []
+    try:
+        limit = min(max(int(params.get('limit', NEWS_PAGE)), 1), NEWS_MAX_PAGE)
+        if params.get('id'):
+            where.append('n.id = %s')
+            args.append(int(params['id']))
+        if params.get('after'):
+            after_created, after_id = serialize.parse_cursor(params['after'])
+            where.append('(n.created_at, n.id) < (%s::timestamp, %s)')
+            args += [after_created, after_id]
+    except ValueError:
+        return {'statusCode': 400, 'headers': headers, 'body': serialize.dumps({'error': 'Invalid news parameters'}), 'isBase64Encoded': False}
+    if params.get('category'):
+        where.append('n.category = %s')
+        args.append(params['category'])
+    
+    if params.get('summary') in ('1', 'true'):
+        # Feed cards: no body and no author join, just a bounded excerpt
+        select = f"""
+            SELECT n.id, n.title, n.category,
+                   CASE WHEN length(n.content) > {NEWS_EXCERPT_LENGTH}
+                        THEN rtrim(left(n.content, {NEWS_EXCERPT_LENGTH})) || '…'
+                        ELSE n.content END AS excerpt,
+                   n.created_at
             FROM news n
-            LEFT JOIN users u ON n.author_id = u.id
-            ORDER BY n.created_at DESC
-            LIMIT 50
-        """)
-        
-        news = cur.fetchall()
-        result = [
-            {
-                'id': n[0],
-                'title': n[1],
-                'category': n[2],
-                'content': n[3],
-                'author': {
-                    'id': n[4],
-                    'username': n[6],
-                    'displayName': n[7]
-                } if n[4] else None,
-                'created_at': n[5].isoformat() if n[5] else None
-            }
-            for n in news
-        ]
-        
-    elif method == 'POST':
-        body = json.loads(event.get('body', '{}'))
-        
-        cur.execute("""
-            INSERT INTO news (title, category, content, author_id)
-            VALUES (%s, %s, %s, %s)
-            RETURNING id, title, category, created_at
-        """, (
-            body.get('title'),
-            body.get('category', 'update'),
-            body.get('content'),
-            body.get('author_id')
-        ))
-        
-        news_item = cur.fetchone()
-        conn.commit()
-        
-        result = {
-            'id': news_item[0],
-            'title': news_item[1],
-            'category': news_item[2],
-            'created_at': news_item[3].isoformat()
-        }
+        """
     else:
-        result = {'error': 'Method not allowed'}
+        select = """
+            SELECT n.id, n.title, n.category, n.content,
+                   CASE WHEN n.author_id IS NOT NULL THEN json_build_object(
+                       'id', n.author_id, 'username', u.username, 'displayName', u.display_name
+                   ) END AS author,
+                   n.created_at
+            FROM news n
+            LEFT JOIN users u ON n.author_id = u.id
+        """
     
+    cur = conn.cursor()
+    # Postgres renders the page; the JSON text is the response body as-is
+    body, count, last = serialize.json_page(cur, f"""
+        {select}
+        {'WHERE ' + ' AND '.join(where) if where else ''}
+        ORDER BY n.created_at DESC, n.id DESC
+        LIMIT %s
+    """, "to_char(r.created_at, 'YYYY-MM-DD\"T\"HH24:MI:SS.US') || '|' || r.id", args + [limit])
     cur.close()
-    conn.close()
-    
-    return {
-        'statusCode': 200 if method == 'GET' else 201,
-        'headers': headers,
-        'body': json.dumps(result),
-        'isBase64Encoded': False
-    }
+    if count == limit:
+        headers = {**headers, 'X-Next-Cursor': serialize.encode_cursor(last),
+                   'Access-Control-Expose-Headers': 'X-Next-Cursor'}
+    return {'statusCode': 200, 'headers': headers, 'body': body, 'isBase64Encoded': False}
+
+FRIEND_REQUEST_COLUMNS = serialize.Columns(
+    ('id', 'u.id'), ('username', 'u.username'), ('displayName', 'u.display_name'),
+    ('points', 'u.points'), ('level', 'u.level'), ('request_id', 'f.id'), ('created_at', 'f.created_at')
+)
+FRIEND_COLUMNS = serialize.Columns(
+    ('id', 'u.id'), ('username', 'u.username'), ('displayName', 'u.display_name'),
+    ('points', 'u.points'), ('level', 'u.level'),
+    ('status', f"CASE WHEN {presence.online_sql('p.last_seen_at')} THEN 'online' ELSE 'offline' END")
+)
 
-def handle_friends(event, method, database_url, headers):
-    conn = psycopg2.connect(database_url)
+def handle_friends(event, method, conn, headers):
     cur = conn.cursor()
     
-    # Создаем таблицу если не существует
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS friends (
-            id SERIAL PRIMARY KEY,
-            user_id INTEGER REFERENCES users(id),
-            friend_id INTEGER REFERENCES users(id),
-            status VARCHAR(20) DEFAULT 'pending',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            UNIQUE(user_id, friend_id)
-        )
-    """)
-    conn.commit()
-    
     if method == 'GET':
         params = event.get('queryStringParameters') or {}
         user_id = params.get('user_id')
         get_requests = params.get('requests') == 'true'
         
-        if not user_id:
-            cur.close()
-            conn.close()
-            return {'statusCode': 400, 'headers': headers, 'body': json.dumps({'error': 'user_id required'}), 'isBase64Encoded': False}
-        
         if get_requests:
             # Получить входящие заявки
-            cur.execute("""
-                SELECT u.id, u.username, u.display_name, u.points, u.level, f.id as request_id, f.created_at
+            cur.execute(f"""
+                SELECT {FRIEND_REQUEST_COLUMNS.sql}
                 FROM friends f
                 JOIN users u ON f.user_id = u.id
                 WHERE f.friend_id = %s AND f.status = 'pending'
                 ORDER BY f.created_at DESC
             """, (user_id,))
-            
-            requests = cur.fetchall()
-            result = [{
-                'id': r[0], 'username': r[1], 'displayName': r[2],
-                'points': r[3], 'level': r[4], 'request_id': r[5],
-                'created_at': r[6].isoformat() if r[6] else None
-            } for r in requests]
+            result = FRIEND_REQUEST_COLUMNS.all(cur.fetchall())
         else:
-            # Получить друзей
-            cur.execute("""
-                SELECT u.id, u.username, u.display_name, u.points, u.level, f.status
+            # Получить друзей (у принятой дружбы есть строка в каждом направлении)
+            cur.execute(f"""
+                SELECT {FRIEND_COLUMNS.sql}
                 FROM friends f
-                JOIN users u ON (f.friend_id = u.id OR f.user_id = u.id)
-                WHERE (f.user_id = %s OR f.friend_id = %s) AND u.id != %s AND f.status = 'accepted'
-            """, (user_id, user_id, user_id))
-            
-            friends = cur.fetchall()
-            result = [{
-                'id': f[0], 'username': f[1], 'displayName': f[2],
-                'points': f[3], 'level': f[4],
-                'status': 'online' if f[0] % 2 == 0 else 'offline'
-            } for f in friends]
+                JOIN users u ON u.id = f.friend_id
+                LEFT JOIN user_presence p ON p.user_id = f.friend_id
+                WHERE f.user_id = %s AND f.status = 'accepted'
+            """, (user_id,))
+            result = FRIEND_COLUMNS.all(cur.fetchall())
         
     elif method == 'POST':
         body = json.loads(event.get('body', '{}'))
@@ -322,236 +324,290 @@ def handle_friends(event, method, database_url, headers):
             
         elif action == 'accept':
             cur.execute("""
-                UPDATE friends SET status = 'accepted'
-                WHERE id = %s
-                RETURNING id
+                WITH accepted AS (
+                    UPDATE friends SET status = 'accepted'
+                    WHERE id = %s
+                    RETURNING user_id, friend_id
+                )
+                INSERT INTO friends (user_id, friend_id, status)
+                SELECT friend_id, user_id, 'accepted' FROM accepted
+                ON CONFLICT (user_id, friend_id) DO UPDATE SET status = 'accepted'
             """, (body.get('request_id'),))
             conn.commit()
             result = {'message': 'Friend request accepted'}
         
         elif action == 'reject':
-            cur.execute("DELETE FROM friends WHERE id = %s", (body.get('request_id'),))
+            cur.execute("""
+                WITH removed AS (
+                    DELETE FROM friends WHERE id = %s
+                    RETURNING user_id, friend_id, status
+                )
+                DELETE FROM friends f
+                USING removed r
+                WHERE r.status = 'accepted' AND f.user_id = r.friend_id AND f.friend_id = r.user_id
+            """, (body.get('request_id'),))
             conn.commit()
             result = {'message': 'Friend request rejected'}
     else:
         result = {'error': 'Method not allowed'}
     
     cur.close()
-    conn.close()
     
     return {
         'statusCode': 200 if method == 'GET' else 201,
         'headers': headers,
-        'body': json.dumps(result),
+        'body': serialize.dumps(result),
         'isBase64Encoded': False
     }
 
-def handle_challenges(event, method, database_url, headers):
-    conn = psycopg2.connect(database_url)
-    cur = conn.cursor()
+def handle_matchmaking(event, method, conn, headers):
+    if method == 'GET':
+        params = event.get('queryStringParameters') or {}
+        user_id = params.get('user_id')
+    elif method == 'POST':
+        body = json.loads(event.get('body', '{}'))
+        user_id = body.get('user_id')
+    else:
+        return {'statusCode': 405, 'headers': headers, 'body': serialize.dumps({'error': 'Method not allowed'}), 'isBase64Encoded': False}
+    
+    user_id = (event.get('session') or {}).get('sub') or user_id
+    if not user_id:
+        return {'statusCode': 400, 'headers': headers, 'body': serialize.dumps({'error': 'user_id required'}), 'isBase64Encoded': False}
+    user_id = int(user_id)
+    
+    if method == 'POST':
+        action = body.get('action', 'join')
+        if action == 'join':
+            matchmaking.join(conn, user_id, body.get('game_mode', '1v1'))
+        elif action == 'leave':
+            removed = matchmaking.leave(conn, user_id)
+            return {'statusCode': 200, 'headers': headers, 'body': serialize.dumps({'status': 'idle', 'removed': removed}), 'isBase64Encoded': False}
+        else:
+            return {'statusCode': 400, 'headers': headers, 'body': serialize.dumps({'error': 'Unknown action'}), 'isBase64Encoded': False}
     
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS challenges (
-            id SERIAL PRIMARY KEY,
-            creator_id INTEGER REFERENCES users(id),
-            opponent_id INTEGER,
-            game_mode VARCHAR(10),
-            stake INTEGER DEFAULT 0,
-            status VARCHAR(20) DEFAULT 'open',
-            winner_id INTEGER,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-    conn.commit()
+    match = matchmaking.try_match(conn, user_id)
+    if match is None:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT id, match_id, game_mode, status, player1_id, player2_id, created_at
+            FROM matches
+            WHERE (player1_id = %s OR player2_id = %s) AND status IN ('waiting', 'in_progress')
+            ORDER BY created_at DESC LIMIT 1
+        """, (user_id, user_id))
+        match = cur.fetchone()
+        cur.close()
+    
+    if match:
+        result = {'status': 'matched', 'match': {
+            'id': match[0], 'matchId': match[1], 'gameMode': match[2], 'status': match[3],
+            'player1Id': match[4], 'player2Id': match[5],
+            'createdAt': match[6].isoformat() if match[6] else None
+        }}
+    else:
+        index = matchmaking.get_index(conn)
+        entry = index.entries.get(user_id)
+        if entry:
+            waited = max(time.monotonic() - entry[2], 0)
+            result = {
+                'status': 'searching', 'gameMode': entry[0], 'skillRating': entry[1],
+                'waitSeconds': int(waited),
+                'ratingWindow': matchmaking.search_window(entry[2], time.monotonic()),
+                'queueSize': index.size(entry[0])
+            }
+        else:
+            result = {'status': 'idle'}
     
+    return {'statusCode': 200, 'headers': headers, 'body': serialize.dumps(result), 'isBase64Encoded': False}
+
+def handle_match_results(event, method, conn, headers):
+    body = json.loads(event.get('body', '{}'))
+    items = body.get('results')
+    if not isinstance(items, list):
+        return {'statusCode': 400, 'headers': headers, 'body': serialize.dumps({'error': 'results array required'}), 'isBase64Encoded': False}
+    
+    summary = match_results.ingest(conn, items)
+    brackets.advance_for_matches(conn, [r['match_id'] for r in summary['results'] if r['status'] == 'recorded'])
+    return {'statusCode': 200, 'headers': headers, 'body': serialize.dumps(summary), 'isBase64Encoded': False}
+
+def handle_presence(event, method, conn, headers):
+    if method != 'POST':
+        return {'statusCode': 405, 'headers': headers, 'body': serialize.dumps({'error': 'Method not allowed'}), 'isBase64Encoded': False}
+    
+    body = json.loads(event.get('body', '{}'))
+    user_id = (event.get('session') or {}).get('sub') or body.get('user_id')
+    if not user_id:
+        return {'statusCode': 400, 'headers': headers, 'body': serialize.dumps({'error': 'user_id required'}), 'isBase64Encoded': False}
+    
+    presence.heartbeat(conn, int(user_id))
+    return {'statusCode': 200, 'headers': headers, 'body': serialize.dumps({
+        'status': 'online', 'ttl': presence.PRESENCE_TTL
+    }), 'isBase64Encoded': False}
+
+CHALLENGE_COLUMNS = serialize.Columns(
+    ('id', 'c.id'),
+    ('creator.id', 'c.creator_id'), ('creator.username', 'u1.username'), ('creator.displayName', 'u1.display_name'),
+    ('opponent.id', 'c.opponent_id'), ('opponent.username', 'u2.username'), ('opponent.displayName', 'u2.display_name'),
+    ('game_mode', 'c.game_mode'), ('stake', 'c.stake'), ('status', 'c.status'),
+    ('reward', 'COALESCE(c.reward, 0)'), ('winner_id', 'c.winner_id'), ('created_at', 'c.created_at')
+)
+
+def handle_challenges(event, method, conn, headers):
     if method == 'GET':
+        # Timed-out accepted/in_progress challenges are refunded here at most once a minute
+        challenges.expire_if_due(conn)
         params = event.get('queryStringParameters') or {}
         user_id = params.get('user_id')
         status = params.get('status')
         
         if user_id and not status:
-            cur.execute("""
-                SELECT c.*, u1.username as creator_name, u1.display_name as creator_display_name,
-                       u2.username as opponent_name, u2.display_name as opponent_display_name
-                FROM challenges c
-                LEFT JOIN users u1 ON c.creator_id = u1.id
-                LEFT JOIN users u2 ON c.opponent_id = u2.id
-                WHERE c.creator_id = %s
-                ORDER BY c.created_at DESC
-                LIMIT 50
-            """, (user_id,))
+            where, args = 'c.creator_id = %s', (user_id,)
         elif status:
-            cur.execute("""
-                SELECT c.*, u1.username as creator_name, u1.display_name as creator_display_name,
-                       u2.username as opponent_name, u2.display_name as opponent_display_name
-                FROM challenges c
-                LEFT JOIN users u1 ON c.creator_id = u1.id
-                LEFT JOIN users u2 ON c.opponent_id = u2.id
-                WHERE c.status = %s
-                ORDER BY c.created_at DESC
-                LIMIT 50
-            """, (status,))
+            where, args = 'c.status = %s', (status,)
         else:
-            cur.execute("""
-                SELECT c.*, u1.username as creator_name, u1.display_name as creator_display_name,
-                       u2.username as opponent_name, u2.display_name as opponent_display_name
-                FROM challenges c
-                LEFT JOIN users u1 ON c.creator_id = u1.id
-                LEFT JOIN users u2 ON c.opponent_id = u2.id
-                WHERE c.status = 'open'
-                ORDER BY c.created_at DESC
-                LIMIT 50
-            """)
+            where, args = "c.status = 'open'", ()
         
-        challenges = cur.fetchall()
-        result = [
-            {
-                'id': ch[0],
-                'creator': {
-                    'id': ch[1],
-                    'username': ch[8],
-                    'displayName': ch[9]
-                },
-                'opponent': {
-                    'id': ch[2],
-                    'username': ch[10],
-                    'displayName': ch[11]
-                } if ch[2] else None,
-                'game_mode': ch[3],
-                'stake': ch[4],
-                'status': ch[5],
-                'reward': int(ch[4] * 1.8) if ch[4] else 0,
-                'created_at': ch[7].isoformat() if ch[7] else None
-            }
-            for ch in challenges
-        ]
+        cur = conn.cursor()
+        cur.execute(f"""
+            SELECT {CHALLENGE_COLUMNS.sql}
+            FROM challenges c
+            LEFT JOIN users u1 ON c.creator_id = u1.id
+            LEFT JOIN users u2 ON c.opponent_id = u2.id
+            WHERE {where}
+            ORDER BY c.created_at DESC
+            LIMIT 50
+        """, args)
+        rows = cur.fetchall()
+        cur.close()
+        
+        result = CHALLENGE_COLUMNS.all(rows)
+        status_code = 200
         
     elif method == 'POST':
         body = json.loads(event.get('body', '{}'))
         action = body.get('action', 'create')
         
+        if action in ('create', 'accept', 'cancel'):
+            # These move escrowed points, so the acting user only ever comes from the session
+            user_id = (event.get('session') or {}).get('sub')
+            if not user_id:
+                return {'statusCode': 401, 'headers': headers, 'body': serialize.dumps({'error': 'Требуется токен сессии'}), 'isBase64Encoded': False}
+            if action != 'create' and not body.get('challenge_id'):
+                return {'statusCode': 400, 'headers': headers, 'body': serialize.dumps({'error': 'challenge_id required'}), 'isBase64Encoded': False}
+        
         if action == 'create':
-            cur.execute("""
-                INSERT INTO challenges (creator_id, game_mode, stake, status)
-                VALUES (%s, %s, %s, 'open')
-                RETURNING id, creator_id, game_mode, stake
-            """, (
-                body.get('creator_id'),
-                body.get('game_mode', '1v1'),
-                body.get('stake', 0)
-            ))
-            
-            challenge = cur.fetchone()
-            conn.commit()
-            
-            result = {
-                'id': challenge[0],
-                'creator_id': challenge[1],
-                'game_mode': challenge[2],
-                'stake': challenge[3],
-                'status': 'open',
-                'reward': int(challenge[3] * 1.8)
-            }
-            
+            try:
+                stake = int(body.get('stake', 0) or 0)
+            except (TypeError, ValueError):
+                return {'statusCode': 400, 'headers': headers, 'body': serialize.dumps({'error': 'stake must be an integer'}), 'isBase64Encoded': False}
+            status_code, result = challenges.create(conn, int(user_id), body.get('game_mode', '1v1'), stake)
         elif action == 'accept':
-            cur.execute("""
-                UPDATE challenges 
-                SET opponent_id = %s, status = 'accepted'
-                WHERE id = %s AND status = 'open'
-                RETURNING id
-            """, (body.get('user_id'), body.get('challenge_id')))
-            
-            if cur.rowcount > 0:
-                conn.commit()
-                result = {'message': 'Challenge accepted'}
-            else:
-                result = {'error': 'Challenge not available'}
-                
+            status_code, result = challenges.accept(conn, body.get('challenge_id'), int(user_id))
         elif action == 'cancel':
-            cur.execute("""
-                DELETE FROM challenges 
-                WHERE id = %s AND creator_id = %s AND status = 'open'
-                RETURNING id
-            """, (body.get('challenge_id'), body.get('user_id')))
-            
-            if cur.rowcount > 0:
-                conn.commit()
-                result = {'message': 'Challenge cancelled'}
+            status_code, result = challenges.cancel(conn, body.get('challenge_id'), int(user_id))
+        elif action in ('abort', 'expire'):
+            # Refund paths for matches that never report a result
+            if not server_or_admin(event):
+                return forbidden(headers)
+            if action == 'abort':
+                status_code, result = challenges.abort(conn, body.get('challenge_id'))
+            else:
+                status_code, result = challenges.expire(conn)
+        elif action in ('start', 'complete'):
+            # Routed behind SERVER_OR_ADMIN, checked again here: outcomes never come from players
+            if not server_or_admin(event):
+                return forbidden(headers)
+            if action == 'start':
+                status_code, result = challenges.start(
+                    conn, body.get('challenge_id'), body.get('server_id'), body.get('server_host')
+                )
             else:
-                result = {'error': 'Cannot cancel this challenge'}
+                status_code, result = challenges.complete(conn, body.get('challenge_id'), int(body.get('winner_id') or 0))
+        else:
+            status_code, result = 400, {'error': 'Unknown action'}
     else:
-        result = {'error': 'Method not allowed'}
-    
-    cur.close()
-    conn.close()
+        status_code, result = 405, {'error': 'Method not allowed'}
     
     return {
-        'statusCode': 200 if method == 'GET' else 201,
+        'statusCode': status_code,
         'headers': headers,
-        'body': json.dumps(result),
+        'body': serialize.dumps(result),
         'isBase64Encoded': False
     }
 
-def handle_stats(event, method, database_url, headers):
+def handle_stats(event, method, conn, headers):
     if method != 'GET':
         return {
             'statusCode': 405,
             'headers': headers,
-            'body': json.dumps({'error': 'Method not allowed'})
+            'body': serialize.dumps({'error': 'Method not allowed'})
         }
     
-    conn = psycopg2.connect(database_url)
+    # Repeat reads are served by http_cache (POLICIES['stats']) and dropped when
+    # tournaments, challenges or users change (INVALIDATES)
     cur = conn.cursor()
-    
-    cur.execute("SELECT COUNT(*) FROM users WHERE is_active = true")
-    total_users = cur.fetchone()[0]
-    
-    cur.execute("SELECT COUNT(DISTINCT user_id) FROM friends WHERE status = 'accepted' AND created_at > NOW() - INTERVAL '5 minutes'")
-    online_users = cur.fetchone()[0]
-    
-    cur.execute("SELECT COUNT(*) FROM tournaments WHERE status IN ('completed', 'live')")
-    total_tournaments = cur.fetchone()[0]
-    
-    cur.execute("SELECT COUNT(*) FROM challenges WHERE status IN ('accepted', 'completed')")
-    total_challenges = cur.fetchone()[0]
-    
-    cur.execute("SELECT COALESCE(SUM(prize_pool), 0) FROM tournaments WHERE status = 'completed'")
-    tournament_prizes = cur.fetchone()[0]
-    
-    cur.execute("SELECT COALESCE(SUM(stake * 2), 0) FROM challenges WHERE status = 'completed'")
-    challenge_prizes = cur.fetchone()[0]
-    
+    cur.execute(f"""
+        SELECT s.total_users, s.total_tournaments, s.total_challenges,
+               s.tournament_prizes, s.challenge_prizes,
+               (SELECT COUNT(*) FROM user_presence
+                WHERE last_seen_at > NOW() - INTERVAL '{presence.PRESENCE_TTL} seconds')
+        FROM site_stats s WHERE s.id = 1
+    """)
+    stats = cur.fetchone() or (0, 0, 0, 0, 0, 0)
     cur.close()
-    conn.close()
     
     result = {
-        'totalUsers': total_users,
-        'onlineUsers': online_users,
-        'totalTournamentsAndChallenges': total_tournaments + total_challenges,
-        'totalPrizePool': int(tournament_prizes + challenge_prizes)
+        'totalUsers': stats[0],
+        'onlineUsers': stats[5],
+        'totalTournamentsAndChallenges': stats[1] + stats[2],
+        'totalPrizePool': int(stats[3] + stats[4])
     }
     
     return {
         'statusCode': 200,
         'headers': headers,
-        'body': json.dumps(result)
+        'body': serialize.dumps(result)
     }
 
-def handle_chat(event, method, database_url, headers):
-    conn = psycopg2.connect(database_url)
+def verify_stats(event, method, conn, headers):
+    """
+    Compares trigger-maintained site_stats counters with the raw aggregates.
+    Five full-table scans, so admin or server key only (?action=verify).
+    """
     cur = conn.cursor()
-    
     cur.execute("""
-        CREATE TABLE IF NOT EXISTS messages (
-            id SERIAL PRIMARY KEY,
-            sender_id INTEGER REFERENCES users(id),
-            receiver_id INTEGER REFERENCES users(id),
-            message TEXT NOT NULL,
-            is_read BOOLEAN DEFAULT FALSE,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
+        SELECT total_users, total_tournaments, total_challenges, tournament_prizes, challenge_prizes
+        FROM site_stats WHERE id = 1
+    """)
+    counters = cur.fetchone() or (0, 0, 0, 0, 0)
+    cur.execute("""
+        SELECT (SELECT COUNT(*) FROM users WHERE is_active = true),
+               (SELECT COUNT(*) FROM tournaments WHERE status IN ('completed', 'live')),
+               (SELECT COUNT(*) FROM challenges WHERE status IN ('accepted', 'completed')),
+               (SELECT COALESCE(SUM(prize_pool), 0) FROM tournaments WHERE status = 'completed'),
+               (SELECT COALESCE(SUM(stake * 2), 0) FROM challenges WHERE status = 'completed')
     """)
-    conn.commit()
+    raw = cur.fetchone()
+    cur.close()
+    
+    names = ['total_users', 'total_tournaments', 'total_challenges', 'tournament_prizes', 'challenge_prizes']
+    counters = dict(zip(names, (int(v) for v in counters)))
+    raw = dict(zip(names, (int(v) for v in raw)))
+    mismatched = [name for name in names if counters[name] != raw[name]]
+    
+    return {
+        'statusCode': 200,
+        'headers': headers,
+        'body': serialize.dumps({
+            'consistent': not mismatched,
+            'mismatched': mismatched,
+            'counters': counters,
+            'raw': raw
+        }),
+        'isBase64Encoded': False
+    }
+
+def handle_chat(event, method, conn, headers):
+    cur = conn.cursor()
     
     if method == 'GET':
         params = event.get('queryStringParameters') or {}
@@ -560,20 +616,40 @@ def handle_chat(event, method, database_url, headers):
         
         if not user_id:
             cur.close()
-            conn.close()
-            return {'statusCode': 400, 'headers': headers, 'body': json.dumps({'error': 'user_id required'}), 'isBase64Encoded': False}
+            return {'statusCode': 400, 'headers': headers, 'body': serialize.dumps({'error': 'user_id required'}), 'isBase64Encoded': False}
+        
+        try:
+            user_id = int(user_id)
+            friend_id = int(friend_id) if friend_id else None
+            before = int(params['before']) if params.get('before') else None
+            after = int(params['after']) if params.get('after') else None
+            limit = min(max(int(params.get('limit', 100)), 1), CHAT_MAX_PAGE)
+            wait = min(max(float(params.get('wait', 0)), 0), CHAT_MAX_WAIT)
+            if wait != wait:
+                raise ValueError('wait is NaN')
+        except ValueError:
+            cur.close()
+            return {'statusCode': 400, 'headers': headers, 'body': serialize.dumps({'error': 'Invalid chat parameters'}), 'isBase64Encoded': False}
         
-        if friend_id:
+        if params.get('summary') == 'unread':
             cur.execute("""
-                SELECT m.*, u1.username as sender_username, u2.username as receiver_username
-                FROM messages m
-                LEFT JOIN users u1 ON m.sender_id = u1.id
-                LEFT JOIN users u2 ON m.receiver_id = u2.id
-                WHERE (m.sender_id = %s AND m.receiver_id = %s) OR (m.sender_id = %s AND m.receiver_id = %s)
-                ORDER BY m.created_at ASC LIMIT 100
-            """, (user_id, friend_id, friend_id, user_id))
+                SELECT sender_id, COUNT(*), MAX(id)
+                FROM messages
+                WHERE receiver_id = %s AND is_read = false
+                GROUP BY sender_id
+            """, (user_id,))
+            result = [{'friend_id': r[0], 'unread': r[1], 'last_message_id': r[2]} for r in cur.fetchall()]
+        elif friend_id:
+            low, high = sorted((user_id, friend_id))
+            
+            fetch = lambda c: fetch_conversation(c, low, high, before, after, limit)
+            if after is not None and wait > 0:
+                cur.close()
+                messages = wait_for_messages(conn, f'chat_{low}_{high}', wait, fetch)
+                cur = conn.cursor()
+            else:
+                messages = fetch(cur)
             
-            messages = cur.fetchall()
             result = [{
                 'id': msg[0], 'sender_id': msg[1], 'receiver_id': msg[2],
                 'message': msg[3], 'is_read': msg[4],
@@ -585,25 +661,119 @@ def handle_chat(event, method, database_url, headers):
     
     elif method == 'POST':
         body = json.loads(event.get('body', '{}'))
-        cur.execute("""
-            INSERT INTO messages (sender_id, receiver_id, message)
-            VALUES (%s, %s, %s)
-            RETURNING id, sender_id, receiver_id, message, created_at
-        """, (body.get('sender_id'), body.get('receiver_id'), body.get('message')))
+        action = body.get('action', 'send')
         
-        message = cur.fetchone()
-        conn.commit()
-        result = {'id': message[0], 'sender_id': message[1], 'receiver_id': message[2],
-                  'message': message[3], 'created_at': message[4].isoformat()}
+        if action == 'mark_read':
+            query = """
+                UPDATE messages SET is_read = true
+                WHERE receiver_id = %s AND sender_id = %s AND is_read = false
+            """
+            args = [body.get('user_id'), body.get('friend_id')]
+            if body.get('up_to'):
+                query += " AND id <= %s"
+                args.append(body.get('up_to'))
+            cur.execute(query, args)
+            conn.commit()
+            result = {'updated': cur.rowcount}
+        elif isinstance(body.get('messages'), list):
+            result = insert_messages_batch(cur, body['messages'])
+            conn.commit()
+        else:
+            cur.execute("""
+                INSERT INTO messages (sender_id, receiver_id, message)
+                VALUES (%s, %s, %s)
+                RETURNING id, sender_id, receiver_id, message, created_at
+            """, (body.get('sender_id'), body.get('receiver_id'), body.get('message')))
+            
+            message = cur.fetchone()
+            conn.commit()
+            result = {'id': message[0], 'sender_id': message[1], 'receiver_id': message[2],
+                      'message': message[3], 'created_at': message[4].isoformat()}
     else:
         result = {'error': 'Method not allowed'}
     
     cur.close()
-    conn.close()
-    return {'statusCode': 200 if method == 'GET' else 201, 'headers': headers, 'body': json.dumps(result), 'isBase64Encoded': False}
+    return {'statusCode': 200 if method == 'GET' else 201, 'headers': headers, 'body': serialize.dumps(result), 'isBase64Encoded': False}
+
+def insert_messages_batch(cur, items):
+    rows, errors = [], {}
+    for i, item in enumerate(items[:BATCH_MAX_ITEMS]):
+        if not isinstance(item, dict) or not item.get('sender_id') or not item.get('receiver_id') or not item.get('message'):
+            errors[i] = 'sender_id, receiver_id and message required'
+            continue
+        rows.append((i, (item['sender_id'], item['receiver_id'], item['message'])))
+    
+    inserted = bulk_insert(cur, """
+        INSERT INTO messages (sender_id, receiver_id, message) VALUES %s
+        RETURNING id, sender_id, receiver_id, message, created_at
+    """, [r[1] for r in rows])
+    
+    results = {i: {'index': i, 'error': e} for i, e in errors.items()}
+    for (i, _), m in zip(rows, inserted):
+        results[i] = {'index': i, 'id': m[0], 'sender_id': m[1], 'receiver_id': m[2],
+                      'message': m[3], 'created_at': m[4].isoformat()}
+    return batch_result(results, len(items))
+
+CONVERSATION_SQL = """
+    SELECT m.id, m.sender_id, m.receiver_id, m.message, m.is_read, m.created_at,
+           u1.username, u2.username
+    FROM messages m
+    LEFT JOIN users u1 ON m.sender_id = u1.id
+    LEFT JOIN users u2 ON m.receiver_id = u2.id
+    WHERE LEAST(m.sender_id, m.receiver_id) = %s AND GREATEST(m.sender_id, m.receiver_id) = %s
+"""
+# Polled by every open chat, so each page shape is a prepared statement
+db.prepare('chat_after', CONVERSATION_SQL + " AND m.id > %s ORDER BY m.id ASC LIMIT %s")
+db.prepare('chat_before', CONVERSATION_SQL + " AND m.id < %s ORDER BY m.id DESC LIMIT %s")
+db.prepare('chat_latest', CONVERSATION_SQL + " ORDER BY m.id DESC LIMIT %s")
+
+def fetch_conversation(cur, low, high, before, after, limit):
+    """Keyset page of a conversation by message id, returned oldest first."""
+    if after is not None:
+        db.execute(cur, 'chat_after', (low, high, after, limit))
+        return cur.fetchall()
+    
+    if before is not None:
+        db.execute(cur, 'chat_before', (low, high, before, limit))
+    else:
+        db.execute(cur, 'chat_latest', (low, high, limit))
+    return cur.fetchall()[::-1]
+
+def wait_for_messages(conn, channel, timeout, fetch):
+    """
+    Long-poll: LISTEN before the first read so nothing inserted in between is
+    missed, then block on the socket until messages_notify fires or timeout.
+    """
+    conn.rollback()
+    conn.autocommit = True
+    cur = conn.cursor()
+    try:
+        cur.execute(f'LISTEN {channel}')
+        rows = fetch(cur)
+        deadline = time.monotonic() + timeout
+        while not rows:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or select.select([conn], [], [], remaining) == ([], [], []):
+                break
+            conn.poll()
+            if conn.notifies:
+                conn.notifies.clear()
+                rows = fetch(cur)
+        return rows
+    finally:
+        cur.execute(f'UNLISTEN {channel}')
+        cur.close()
+        conn.autocommit = False
+
+def handle_profile(event, method, conn, headers):
+    params = event.get('queryStringParameters') or {}
+    user_id = params.get('user_id')
+    body = profiles.load(conn, user_id=int(user_id) if user_id else None, username=params.get('username'))
+    if body is None:
+        return {'statusCode': 404, 'headers': headers, 'body': serialize.dumps({'error': 'User not found'}), 'isBase64Encoded': False}
+    return {'statusCode': 200, 'headers': headers, 'body': body, 'isBase64Encoded': False}
 
-def handle_user(event, method, database_url, headers):
-    conn = psycopg2.connect(database_url)
+def handle_user(event, method, conn, headers):
     cur = conn.cursor()
     
     if method == 'GET':
@@ -612,60 +782,14 @@ def handle_user(event, method, database_url, headers):
         user_id = params.get('user_id')
         search = params.get('search')
         
-        if user_id:
-            cur.execute("""
-                SELECT id, username, display_name, points, level, wins, losses, created_at, avatar_url
-                FROM users WHERE id = %s AND is_active = true
-            """, (user_id,))
-            
-            user = cur.fetchone()
-            if not user:
-                cur.close()
-                conn.close()
-                return {'statusCode': 404, 'headers': headers, 'body': json.dumps({'error': 'User not found'}), 'isBase64Encoded': False}
-            
-            total = user[5] + user[6]
-            result = {
-                'id': user[0], 'username': user[1], 'displayName': user[2],
-                'points': user[3], 'level': user[4], 'wins': user[5], 'losses': user[6],
-                'winRate': round((user[5] / total * 100) if total > 0 else 0, 1),
-                'kdRatio': round(user[5] / user[6] if user[6] > 0 else float(user[5]), 2),
-                'totalMatches': total, 'memberSince': user[7].isoformat() if user[7] else None,
-                'avatarUrl': user[8]
-            }
-        elif username:
-            cur.execute("""
-                SELECT id, username, display_name, points, level, wins, losses, created_at, avatar_url
-                FROM users WHERE username = %s AND is_active = true
-            """, (username,))
-            
-            user = cur.fetchone()
-            if not user:
-                cur.close()
-                conn.close()
-                return {'statusCode': 404, 'headers': headers, 'body': json.dumps({'error': 'User not found'}), 'isBase64Encoded': False}
-            
-            total = user[5] + user[6]
-            result = {
-                'id': user[0], 'username': user[1], 'displayName': user[2],
-                'points': user[3], 'level': user[4], 'wins': user[5], 'losses': user[6],
-                'winRate': round((user[5] / total * 100) if total > 0 else 0, 1),
-                'kdRatio': round(user[5] / user[6] if user[6] > 0 else float(user[5]), 2),
-                'totalMatches': total, 'memberSince': user[7].isoformat() if user[7] else None,
-                'avatarUrl': user[8]
-            }
+        if user_id or username:
+            cur.close()
+            return handle_profile(event, method, conn, headers)
         elif search:
-            cur.execute("""
-                SELECT id, username, display_name, points, level
-                FROM users WHERE (username ILIKE %s OR display_name ILIKE %s) AND is_active = true LIMIT 20
-            """, (f'%{search}%', f'%{search}%'))
-            
-            users = cur.fetchall()
-            result = [{'id': u[0], 'username': u[1], 'displayName': u[2], 'points': u[3], 'level': u[4]} for u in users]
+            result = search_users(cur, search)
         else:
             cur.close()
-            conn.close()
-            return {'statusCode': 400, 'headers': headers, 'body': json.dumps({'error': 'username or search required'}), 'isBase64Encoded': False}
+            return {'statusCode': 400, 'headers': headers, 'body': serialize.dumps({'error': 'username or search required'}), 'isBase64Encoded': False}
     elif method == 'POST':
         body = json.loads(event.get('body', '{}'))
         action = body.get('action')
@@ -675,8 +799,6 @@ def handle_user(event, method, database_url, headers):
             display_name = body.get('display_name')
             avatar_url = body.get('avatar_url')
             
-            conn = psycopg2.connect(database_url)
-            cur = conn.cursor()
             cur.execute("""
                 UPDATE users SET display_name = %s, avatar_url = %s, updated_at = NOW()
                 WHERE id = %s RETURNING id, username, display_name, avatar_url
@@ -684,107 +806,147 @@ def handle_user(event, method, database_url, headers):
             updated = cur.fetchone()
             conn.commit()
             cur.close()
-            conn.close()
+            profiles.invalidate([updated[0] if updated else None])
             
             if not updated:
-                return {'statusCode': 404, 'headers': headers, 'body': json.dumps({'error': 'User not found'}), 'isBase64Encoded': False}
+                return {'statusCode': 404, 'headers': headers, 'body': serialize.dumps({'error': 'User not found'}), 'isBase64Encoded': False}
             
-            return {'statusCode': 200, 'headers': headers, 'body': json.dumps({
+            return {'statusCode': 200, 'headers': headers, 'body': serialize.dumps({
                 'id': updated[0], 'username': updated[1], 'displayName': updated[2], 'avatarUrl': updated[3]
             }), 'isBase64Encoded': False}
         else:
-            return {'statusCode': 400, 'headers': headers, 'body': json.dumps({'error': 'Unknown action'}), 'isBase64Encoded': False}
+            return {'statusCode': 400, 'headers': headers, 'body': serialize.dumps({'error': 'Unknown action'}), 'isBase64Encoded': False}
     else:
         result = {'error': 'Method not allowed'}
     
     cur.close()
-    conn.close()
-    return {'statusCode': 200, 'headers': headers, 'body': json.dumps(result), 'isBase64Encoded': False}
+    return {'statusCode': 200, 'headers': headers, 'body': serialize.dumps(result), 'isBase64Encoded': False}
 
 
-def handle_leaderboard(event, method, database_url, headers):
-    if method != 'GET':
-        return {'statusCode': 405, 'headers': headers, 'body': json.dumps({'error': 'Method not allowed'}), 'isBase64Encoded': False}
-    
-    conn = psycopg2.connect(database_url)
-    cur = conn.cursor()
+def search_users(cur, search):
+    """
+    Prefix matches first, then trigram similarity, then points. Queries shorter
+    than a trigram can only use the prefix indexes, so they skip the substring match.
+    """
+    query = search.strip().lower()[:SEARCH_MAX_LENGTH]
+    if not query:
+        return []
+    
+    cached = _search_cache.get(query)
+    if cached is not None:
+        return cached
+    
+    escaped = query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    args = {'q': query, 'prefix': f'{escaped}%', 'pattern': f'%{escaped}%'}
+    if len(query) < 3:
+        where = "(lower(username) LIKE %(prefix)s OR lower(display_name) LIKE %(prefix)s)"
+    else:
+        where = "(username ILIKE %(pattern)s OR display_name ILIKE %(pattern)s)"
+    
+    cur.execute(f"""
+        SELECT id, username, display_name, points, level
+        FROM users
+        WHERE {where} AND is_active = true
+        ORDER BY (lower(username) LIKE %(prefix)s OR lower(display_name) LIKE %(prefix)s) DESC,
+                 GREATEST(similarity(username, %(q)s), similarity(COALESCE(display_name, ''), %(q)s)) DESC,
+                 points DESC
+        LIMIT 20
+    """, args)
     
-    cur.execute("""
-        SELECT id, username, display_name, points, level, wins, losses, avatar_url
-        FROM users WHERE is_active = true
-        ORDER BY points DESC LIMIT 50
-    """)
     users = cur.fetchall()
-    
-    players = []
-    for u in users:
-        total = u[5] + u[6]
-        players.append({
-            'id': u[0], 'username': u[1], 'displayName': u[2],
-            'points': u[3], 'level': u[4], 'wins': u[5], 'losses': u[6],
-            'avatarUrl': u[7],
-            'winRate': round((u[5] / total * 100) if total > 0 else 0, 1)
-        })
-    
-    cur.execute("""
-        SELECT m.id, u1.username, u2.username, u1.username, m.status, m.created_at
-        FROM matches m
-        LEFT JOIN users u1 ON m.player1_id = u1.id
-        LEFT JOIN users u2 ON m.player2_id = u2.id
-        ORDER BY m.created_at DESC LIMIT 20
-    """)
-    matches_raw = cur.fetchall()
-    recent_matches = [{
-        'id': str(m[0]), 'player1': m[1] or '', 'player2': m[2] or '',
-        'winner': m[3] or '', 'status': m[4] or 'completed',
-        'date': m[5].isoformat() if m[5] else ''
-    } for m in matches_raw]
-    
-    cur.close()
-    conn.close()
-    
-    return {'statusCode': 200, 'headers': headers, 'body': json.dumps({
-        'players': players, 'recentMatches': recent_matches
-    }), 'isBase64Encoded': False}
+    result = [{'id': u[0], 'username': u[1], 'displayName': u[2], 'points': u[3], 'level': u[4]} for u in users]
+    _search_cache.set(query, result)
+    return result
 
 
-def handle_users(event, method, database_url, headers):
-    conn = psycopg2.connect(database_url)
-    cur = conn.cursor()
+def handle_leaderboard(event, method, conn, headers):
+    if method != 'GET':
+        return {'statusCode': 405, 'headers': headers, 'body': serialize.dumps({'error': 'Method not allowed'}), 'isBase64Encoded': False}
     
-    if method == 'GET':
-        cur.execute("""
-            SELECT id, username, display_name, email, points, level, is_active, is_admin, created_at
-            FROM users ORDER BY created_at DESC LIMIT 100
-        """)
-        users = cur.fetchall()
-        result = [{
-            'id': u[0], 'username': u[1], 'displayName': u[2], 'email': u[3],
-            'points': u[4], 'level': u[5], 'is_active': u[6], 'is_admin': u[7],
-            'created_at': u[8].isoformat() if u[8] else None
-        } for u in users]
+    params = event.get('queryStringParameters') or {}
+    region = params.get('region') or None
+    view = params.get('view')
+    
+    try:
+        limit = min(max(int(params.get('limit', 50)), 1), 100)
+        radius = min(max(int(params.get('radius', 5)), 1), 50)
+        user_id = int(params['user_id']) if params.get('user_id') else None
+        after = None
+        if params.get('after'):
+            after_points, after_id = params['after'].split(':')
+            after = (int(after_points), int(after_id))
+    except ValueError:
+        return {'statusCode': 400, 'headers': headers, 'body': serialize.dumps({'error': 'Invalid leaderboard parameters'}), 'isBase64Encoded': False}
+    
+    board = leaderboard.get_leaderboard(conn)
+    
+    if view in ('rank', 'around'):
+        if user_id is None:
+            return {'statusCode': 400, 'headers': headers, 'body': serialize.dumps({'error': 'user_id required'}), 'isBase64Encoded': False}
         
-    elif method == 'POST':
-        body = json.loads(event.get('body', '{}'))
-        action = body.get('action')
+        rank = board.rank_of(user_id, region)
+        if rank is None:
+            return {'statusCode': 404, 'headers': headers, 'body': serialize.dumps({'error': 'Player is not ranked'}), 'isBase64Encoded': False}
         
-        if action == 'toggle_admin':
-            user_id = body.get('user_id')
-            is_admin = body.get('is_admin', False)
-            cur.execute("UPDATE users SET is_admin = %s WHERE id = %s RETURNING id", (is_admin, user_id))
-            conn.commit()
-            result = {'message': 'Updated'}
-        elif action == 'toggle_active':
-            user_id = body.get('user_id')
-            is_active = body.get('is_active', True)
-            cur.execute("UPDATE users SET is_active = %s WHERE id = %s RETURNING id", (is_active, user_id))
-            conn.commit()
-            result = {'message': 'Updated'}
+        if view == 'rank':
+            result = {'rank': rank, 'total': len(board.board(region)), 'player': board.serialize(user_id, rank)}
         else:
-            result = {'error': 'Unknown action'}
-    else:
-        result = {'error': 'Method not allowed'}
+            result = {'rank': rank, 'players': board.around(user_id, region, radius)}
+        return {'statusCode': 200, 'headers': headers, 'body': serialize.dumps(result), 'isBase64Encoded': False}
     
-    cur.close()
-    conn.close()
-    return {'statusCode': 200, 'headers': headers, 'body': json.dumps(result), 'isBase64Encoded': False}
\ No newline at end of file
+    players = board.page(region, limit, after)
+    next_cursor = f"{players[-1]['points']}:{players[-1]['id']}" if len(players) == limit else None
+    
+    recent_matches = []
+    if after is None:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT m.id, u1.username, u2.username, u1.username, m.status, m.created_at
+            FROM matches m
+            LEFT JOIN users u1 ON m.player1_id = u1.id
+            LEFT JOIN users u2 ON m.player2_id = u2.id
+            ORDER BY m.created_at DESC LIMIT 20
+        """)
+        matches_raw = cur.fetchall()
+        cur.close()
+        recent_matches = [{
+            'id': str(m[0]), 'player1': m[1] or '', 'player2': m[2] or '',
+            'winner': m[3] or '', 'status': m[4] or 'completed',
+            'date': m[5].isoformat() if m[5] else ''
+        } for m in matches_raw]
+    
+    return {'statusCode': 200, 'headers': headers, 'body': serialize.dumps({
+        'players': players, 'recentMatches': recent_matches,
+        'total': len(board.board(region)), 'nextCursor': next_cursor
+    }), 'isBase64Encoded': False}
+
+
+ADMIN = routes.require(lambda event: (event.get('session') or {}).get('adm'), 'Admin session required')
+SERVER = routes.require(match_results.authorized, 'Invalid server key')
+SERVER_OR_ADMIN = routes.require(server_or_admin, 'Admin session or server key required')
+
+ROUTES = routes.Registry(middleware=[routes.timed])
+ROUTES.add('tournaments', ('GET', 'POST'), handle_tournaments)
+for _action in ('start', 'advance'):
+    ROUTES.add('tournaments', 'POST', handle_tournaments, action=_action,
+               middleware=[SERVER_OR_ADMIN, routes.validate(body=('tournament_id',))])
+ROUTES.add('news', 'GET', handle_news)
+ROUTES.add('news', 'POST', routes.lazy('news_writes', 'handle'))
+ROUTES.add('friends', 'GET', handle_friends, middleware=[routes.validate(query=('user_id',))])
+ROUTES.add('friends', 'POST', handle_friends)
+ROUTES.add('challenges', ('GET', 'POST'), handle_challenges)
+for _action in ('start', 'complete', 'abort'):
+    ROUTES.add('challenges', 'POST', handle_challenges, action=_action,
+               middleware=[SERVER_OR_ADMIN, routes.validate(body=('challenge_id',))])
+ROUTES.add('challenges', 'POST', handle_challenges, action='expire', middleware=[SERVER_OR_ADMIN])
+ROUTES.add('chat', ('GET', 'POST'), handle_chat)
+ROUTES.add('user', ('GET', 'POST'), handle_user)
+ROUTES.add('profile', 'GET', handle_profile)
+ROUTES.add('stats', 'GET', handle_stats)
+ROUTES.add('stats', 'GET', verify_stats, action='verify', middleware=[SERVER_OR_ADMIN])
+ROUTES.add('leaderboard', 'GET', handle_leaderboard)
+ROUTES.add('matchmaking', ('GET', 'POST'), handle_matchmaking)
+ROUTES.add('ratings', 'POST', routes.lazy('ratings', 'handle'), middleware=[ADMIN])
+ROUTES.add('match_results', 'POST', handle_match_results, middleware=[SERVER])
+ROUTES.add('presence', 'POST', handle_presence)
+ROUTES.add('users', ('GET', 'POST'), routes.lazy('admin_users', 'handle'), middleware=[ADMIN])
@@ -0,0 +1,275 @@
+import os
+import time
+from bisect import bisect_left, insort
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+LEADERBOARD_SYNC_INTERVAL = float(os.environ.get('LEADERBOARD_SYNC_INTERVAL', '2'))
+# Overlap for the updated_at watermark so rows committed by slow transactions
+# with an older NOW() are still picked up; re-applying a row is idempotent.
+SYNC_OVERLAP = '5 seconds'
+
+PLAYER_COLUMNS = 'id, username, display_name, points, level, wins, losses, avatar_url, region'
+
+Key = Tuple[int, int]
+
+
+class RankedList:
+    """
+    Sorted list of (-points, id) keys kept in buckets of ~LOAD items with a
+    Fenwick tree over bucket sizes, so insert/remove, rank-of-key and
+    key-at-rank are all O(log n) plus a bounded in-bucket shift.
+    """
+
+    LOAD = 512
+
+    def __init__(self) -> None:
+        self._lists: List[List[Key]] = []
+        self._maxes: List[Key] = []
+        self._tree: List[int] = []
+        self._len = 0
+
+    def __len__(self) -> int:
+        return self._len
+
+    def add(self, key: Key) -> None:
+        if not self._maxes:
+            self._lists.append([key])
+            self._maxes.append(key)
+            self._tree = []
+            self._len = 1
+            return
+
+        pos = bisect_left(self._maxes, key)
+        if pos == len(self._maxes):
+            pos -= 1
+            self._lists[pos].append(key)
+            self._maxes[pos] = key
+        else:
+            insort(self._lists[pos], key)
+        self._len += 1
+
+        if len(self._lists[pos]) > 2 * self.LOAD:
+            bucket = self._lists[pos]
+            half = bucket[self.LOAD:]
+            del bucket[self.LOAD:]
+            self._maxes[pos] = bucket[-1]
+            self._lists.insert(pos + 1, half)
+            self._maxes.insert(pos + 1, half[-1])
+            self._tree = []
+        else:
+            self._tree_add(pos, 1)
+
+    def remove(self, key: Key) -> None:
+        pos = bisect_left(self._maxes, key)
+        if pos == len(self._maxes):
+            raise KeyError(key)
+        bucket = self._lists[pos]
+        idx = bisect_left(bucket, key)
+        if idx == len(bucket) or bucket[idx] != key:
+            raise KeyError(key)
+
+        del bucket[idx]
+        self._len -= 1
+        if not bucket:
+            del self._lists[pos]
+            del self._maxes[pos]
+            self._tree = []
+        else:
+            self._maxes[pos] = bucket[-1]
+            self._tree_add(pos, -1)
+
+    def rank(self, key: Key) -> int:
+        """Number of keys strictly before ``key``."""
+        pos = bisect_left(self._maxes, key)
+        if pos == len(self._maxes):
+            return self._len
+        return self._prefix(pos) + bisect_left(self._lists[pos], key)
+
+    def iter_from(self, index: int) -> Iterator[Key]:
+        if index >= self._len:
+            return
+        pos, offset = self._locate(max(index, 0))
+        for bucket in self._lists[pos:]:
+            yield from bucket[offset:]
+            offset = 0
+
+    def _build_tree(self) -> None:
+        tree = [len(bucket) for bucket in self._lists]
+        size = len(tree)
+        for i in range(size):
+            parent = i | (i + 1)
+            if parent < size:
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _tree_add(self, pos: int, delta: int) -> None:
+        if not self._tree:
+            return
+        tree = self._tree
+        while pos < len(tree):
+            tree[pos] += delta
+            pos |= pos + 1
+
+    def _prefix(self, pos: int) -> int:
+        if not self._tree:
+            self._build_tree()
+        tree = self._tree
+        total = 0
+        pos -= 1
+        while pos >= 0:
+            total += tree[pos]
+            pos = (pos & (pos + 1)) - 1
+        return total
+
+    def _locate(self, index: int) -> Tuple[int, int]:
+        if not self._tree:
+            self._build_tree()
+        tree = self._tree
+        pos = -1
+        step = 1 << (len(tree).bit_length())
+        while step:
+            nxt = pos + step
+            if nxt < len(tree) and tree[nxt] <= index:
+                index -= tree[nxt]
+                pos = nxt
+            step >>= 1
+        return pos + 1, index
+
+
+class Leaderboard:
+    """
+    In-memory ranking of active users by points, with one global board and
+    one board per region. Kept in sync with the users table through the
+    updated_at watermark maintained by V0010.
+    """
+
+    def __init__(self) -> None:
+        self.players: Dict[int, Tuple] = {}
+        self.boards: Dict[Optional[str], RankedList] = {None: RankedList()}
+        self.synced_at = None
+        self.checked_at = 0.0
+
+    def upsert(self, row: Tuple) -> None:
+        player_id, points, region = row[0], row[3] or 0, row[8]
+        self.remove(player_id)
+        wins, losses = row[5] or 0, row[6] or 0
+        total = wins + losses
+        win_rate = round((wins / total * 100) if total > 0 else 0, 1)
+        self.players[player_id] = (*row[:3], points, row[4], wins, losses, row[7], region, win_rate)
+
+        key = (-points, player_id)
+        self.boards[None].add(key)
+        if region:
+            board = self.boards.get(region)
+            if board is None:
+                board = self.boards[region] = RankedList()
+            board.add(key)
+
+    def remove(self, player_id: int) -> None:
+        player = self.players.pop(player_id, None)
+        if player is None:
+            return
+        key = (-player[3], player_id)
+        self.boards[None].remove(key)
+        region = player[8]
+        if region:
+            board = self.boards[region]
+            board.remove(key)
+            if not board:
+                del self.boards[region]
+
+    def board(self, region: Optional[str]) -> RankedList:
+        return self.boards.get(region) or RankedList()
+
+    def rank_of(self, player_id: int, region: Optional[str] = None) -> Optional[int]:
+        player = self.players.get(player_id)
+        if player is None or (region and player[8] != region):
+            return None
+        return self.board(region).rank((-player[3], player_id)) + 1
+
+    def page(self, region: Optional[str], limit: int, after: Optional[Key] = None) -> List[Dict[str, Any]]:
+        board = self.board(region)
+        start = 0
+        if after is not None:
+            points, player_id = after
+            start = board.rank((-points, player_id + 1))
+        return self._slice(board, start, limit)
+
+    def around(self, player_id: int, region: Optional[str], radius: int) -> List[Dict[str, Any]]:
+        rank = self.rank_of(player_id, region)
+        if rank is None:
+            return []
+        start = max(rank - 1 - radius, 0)
+        return self._slice(self.board(region), start, radius * 2 + 1)
+
+    def serialize(self, player_id: int, rank: int) -> Dict[str, Any]:
+        p = self.players[player_id]
+        return {
+            'id': p[0], 'username': p[1], 'displayName': p[2],
+            'points': p[3], 'level': p[4], 'wins': p[5], 'losses': p[6],
+            'avatarUrl': p[7], 'region': p[8], 'winRate': p[9], 'rank': rank
+        }
+
+    def _slice(self, board: RankedList, start: int, limit: int) -> List[Dict[str, Any]]:
+        result = []
+        for offset, key in enumerate(board.iter_from(start)):
+            if offset >= limit:
+                break
+            result.append(self.serialize(key[1], start + offset + 1))
+        return result
+
+    def load(self, conn) -> None:
+        cur = conn.cursor(name='leaderboard_load')
+        cur.itersize = 10000
+        cur.execute(f"SELECT {PLAYER_COLUMNS}, NOW() FROM users WHERE is_active = true")
+        synced_at = None
+        for row in cur:
+            self.upsert(row[:9])
+            synced_at = row[9]
+        cur.close()
+
+        if synced_at is None:
+            plain = conn.cursor()
+            plain.execute("SELECT NOW()")
+            synced_at = plain.fetchone()[0]
+            plain.close()
+        self.synced_at = synced_at
+        self.checked_at = time.monotonic()
+
+    def sync(self, conn) -> None:
+        if self.synced_at is None:
+            self.load(conn)
+            return
+        if time.monotonic() - self.checked_at < LEADERBOARD_SYNC_INTERVAL:
+            return
+
+        cur = conn.cursor()
+        cur.execute(f"""
+            SELECT {PLAYER_COLUMNS}, is_active, updated_at, NOW()
+            FROM users
+            WHERE updated_at > %s::timestamptz - INTERVAL '{SYNC_OVERLAP}'
+            ORDER BY updated_at
+        """, (self.synced_at,))
+        rows = cur.fetchall()
+        if rows:
+            now = rows[-1][11]
+        else:
+            cur.execute("SELECT NOW()")
+            now = cur.fetchone()[0]
+        cur.close()
+
+        for row in rows:
+            if row[9]:
+                self.upsert(row[:9])
+            else:
+                self.remove(row[0])
+        self.synced_at = now
+        self.checked_at = time.monotonic()
+
+
+_leaderboard = Leaderboard()
+
+
+def get_leaderboard(conn) -> Leaderboard:
+    _leaderboard.sync(conn)
+    return _leaderboard
@@ -0,0 +1,132 @@
+import hmac
+import json
+import os
+from typing import Any, Dict, List
+
+import psycopg2.extras
+
+import profiles
+
+GAME_SERVER_KEY = os.environ.get('GAME_SERVER_KEY', '')
+MATCH_WIN_POINTS = int(os.environ.get('MATCH_WIN_POINTS', '25'))
+RESULTS_MAX_BATCH = 1000
+
+
+def authorized(event: Dict[str, Any]) -> bool:
+    headers = event.get('headers') or {}
+    key = next((v for k, v in headers.items() if k.lower() == 'x-server-key'), '')
+    return bool(GAME_SERVER_KEY) and hmac.compare_digest(key or '', GAME_SERVER_KEY)
+
+
+def _winner_is_player(item: Dict[str, Any]) -> bool:
+    # Only checkable here when the item names both players; otherwise the
+    # upsert checks it against the player ids merged with the stored row
+    winner_id, players = item.get('winner_id'), (item.get('player1_id'), item.get('player2_id'))
+    return not winner_id or None in players or winner_id in players
+
+
+def ingest(conn, items: List[Any]) -> Dict[str, Any]:
+    """
+    Records a batch of finished matches in one transaction. match_id is the
+    idempotency key: a match that is already completed is reported as a
+    duplicate and does not touch points, wins or losses again.
+    """
+    results: Dict[int, Dict[str, Any]] = {}
+    latest: Dict[str, int] = {}
+    for i, item in enumerate(items):
+        if i >= RESULTS_MAX_BATCH:
+            results[i] = {'index': i, 'status': 'error', 'error': f'batch limit is {RESULTS_MAX_BATCH} items'}
+        elif not isinstance(item, dict) or not item.get('match_id'):
+            results[i] = {'index': i, 'status': 'error', 'error': 'match_id required'}
+        elif not _winner_is_player(item):
+            results[i] = {'index': i, 'match_id': item['match_id'], 'status': 'error',
+                          'error': 'winner_id must be player1_id or player2_id'}
+        else:
+            if item['match_id'] in latest:
+                previous = latest[item['match_id']]
+                results[previous] = {'index': previous, 'match_id': item['match_id'], 'status': 'duplicate'}
+            latest[item['match_id']] = i
+
+    rows = []
+    # Sorted so concurrent batches lock overlapping match rows in the same order
+    for match_id, i in sorted(latest.items(), key=lambda entry: str(entry[0])):
+        item = items[i]
+        winner_id = item.get('winner_id')
+        rows.append((
+            match_id, item.get('game_mode', '1v1'), item.get('player1_id'), item.get('player2_id'),
+            winner_id, item.get('player1_score', 0), item.get('player2_score', 0),
+            item.get('points_awarded', MATCH_WIN_POINTS) if winner_id else 0,
+            item.get('duration_seconds'), item.get('server_id'), item.get('server_host'),
+            json.dumps(item['stats'], separators=(',', ':')) if item.get('stats') is not None else None,
+            item.get('started_at'), item.get('finished_at')
+        ))
+
+    recorded = []
+    if rows:
+        cur = conn.cursor()
+        recorded = psycopg2.extras.execute_values(cur, """
+            INSERT INTO matches (match_id, game_mode, player1_id, player2_id, winner_id,
+                                 player1_score, player2_score, points_awarded, duration_seconds,
+                                 server_id, server_host, match_stats, started_at, finished_at, status)
+            VALUES %s
+            ON CONFLICT (match_id) DO UPDATE SET
+                player1_id = COALESCE(matches.player1_id, EXCLUDED.player1_id),
+                player2_id = COALESCE(matches.player2_id, EXCLUDED.player2_id),
+                winner_id = CASE WHEN EXCLUDED.winner_id IN (COALESCE(matches.player1_id, EXCLUDED.player1_id),
+                                                             COALESCE(matches.player2_id, EXCLUDED.player2_id))
+                                 THEN EXCLUDED.winner_id END,
+                player1_score = EXCLUDED.player1_score,
+                player2_score = EXCLUDED.player2_score,
+                points_awarded = CASE WHEN EXCLUDED.winner_id IN (COALESCE(matches.player1_id, EXCLUDED.player1_id),
+                                                                  COALESCE(matches.player2_id, EXCLUDED.player2_id))
+                                      THEN EXCLUDED.points_awarded ELSE 0 END,
+                duration_seconds = EXCLUDED.duration_seconds,
+                server_id = EXCLUDED.server_id,
+                server_host = EXCLUDED.server_host,
+                match_stats = EXCLUDED.match_stats,
+                started_at = COALESCE(matches.started_at, EXCLUDED.started_at),
+                finished_at = EXCLUDED.finished_at,
+                status = 'completed'
+            WHERE matches.status <> 'completed'
+            RETURNING match_id, player1_id, player2_id, winner_id, points_awarded
+        """, rows, template="""(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s::jsonb,
+                               %s::timestamptz, COALESCE(%s::timestamptz, NOW()), 'completed')""",
+            page_size=len(rows), fetch=True)
+
+        deltas: Dict[int, List[int]] = {}
+        for _, player1_id, player2_id, winner_id, points in recorded:
+            # A winner who is not one of the match's players never gets points or a win
+            if not winner_id or winner_id not in (player1_id, player2_id):
+                continue
+            loser_id = player2_id if winner_id == player1_id else player1_id
+            winner = deltas.setdefault(winner_id, [0, 0, 0])
+            winner[0] += points or 0
+            winner[1] += 1
+            if loser_id:
+                deltas.setdefault(loser_id, [0, 0, 0])[2] += 1
+
+        if deltas:
+            # Lock player rows in id order first: UPDATE ... FROM (VALUES) locks in
+            # join order, and two batches sharing players could otherwise deadlock
+            user_ids = sorted(deltas)
+            cur.execute("SELECT id FROM users WHERE id = ANY(%s) ORDER BY id FOR UPDATE", (user_ids,))
+            psycopg2.extras.execute_values(cur, """
+                UPDATE users AS u
+                SET points = u.points + v.points, wins = u.wins + v.wins, losses = u.losses + v.losses
+                FROM (VALUES %s) AS v(id, points, wins, losses)
+                WHERE u.id = v.id
+            """, [(user_id, *deltas[user_id]) for user_id in user_ids], page_size=len(deltas))
+        conn.commit()
+        cur.close()
+        profiles.invalidate(pid for _, player1_id, player2_id, _, _ in recorded for pid in (player1_id, player2_id))
+
+    recorded_ids = {r[0] for r in recorded}
+    for match_id, i in latest.items():
+        results[i] = {'index': i, 'match_id': match_id,
+                      'status': 'recorded' if match_id in recorded_ids else 'duplicate'}
+    ordered = [results[i] for i in range(len(items))]
+    return {
+        'recorded': len(recorded_ids),
+        'duplicates': sum(1 for r in ordered if r['status'] == 'duplicate'),
+        'results': ordered
+    }
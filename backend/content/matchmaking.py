@@ -0,0 +1,184 @@
+import os
+import time
+import uuid
+from typing import Dict, Iterator, Optional, Tuple
+
+RATING_BAND = 100
+BASE_WINDOW = int(os.environ.get('MATCHMAKING_BASE_WINDOW', '50'))
+WINDOW_GROWTH = float(os.environ.get('MATCHMAKING_WINDOW_GROWTH', '10'))
+MAX_WINDOW = int(os.environ.get('MATCHMAKING_MAX_WINDOW', '1000'))
+QUEUE_REFRESH_INTERVAL = float(os.environ.get('MATCHMAKING_REFRESH_INTERVAL', '2'))
+MAX_CLAIM_ATTEMPTS = 5
+
+Entry = Tuple[str, int, float]
+
+
+def search_window(joined_at: float, now: float) -> int:
+    """Rating distance a player accepts; widens linearly with time in queue."""
+    return int(min(BASE_WINDOW + WINDOW_GROWTH * max(now - joined_at, 0), MAX_WINDOW))
+
+
+class QueueIndex:
+    """
+    Snapshot of matchmaking_queue bucketed by game mode and rating band, used
+    to pick candidates without scanning the table. The database stays the
+    source of truth: pairs are claimed there with FOR UPDATE SKIP LOCKED.
+    """
+
+    def __init__(self) -> None:
+        self.entries: Dict[int, Entry] = {}
+        self.bands: Dict[str, Dict[int, Dict[int, int]]] = {}
+        self.loaded_at = 0.0
+
+    def add(self, user_id: int, game_mode: str, rating: int, joined_at: float) -> None:
+        self.remove(user_id)
+        self.entries[user_id] = (game_mode, rating, joined_at)
+        mode = self.bands.setdefault(game_mode, {})
+        mode.setdefault(rating // RATING_BAND, {})[user_id] = rating
+
+    def remove(self, user_id: int) -> None:
+        entry = self.entries.pop(user_id, None)
+        if entry is None:
+            return
+        game_mode, rating, _ = entry
+        mode = self.bands[game_mode]
+        band = mode[rating // RATING_BAND]
+        del band[user_id]
+        if not band:
+            del mode[rating // RATING_BAND]
+
+    def size(self, game_mode: str) -> int:
+        return sum(len(band) for band in self.bands.get(game_mode, {}).values())
+
+    def candidates(self, user_id: int, now: float) -> Iterator[int]:
+        """Opponents within either player's window, closest rating first."""
+        entry = self.entries.get(user_id)
+        if entry is None:
+            return
+        game_mode, rating, joined_at = entry
+        own_window = search_window(joined_at, now)
+        mode = self.bands.get(game_mode, {})
+        home = rating // RATING_BAND
+        reach = MAX_WINDOW // RATING_BAND + 1
+
+        found = []
+        for offset in range(reach + 1):
+            for band_key in {home - offset, home + offset}:
+                for other_id, other_rating in mode.get(band_key, {}).items():
+                    if other_id == user_id:
+                        continue
+                    distance = abs(other_rating - rating)
+                    window = max(own_window, search_window(self.entries[other_id][2], now))
+                    if distance <= window:
+                        found.append((distance, self.entries[other_id][2], other_id))
+            # Bands further out can only be further away than anything found so far
+            if found and offset * RATING_BAND > min(found)[0] + RATING_BAND:
+                break
+        for _, _, other_id in sorted(found):
+            yield other_id
+
+    def refresh(self, conn, force: bool = False) -> None:
+        if not force and time.monotonic() - self.loaded_at < QUEUE_REFRESH_INTERVAL:
+            return
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT user_id, game_mode, skill_rating, EXTRACT(EPOCH FROM joined_at), EXTRACT(EPOCH FROM NOW())
+            FROM matchmaking_queue
+        """)
+        rows = cur.fetchall()
+        cur.close()
+
+        self.entries = {}
+        self.bands = {}
+        # Keep join times relative to the local monotonic clock
+        now = time.monotonic()
+        for user_id, game_mode, rating, joined_epoch, db_now in rows:
+            self.add(user_id, game_mode, rating or 1500, now - float(db_now - joined_epoch))
+        self.loaded_at = now
+
+
+_index = QueueIndex()
+
+
+def get_index(conn) -> QueueIndex:
+    _index.refresh(conn)
+    return _index
+
+
+def join(conn, user_id: int, game_mode: str) -> None:
+    cur = conn.cursor()
+    cur.execute("""
+        INSERT INTO matchmaking_queue (user_id, game_mode, skill_rating, joined_at)
+        SELECT id, %s, ROUND(COALESCE(rating, 1500)), NOW() FROM users WHERE id = %s
+        ON CONFLICT (user_id) DO UPDATE
+        SET game_mode = EXCLUDED.game_mode, skill_rating = EXCLUDED.skill_rating, joined_at = NOW()
+        RETURNING skill_rating
+    """, (game_mode, user_id))
+    row = cur.fetchone()
+    conn.commit()
+    cur.close()
+    if row:
+        _index.add(user_id, game_mode, row[0], time.monotonic())
+
+
+def leave(conn, user_id: int) -> bool:
+    cur = conn.cursor()
+    cur.execute("DELETE FROM matchmaking_queue WHERE user_id = %s", (user_id,))
+    removed = cur.rowcount > 0
+    conn.commit()
+    cur.close()
+    _index.remove(user_id)
+    return removed
+
+
+def try_match(conn, user_id: int) -> Optional[Tuple]:
+    """
+    Pairs user_id with the best queued candidate. Both queue rows are locked
+    with SKIP LOCKED so concurrent instances never claim the same player and
+    never wait on each other; a busy candidate is simply skipped.
+    """
+    index = get_index(conn)
+    entry = index.entries.get(user_id)
+    if entry is None:
+        return None
+    game_mode = entry[0]
+
+    cur = conn.cursor()
+    attempts = 0
+    for other_id in list(index.candidates(user_id, time.monotonic())):
+        if attempts >= MAX_CLAIM_ATTEMPTS:
+            break
+        attempts += 1
+
+        cur.execute("""
+            SELECT user_id FROM matchmaking_queue
+            WHERE user_id IN (%s, %s) AND game_mode = %s
+            ORDER BY user_id
+            FOR UPDATE SKIP LOCKED
+        """, (user_id, other_id, game_mode))
+        locked = {row[0] for row in cur.fetchall()}
+
+        if len(locked) < 2:
+            conn.rollback()
+            if user_id not in locked:
+                # We were claimed by someone else or left the queue
+                index.remove(user_id)
+                break
+            index.remove(other_id)
+            continue
+
+        cur.execute("DELETE FROM matchmaking_queue WHERE user_id IN (%s, %s)", (user_id, other_id))
+        cur.execute("""
+            INSERT INTO matches (match_id, game_mode, status, player1_id, player2_id)
+            VALUES (%s, %s, 'waiting', %s, %s)
+            RETURNING id, match_id, game_mode, status, player1_id, player2_id, created_at
+        """, (f'mm_{uuid.uuid4().hex[:20]}', game_mode, other_id, user_id))
+        match = cur.fetchone()
+        conn.commit()
+        cur.close()
+        index.remove(user_id)
+        index.remove(other_id)
+        return match
+
+    cur.close()
+    return None
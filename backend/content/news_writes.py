@@ -0,0 +1,58 @@
+import json
+
+import serialize
+from batch import BATCH_MAX_ITEMS, batch_result, bulk_insert
+
+# Publishing is rare next to reads: loaded lazily by the content router
+
+
+def handle(event, method, conn, headers):
+    cur = conn.cursor()
+    body = json.loads(event.get('body', '{}'))
+    
+    if isinstance(body.get('items'), list):
+        result = insert_news_batch(cur, body['items'])
+        conn.commit()
+    else:
+        cur.execute("""
+            INSERT INTO news (title, category, content, author_id)
+            VALUES (%s, %s, %s, %s)
+            RETURNING id, title, category, created_at
+        """, (
+            body.get('title'),
+            body.get('category', 'update'),
+            body.get('content'),
+            body.get('author_id')
+        ))
+        
+        news_item = cur.fetchone()
+        conn.commit()
+        
+        result = {
+            'id': news_item[0],
+            'title': news_item[1],
+            'category': news_item[2],
+            'created_at': news_item[3].isoformat()
+        }
+    
+    cur.close()
+    return {'statusCode': 201, 'headers': headers, 'body': serialize.dumps(result), 'isBase64Encoded': False}
+
+
+def insert_news_batch(cur, items):
+    rows, errors = [], {}
+    for i, item in enumerate(items[:BATCH_MAX_ITEMS]):
+        if not isinstance(item, dict) or not item.get('title'):
+            errors[i] = 'title required'
+            continue
+        rows.append((i, (item['title'], item.get('category', 'update'), item.get('content'), item.get('author_id'))))
+    
+    inserted = bulk_insert(cur, """
+        INSERT INTO news (title, category, content, author_id) VALUES %s
+        RETURNING id, title, category, created_at
+    """, [r[1] for r in rows])
+    
+    results = {i: {'index': i, 'error': e} for i, e in errors.items()}
+    for (i, _), n in zip(rows, inserted):
+        results[i] = {'index': i, 'id': n[0], 'title': n[1], 'category': n[2], 'created_at': n[3].isoformat()}
+    return batch_result(results, len(items))
@@ -0,0 +1,48 @@
+import os
+import threading
+import time
+from typing import Dict
+
+import db
+
+# A user counts as online for PRESENCE_TTL seconds after their last heartbeat
+PRESENCE_TTL = int(os.environ.get('PRESENCE_TTL', '60'))
+# Heartbeats arriving more often than this are absorbed in memory
+PRESENCE_WRITE_INTERVAL = float(os.environ.get('PRESENCE_WRITE_INTERVAL', '20'))
+PRESENCE_MAX_TRACKED = 100000
+
+_last_written: Dict[int, float] = {}
+_lock = threading.Lock()
+
+db.prepare('presence_heartbeat', """
+    INSERT INTO user_presence (user_id, last_seen_at) VALUES (%s, NOW())
+    ON CONFLICT (user_id) DO UPDATE SET last_seen_at = EXCLUDED.last_seen_at
+""")
+
+
+def heartbeat(conn, user_id: int) -> bool:
+    """
+    Records that user_id is online. user_presence is the shared store across
+    function instances; the in-memory map only throttles repeated writes.
+    Returns True if the row was written.
+    """
+    now = time.monotonic()
+    with _lock:
+        if now - _last_written.get(user_id, 0.0) < PRESENCE_WRITE_INTERVAL:
+            return False
+        if len(_last_written) >= PRESENCE_MAX_TRACKED:
+            cutoff = now - PRESENCE_TTL
+            for key in [k for k, v in _last_written.items() if v < cutoff]:
+                del _last_written[key]
+        _last_written[user_id] = now
+
+    cur = conn.cursor()
+    db.execute(cur, 'presence_heartbeat', (user_id,))
+    conn.commit()
+    cur.close()
+    return True
+
+
+def online_sql(column: str) -> str:
+    """SQL boolean for "last_seen_at column is within PRESENCE_TTL"."""
+    return f"COALESCE({column} > NOW() - INTERVAL '{PRESENCE_TTL} seconds', false)"
@@ -0,0 +1,91 @@
+import os
+from typing import Iterable, Optional
+
+import db
+from cache import TTLCache
+
+PROFILE_CACHE_TTL = float(os.environ.get('PROFILE_CACHE_TTL', '60'))
+RECENT_MATCHES = 10
+
+# user_id -> serialized profile; username -> user_id for lookups by name
+_profiles = TTLCache(maxsize=2048, ttl=PROFILE_CACHE_TTL)
+_ids = TTLCache(maxsize=4096, ttl=PROFILE_CACHE_TTL)
+
+# One round trip: the user row, derived ratios, match aggregates, recent
+# matches with opponents and the friend count, rendered as JSON by Postgres.
+# Matches are read through the two per-player partial indexes (V0021) via
+# UNION ALL instead of an OR that could use neither.
+PROFILE_SQL = """
+    WITH u AS (
+        SELECT id, username, display_name, points, level, wins, losses, created_at, avatar_url, region, rating
+        FROM users WHERE {where} AND is_active = true
+    ),
+    played AS (
+        SELECT m.* FROM matches m, u WHERE m.player1_id = u.id AND m.status = 'completed'
+        UNION ALL
+        SELECT m.* FROM matches m, u WHERE m.player2_id = u.id AND m.status = 'completed'
+    )
+    SELECT u.id, row_to_json(p)::text
+    FROM u, LATERAL (
+        SELECT u.id, u.username, u.display_name AS "displayName", u.points, u.level,
+               u.wins, u.losses, u.wins + u.losses AS "totalMatches",
+               ROUND(CASE WHEN u.wins + u.losses > 0 THEN u.wins * 100.0 / (u.wins + u.losses) ELSE 0 END, 1)::float AS "winRate",
+               ROUND(CASE WHEN u.losses > 0 THEN u.wins::numeric / u.losses ELSE u.wins END, 2)::float AS "kdRatio",
+               u.created_at AS "memberSince", u.avatar_url AS "avatarUrl", u.region, ROUND(u.rating) AS rating,
+               (SELECT COUNT(*) FROM friends f WHERE f.user_id = u.id AND f.status = 'accepted') AS "friendsCount",
+               (SELECT json_build_object(
+                    'matchesPlayed', COUNT(*),
+                    'pointsFromMatches', COALESCE(SUM(points_awarded) FILTER (WHERE winner_id = u.id), 0),
+                    'avgDurationSeconds', ROUND(AVG(duration_seconds)),
+                    'lastMatchAt', MAX(finished_at)
+                ) FROM played) AS stats,
+               (SELECT COALESCE(json_agg(r ORDER BY r."finishedAt" DESC NULLS LAST), '[]'::json) FROM (
+                    SELECT pl.match_id AS "matchId", pl.game_mode AS "gameMode",
+                           CASE WHEN pl.winner_id = u.id THEN 'win' WHEN pl.winner_id IS NULL THEN 'draw' ELSE 'loss' END AS result,
+                           CASE WHEN pl.player1_id = u.id THEN pl.player1_score ELSE pl.player2_score END AS score,
+                           CASE WHEN pl.player1_id = u.id THEN pl.player2_score ELSE pl.player1_score END AS "opponentScore",
+                           CASE WHEN o.id IS NOT NULL THEN json_build_object(
+                               'id', o.id, 'username', o.username, 'displayName', o.display_name
+                           ) END AS opponent,
+                           pl.finished_at AS "finishedAt"
+                    FROM played pl
+                    LEFT JOIN users o ON o.id = CASE WHEN pl.player1_id = u.id THEN pl.player2_id ELSE pl.player1_id END
+                    ORDER BY pl.finished_at DESC NULLS LAST
+                    LIMIT {recent}
+                ) r) AS "recentMatches"
+    ) p
+"""
+db.prepare('profile_by_id', PROFILE_SQL.format(where='id = %s', recent=RECENT_MATCHES))
+db.prepare('profile_by_username', PROFILE_SQL.format(where='username = %s', recent=RECENT_MATCHES))
+
+
+def load(conn, user_id: Optional[int] = None, username: Optional[str] = None) -> Optional[str]:
+    """Profile JSON text for a user id or username, or None if no active user matches."""
+    if user_id is None and username is not None:
+        user_id = _ids.get(username)
+    if user_id is not None:
+        cached = _profiles.get(user_id)
+        if cached is not None:
+            return cached
+
+    cur = conn.cursor()
+    if user_id is not None:
+        db.execute(cur, 'profile_by_id', (user_id,))
+    else:
+        db.execute(cur, 'profile_by_username', (username,))
+    row = cur.fetchone()
+    cur.close()
+    if row is None:
+        return None
+
+    found_id, body = row
+    _profiles.set(found_id, body)
+    if username is not None:
+        _ids.set(username, found_id)
+    return body
+
+
+def invalidate(user_ids: Iterable[Optional[int]]) -> None:
+    for user_id in user_ids:
+        if user_id is not None:
+            _profiles.invalidate(user_id)
@@ -0,0 +1,185 @@
+import json
+import os
+from typing import Dict, List, Tuple
+
+import numpy as np
+import psycopg2.extras
+
+import serialize
+
+# Glicko-2 system constants (Glickman, "Example of the Glicko-2 system")
+GLICKO_SCALE = 173.7178
+DEFAULT_RATING = 1500.0
+DEFAULT_DEVIATION = 350.0
+DEFAULT_VOLATILITY = 0.06
+TAU = float(os.environ.get('RATING_TAU', '0.5'))
+CONVERGENCE = 1e-6
+MAX_ITERATIONS = 100
+
+RATING_BATCH_SIZE = int(os.environ.get('RATING_BATCH_SIZE', '50000'))
+
+
+def glicko2_period(mu: np.ndarray, phi: np.ndarray, sigma: np.ndarray,
+                   player: np.ndarray, opponent: np.ndarray, score: np.ndarray
+                   ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    One Glicko-2 rating period for every player at once, on the internal
+    (mu, phi) scale. Each game appears twice in player/opponent/score, once
+    from each side. Players without games in the period must not be passed in.
+    """
+    n = mu.shape[0]
+    g = 1.0 / np.sqrt(1.0 + 3.0 * phi[opponent] ** 2 / np.pi ** 2)
+    expected = 1.0 / (1.0 + np.exp(-g * (mu[player] - mu[opponent])))
+
+    v = 1.0 / np.bincount(player, weights=g ** 2 * expected * (1.0 - expected), minlength=n)
+    delta_sum = np.bincount(player, weights=g * (score - expected), minlength=n)
+    delta = v * delta_sum
+
+    # Volatility: Illinois root finding, vectorized across players
+    a = np.log(sigma ** 2)
+    phi2 = phi ** 2
+    delta2 = delta ** 2
+
+    def f(x):
+        ex = np.exp(x)
+        return ex * (delta2 - phi2 - v - ex) / (2.0 * (phi2 + v + ex) ** 2) - (x - a) / TAU ** 2
+
+    big_step = delta2 > phi2 + v
+    A = a.copy()
+    B = np.where(big_step, np.log(np.maximum(delta2 - phi2 - v, 1e-300)), a - TAU)
+    lower = ~big_step
+    for _ in range(MAX_ITERATIONS):
+        lower &= f(B) < 0
+        if not lower.any():
+            break
+        B = np.where(lower, B - TAU, B)
+
+    fA, fB = f(A), f(B)
+    for _ in range(MAX_ITERATIONS):
+        active = np.abs(B - A) > CONVERGENCE
+        if not active.any():
+            break
+        denom = np.where(active, fB - fA, 1.0)
+        C = np.where(active, A + (A - B) * fA / denom, A)
+        fC = f(C)
+        swap = active & (fC * fB <= 0)
+        A = np.where(swap, B, A)
+        fA = np.where(swap, fB, np.where(active, fA / 2.0, fA))
+        B = np.where(active, C, B)
+        fB = np.where(active, fC, fB)
+
+    new_sigma = np.exp(A / 2.0)
+    phi_star = np.sqrt(phi2 + new_sigma ** 2)
+    new_phi = 1.0 / np.sqrt(1.0 / phi_star ** 2 + 1.0 / v)
+    new_mu = mu + new_phi ** 2 * delta_sum
+    return new_mu, new_phi, new_sigma
+
+
+def rate_matches(players: Dict[int, Tuple[float, float, float]],
+                 matches: List[Tuple[int, int, int]]) -> Dict[int, Tuple[float, float, float]]:
+    """
+    players: user_id -> (rating, deviation, volatility) on the public scale.
+    matches: (player1_id, player2_id, winner_id or None for a draw).
+    Returns updated (rating, deviation, volatility) for every player that played.
+    """
+    ids = np.fromiter(players.keys(), dtype=np.int64, count=len(players))
+    position = {user_id: i for i, user_id in enumerate(ids.tolist())}
+    state = np.array(list(players.values()), dtype=np.float64).reshape(-1, 3)
+
+    p1 = np.fromiter((position[m[0]] for m in matches), dtype=np.int64, count=len(matches))
+    p2 = np.fromiter((position[m[1]] for m in matches), dtype=np.int64, count=len(matches))
+    winner = np.fromiter((m[2] if m[2] is not None else -1 for m in matches), dtype=np.int64, count=len(matches))
+    s1 = np.where(winner == ids[p1], 1.0, np.where(winner == ids[p2], 0.0, 0.5))
+
+    player = np.concatenate([p1, p2])
+    opponent = np.concatenate([p2, p1])
+    score = np.concatenate([s1, 1.0 - s1])
+
+    mu = (state[:, 0] - DEFAULT_RATING) / GLICKO_SCALE
+    phi = state[:, 1] / GLICKO_SCALE
+    new_mu, new_phi, new_sigma = glicko2_period(mu, phi, state[:, 2], player, opponent, score)
+
+    ratings = new_mu * GLICKO_SCALE + DEFAULT_RATING
+    deviations = new_phi * GLICKO_SCALE
+    return {
+        user_id: (float(r), float(d), float(s))
+        for user_id, r, d, s in zip(ids.tolist(), ratings, deviations, new_sigma)
+    }
+
+
+def process_pending(conn, batch_size: int = RATING_BATCH_SIZE) -> Dict[str, int]:
+    """
+    Rates one batch of completed, unrated matches as a single rating period
+    and writes everything back in one transaction with bulk UPDATE ... FROM (VALUES).
+    """
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT id, player1_id, player2_id, winner_id
+        FROM matches
+        WHERE status = 'completed' AND rated_at IS NULL
+          AND player1_id IS NOT NULL AND player2_id IS NOT NULL
+        ORDER BY finished_at NULLS FIRST, id
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    """, (batch_size,))
+    rows = cur.fetchall()
+    if not rows:
+        conn.rollback()
+        cur.close()
+        return {'matches': 0, 'players': 0}
+
+    player_ids = list({pid for r in rows for pid in (r[1], r[2])})
+    cur.execute("""
+        SELECT id, rating, rating_deviation, rating_volatility
+        FROM users WHERE id = ANY(%s)
+    """, (player_ids,))
+    players = {
+        r[0]: (r[1] if r[1] is not None else DEFAULT_RATING,
+               r[2] if r[2] is not None else DEFAULT_DEVIATION,
+               r[3] if r[3] is not None else DEFAULT_VOLATILITY)
+        for r in cur.fetchall()
+    }
+    rated = [r for r in rows if r[1] in players and r[2] in players]
+    playing = {pid for r in rated for pid in (r[1], r[2])}
+    updated = rate_matches(
+        {pid: players[pid] for pid in playing},
+        [(r[1], r[2], r[3]) for r in rated]
+    ) if rated else {}
+
+    values = [(user_id, r, d, s) for user_id, (r, d, s) in updated.items()]
+    if values:
+        psycopg2.extras.execute_values(cur, """
+            UPDATE users AS u
+            SET rating = v.rating, rating_deviation = v.deviation, rating_volatility = v.volatility
+            FROM (VALUES %s) AS v(id, rating, deviation, volatility)
+            WHERE u.id = v.id
+        """, values, template='(%s, %s::float8, %s::float8, %s::float8)', page_size=len(values))
+        psycopg2.extras.execute_values(cur, """
+            UPDATE matchmaking_queue AS q
+            SET skill_rating = v.skill_rating
+            FROM (VALUES %s) AS v(user_id, skill_rating)
+            WHERE q.user_id = v.user_id
+        """, [(user_id, int(round(r))) for user_id, r, _, _ in values], page_size=len(values))
+
+    cur.execute("UPDATE matches SET rated_at = NOW() WHERE id = ANY(%s)", ([r[0] for r in rows],))
+    conn.commit()
+    cur.close()
+    return {'matches': len(rated), 'players': len(updated)}
+
+
+def handle(event, method, conn, headers):
+    """Admin trigger for the rating pipeline; routed lazily so NumPy is only imported when used."""
+    body = json.loads(event.get('body', '{}'))
+    batch_size = min(int(body.get('batch_size', RATING_BATCH_SIZE)), RATING_BATCH_SIZE)
+    max_batches = min(int(body.get('max_batches', 1)), 100)
+
+    totals = {'matches': 0, 'players': 0, 'batches': 0}
+    for _ in range(max_batches):
+        processed = process_pending(conn, batch_size)
+        if not processed['matches']:
+            break
+        totals['matches'] += processed['matches']
+        totals['players'] += processed['players']
+        totals['batches'] += 1
+
+    return {'statusCode': 200, 'headers': headers, 'body': serialize.dumps(totals), 'isBase64Encoded': False}
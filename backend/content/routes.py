@@ -0,0 +1,118 @@
+import importlib
+import json
+import time
+from typing import Any, Callable, Dict, Iterable, Optional, Sequence, Tuple, Union
+
+import serialize
+
+# handler(event, method, conn, headers) -> response dict
+Handler = Callable[[Dict[str, Any], str, Any, Dict[str, str]], Dict[str, Any]]
+Middleware = Callable[[Handler], Handler]
+
+
+def json_response(status: int, payload: Any, headers: Dict[str, str]) -> Dict[str, Any]:
+    return {'statusCode': status, 'headers': headers, 'body': serialize.dumps(payload), 'isBase64Encoded': False}
+
+
+def lazy(module: str, name: str) -> Handler:
+    """Handler imported on first call, so rarely used code stays out of cold start."""
+    resolved = []
+
+    def call(event, method, conn, headers):
+        if not resolved:
+            resolved.append(getattr(importlib.import_module(module), name))
+        return resolved[0](event, method, conn, headers)
+
+    call.__qualname__ = f'lazy({module}.{name})'
+    return call
+
+
+def timed(handler: Handler) -> Handler:
+    def call(event, method, conn, headers):
+        started = time.perf_counter()
+        response = handler(event, method, conn, headers)
+        elapsed = (time.perf_counter() - started) * 1000
+        response['headers'] = {**response.get('headers', headers), 'X-Response-Time': f'{elapsed:.1f}ms'}
+        return response
+    return call
+
+
+def require(predicate: Callable[[Dict[str, Any]], Any], message: str, status: int = 403) -> Middleware:
+    def middleware(handler: Handler) -> Handler:
+        def call(event, method, conn, headers):
+            if not predicate(event):
+                return json_response(status, {'error': message}, headers)
+            return handler(event, method, conn, headers)
+        return call
+    return middleware
+
+
+def validate(query: Sequence[str] = (), body: Sequence[str] = ()) -> Middleware:
+    """400 unless the named query parameters / JSON body fields are present."""
+    def middleware(handler: Handler) -> Handler:
+        def call(event, method, conn, headers):
+            params = event.get('queryStringParameters') or {}
+            missing = [name for name in query if not params.get(name)]
+            if body:
+                fields = parsed_body(event)
+                missing += [name for name in body if fields.get(name) in (None, '')]
+            if missing:
+                return json_response(400, {'error': f"{', '.join(missing)} required"}, headers)
+            return handler(event, method, conn, headers)
+        return call
+    return middleware
+
+
+def parsed_body(event: Dict[str, Any]) -> Dict[str, Any]:
+    """JSON body parsed once per request and kept on the event."""
+    if '_parsed_body' not in event:
+        try:
+            body = json.loads(event.get('body') or '{}')
+        except ValueError:
+            body = {}
+        event['_parsed_body'] = body if isinstance(body, dict) else {}
+    return event['_parsed_body']
+
+
+def request_action(event: Dict[str, Any], method: str) -> Optional[str]:
+    if method == 'GET':
+        return (event.get('queryStringParameters') or {}).get('action')
+    return parsed_body(event).get('action')
+
+
+class Registry:
+    """
+    (resource, method, action) -> handler with its middleware composed once
+    at registration. Lookups try the action-specific route first, then the
+    method route. The action is read from exactly one place, the one the
+    handlers act on: the JSON body for writes, ?action= for GET. It is only
+    parsed for resources that register action routes.
+    """
+
+    def __init__(self, middleware: Iterable[Middleware] = ()) -> None:
+        self.middleware = list(middleware)
+        self._routes: Dict[Tuple[str, str, Optional[str]], Handler] = {}
+        self._has_actions: Dict[Tuple[str, str], bool] = {}
+        self._resources = set()
+
+    def add(self, resource: str, methods: Union[str, Sequence[str]], handler: Handler,
+            action: Optional[str] = None, middleware: Iterable[Middleware] = ()) -> None:
+        call = handler
+        for wrap in reversed([*self.middleware, *middleware]):
+            call = wrap(call)
+        self._resources.add(resource)
+        for method in ([methods] if isinstance(methods, str) else methods):
+            self._routes[(resource, method, action)] = call
+            if action is not None:
+                self._has_actions[(resource, method)] = True
+
+    def knows(self, resource: str) -> bool:
+        return resource in self._resources
+
+    def resolve(self, event: Dict[str, Any], resource: str, method: str) -> Optional[Handler]:
+        if self._has_actions.get((resource, method)):
+            action = request_action(event, method)
+            route = self._routes.get((resource, method, action))
+            if route is not None:
+                return route
+        return self._routes.get((resource, method, None))
@@ -0,0 +1,133 @@
+import base64
+import binascii
+import datetime
+import decimal
+import json
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import orjson
+except ImportError:  # stdlib fallback keeps the function deployable without wheels
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+if orjson is not None:
+    _OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps(value: Any) -> str:
+        return orjson.dumps(value, default=_default, option=_OPTIONS).decode('utf-8')
+else:
+    _encoder = json.JSONEncoder(default=_default, separators=(',', ':'))
+
+    def dumps(value: Any) -> str:
+        return _encoder.encode(value)
+
+
+def cursor(key: datetime.datetime, row_id: int) -> str:
+    """
+    Opaque keyset cursor for (timestamp, id). base64url, so it survives a
+    query string unencoded; a raw isoformat() would lose its '+' to a space.
+    """
+    return encode_cursor(f'{key.isoformat()}|{row_id}')
+
+
+def encode_cursor(raw: str) -> str:
+    """cursor() for a '<ISO timestamp>|<id>' string built elsewhere, e.g. by json_page in SQL."""
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).rstrip(b'=').decode('ascii')
+
+
+def parse_cursor(value: str) -> Tuple[str, int]:
+    """(ISO timestamp, id) from cursor(); ValueError if it was not made by cursor()."""
+    try:
+        raw = base64.urlsafe_b64decode(value + '=' * (-len(value) % 4)).decode('utf-8')
+        key, row_id = raw.rsplit('|', 1)
+        datetime.datetime.fromisoformat(key)
+        return key, int(row_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError('Invalid cursor')
+
+
+class Columns:
+    """
+    SELECT list and output keys declared together, once per query:
+
+        CHALLENGE = Columns(('id', 'c.id'), ('creator.id', 'c.creator_id'), ...)
+        cur.execute(f"SELECT {CHALLENGE.sql} FROM ...")
+        CHALLENGE.all(cur.fetchall())
+
+    Dotted keys build nested objects; a nested object whose 'id' is NULL
+    comes out as None. Keys starting with '_' are selected but not emitted.
+    Dates stay as datetime objects and are formatted by dumps().
+    """
+
+    def __init__(self, *columns: Tuple[str, str]) -> None:
+        self.keys = [key for key, _ in columns]
+        self.sql = ', '.join(expr for _, expr in columns)
+        self._flat: List[Tuple[str, int]] = []
+        self._nested: Dict[str, List[Tuple[str, int]]] = {}
+        for i, key in enumerate(self.keys):
+            if key.startswith('_'):
+                continue
+            head, _, tail = key.partition('.')
+            if tail:
+                if head not in self._nested:
+                    self._flat.append((head, -1))
+                self._nested.setdefault(head, []).append((tail, i))
+            else:
+                self._flat.append((key, i))
+
+    def index(self, key: str) -> int:
+        return self.keys.index(key)
+
+    def row(self, row: Sequence[Any]) -> Dict[str, Any]:
+        result: Dict[str, Any] = {}
+        for key, i in self._flat:
+            if i >= 0:
+                result[key] = row[i]
+                continue
+            fields = self._nested[key]
+            nested = {name: row[j] for name, j in fields}
+            result[key] = nested if nested.get('id', True) is not None else None
+        return result
+
+    def all(self, rows: Iterable[Sequence[Any]]) -> List[Dict[str, Any]]:
+        if not self._nested:
+            # Common case: plain zip is several times faster than the generic path
+            keys = [key for key, _ in self._flat]
+            idx = [i for _, i in self._flat]
+            if idx == list(range(len(idx))) and len(idx) == len(self.keys):
+                return [dict(zip(keys, r)) for r in rows]
+            return [dict(zip(keys, [r[i] for i in idx])) for r in rows]
+        return [self.row(r) for r in rows]
+
+
+def json_rows(cur, query: str, args: Optional[Sequence[Any]] = None) -> str:
+    """
+    Lets Postgres build the JSON array so the rows never become Python
+    objects; the result is passed through as the response body. Column
+    aliases become keys, so camelCase ones must be double-quoted. Element
+    order follows the subquery's ORDER BY.
+    """
+    cur.execute(f"SELECT COALESCE(json_agg(r), '[]'::json)::text FROM ({query}) r", args)
+    return cur.fetchone()[0]
+
+
+def json_page(cur, query: str, cursor: str, args: Optional[Sequence[Any]] = None) -> Tuple[str, int, Optional[str]]:
+    """
+    json_rows for a keyset page: also returns the row count and the text of
+    the `cursor` expression (over the subquery's columns as r.*) for the
+    last row, collected in the same aggregate pass.
+    """
+    cur.execute(f"""
+        SELECT COALESCE(json_agg(r), '[]'::json)::text, COUNT(*), (array_agg({cursor}))[COUNT(*)]
+        FROM ({query}) r
+    """, args)
+    return cur.fetchone()
@@ -0,0 +1,130 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+from typing import Any, Dict, Optional, Set
+
+SESSION_TTL = int(os.environ.get('SESSION_TTL', str(7 * 24 * 3600)))
+REVOCATION_REFRESH = float(os.environ.get('SESSION_REVOCATION_REFRESH', '30'))
+
+
+class TokenError(Exception):
+    pass
+
+
+def _load_keys() -> Dict[str, bytes]:
+    """
+    SESSION_KEYS is "kid:secret,kid:secret"; the first key signs new tokens,
+    the rest are still accepted so keys can be rotated without logging users out.
+    """
+    keys: Dict[str, bytes] = {}
+    for entry in os.environ.get('SESSION_KEYS', '').split(','):
+        kid, _, secret = entry.strip().partition(':')
+        if kid and secret:
+            keys[kid] = secret.encode('utf-8')
+    return keys
+
+
+_keys = _load_keys()
+_signing_kid = next(iter(_keys), None)
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+def _sign(kid: str, payload: str) -> str:
+    return _b64encode(hmac.new(_keys[kid], payload.encode('ascii'), hashlib.sha256).digest())
+
+
+def enabled() -> bool:
+    return _signing_kid is not None
+
+
+def issue(user_id: int, is_admin: bool = False) -> Dict[str, Any]:
+    if _signing_kid is None:
+        raise TokenError('SESSION_KEYS is not configured')
+    now = int(time.time())
+    claims = {
+        'sub': user_id,
+        'adm': bool(is_admin),
+        'iat': now,
+        'exp': now + SESSION_TTL,
+        'kid': _signing_kid,
+        'jti': secrets.token_urlsafe(12)
+    }
+    payload = _b64encode(json.dumps(claims, separators=(',', ':')).encode('utf-8'))
+    return {'token': f'{payload}.{_sign(_signing_kid, payload)}', 'expiresAt': claims['exp']}
+
+
+def verify(token: str) -> Dict[str, Any]:
+    payload, _, signature = token.partition('.')
+    if not payload or not signature or not token.isascii():
+        raise TokenError('Malformed token')
+    try:
+        claims = json.loads(_b64decode(payload))
+    except ValueError:
+        raise TokenError('Malformed token')
+    if not isinstance(claims, dict):
+        raise TokenError('Malformed token')
+
+    kid = claims.get('kid')
+    if not isinstance(kid, str) or kid not in _keys or not hmac.compare_digest(_sign(kid, payload), signature):
+        raise TokenError('Invalid token signature')
+    if claims.get('exp', 0) < time.time():
+        raise TokenError('Token expired')
+    if is_revoked(claims.get('jti')):
+        raise TokenError('Token revoked')
+    return claims
+
+
+def bearer_token(event: Dict[str, Any]) -> Optional[str]:
+    headers = event.get('headers') or {}
+    for name, value in headers.items():
+        if name.lower() in ('authorization', 'x-auth-token') and value:
+            return value[7:].strip() if value.lower().startswith('bearer ') else value.strip()
+    return None
+
+
+_revoked: Set[str] = set()
+# -inf, not 0.0: monotonic() may be smaller than REVOCATION_REFRESH right after boot
+_revoked_loaded_at = float('-inf')
+_revoked_lock = threading.Lock()
+
+
+def is_revoked(jti: Optional[str]) -> bool:
+    return jti in _revoked
+
+
+def refresh_revocations(conn) -> None:
+    """Reloads the revoked_tokens set at most every REVOCATION_REFRESH seconds."""
+    global _revoked, _revoked_loaded_at
+    if time.monotonic() - _revoked_loaded_at < REVOCATION_REFRESH:
+        return
+    with _revoked_lock:
+        if time.monotonic() - _revoked_loaded_at < REVOCATION_REFRESH:
+            return
+        cur = conn.cursor()
+        cur.execute("SELECT jti FROM revoked_tokens WHERE expires_at > NOW()")
+        _revoked = {row[0] for row in cur.fetchall()}
+        cur.close()
+        _revoked_loaded_at = time.monotonic()
+
+
+def revoke(conn, claims: Dict[str, Any]) -> None:
+    cur = conn.cursor()
+    cur.execute("""
+        INSERT INTO revoked_tokens (jti, user_id, expires_at)
+        VALUES (%s, %s, TO_TIMESTAMP(%s))
+        ON CONFLICT (jti) DO NOTHING
+    """, (claims['jti'], claims['sub'], claims['exp']))
+    cur.close()
+    _revoked.add(claims['jti'])
@@ -0,0 +1,137 @@
+-- Счётчики для главной страницы, поддерживаемые триггерами,
+-- чтобы GET ?resource=stats читал одну строку вместо агрегатов по таблицам
+
+CREATE TABLE IF NOT EXISTS site_stats (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    total_users INTEGER NOT NULL DEFAULT 0,
+    total_tournaments INTEGER NOT NULL DEFAULT 0,
+    total_challenges INTEGER NOT NULL DEFAULT 0,
+    tournament_prizes BIGINT NOT NULL DEFAULT 0,
+    challenge_prizes BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Полный пересчёт: используется для начального заполнения и починки счётчиков
+CREATE OR REPLACE FUNCTION refresh_site_stats() RETURNS VOID AS $$
+BEGIN
+    INSERT INTO site_stats (id, total_users, total_tournaments, total_challenges,
+                            tournament_prizes, challenge_prizes, updated_at)
+    SELECT 1,
+           (SELECT COUNT(*) FROM users WHERE is_active = true),
+           (SELECT COUNT(*) FROM tournaments WHERE status IN ('completed', 'live')),
+           (SELECT COUNT(*) FROM challenges WHERE status IN ('accepted', 'completed')),
+           (SELECT COALESCE(SUM(prize_pool), 0) FROM tournaments WHERE status = 'completed'),
+           (SELECT COALESCE(SUM(stake * 2), 0) FROM challenges WHERE status = 'completed'),
+           NOW()
+    ON CONFLICT (id) DO UPDATE SET
+        total_users = EXCLUDED.total_users,
+        total_tournaments = EXCLUDED.total_tournaments,
+        total_challenges = EXCLUDED.total_challenges,
+        tournament_prizes = EXCLUDED.tournament_prizes,
+        challenge_prizes = EXCLUDED.challenge_prizes,
+        updated_at = EXCLUDED.updated_at;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION site_stats_users_trigger() RETURNS TRIGGER AS $$
+DECLARE
+    delta INTEGER := 0;
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.is_active IS TRUE THEN
+        delta := delta - 1;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.is_active IS TRUE THEN
+        delta := delta + 1;
+    END IF;
+    IF delta <> 0 THEN
+        UPDATE site_stats SET total_users = total_users + delta, updated_at = NOW() WHERE id = 1;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION site_stats_tournaments_trigger() RETURNS TRIGGER AS $$
+DECLARE
+    delta_count INTEGER := 0;
+    delta_prizes BIGINT := 0;
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        IF OLD.status IN ('completed', 'live') THEN
+            delta_count := delta_count - 1;
+        END IF;
+        IF OLD.status = 'completed' THEN
+            delta_prizes := delta_prizes - COALESCE(OLD.prize_pool, 0);
+        END IF;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        IF NEW.status IN ('completed', 'live') THEN
+            delta_count := delta_count + 1;
+        END IF;
+        IF NEW.status = 'completed' THEN
+            delta_prizes := delta_prizes + COALESCE(NEW.prize_pool, 0);
+        END IF;
+    END IF;
+    IF delta_count <> 0 OR delta_prizes <> 0 THEN
+        UPDATE site_stats
+        SET total_tournaments = total_tournaments + delta_count,
+            tournament_prizes = tournament_prizes + delta_prizes,
+            updated_at = NOW()
+        WHERE id = 1;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION site_stats_challenges_trigger() RETURNS TRIGGER AS $$
+DECLARE
+    delta_count INTEGER := 0;
+    delta_prizes BIGINT := 0;
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        IF OLD.status IN ('accepted', 'completed') THEN
+            delta_count := delta_count - 1;
+        END IF;
+        IF OLD.status = 'completed' THEN
+            delta_prizes := delta_prizes - COALESCE(OLD.stake, 0) * 2;
+        END IF;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        IF NEW.status IN ('accepted', 'completed') THEN
+            delta_count := delta_count + 1;
+        END IF;
+        IF NEW.status = 'completed' THEN
+            delta_prizes := delta_prizes + COALESCE(NEW.stake, 0) * 2;
+        END IF;
+    END IF;
+    IF delta_count <> 0 OR delta_prizes <> 0 THEN
+        UPDATE site_stats
+        SET total_challenges = total_challenges + delta_count,
+            challenge_prizes = challenge_prizes + delta_prizes,
+            updated_at = NOW()
+        WHERE id = 1;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_site_stats_users ON users;
+CREATE TRIGGER trg_site_stats_users
+AFTER INSERT OR DELETE OR UPDATE OF is_active ON users
+FOR EACH ROW EXECUTE FUNCTION site_stats_users_trigger();
+
+DROP TRIGGER IF EXISTS trg_site_stats_tournaments ON tournaments;
+CREATE TRIGGER trg_site_stats_tournaments
+AFTER INSERT OR DELETE OR UPDATE OF status, prize_pool ON tournaments
+FOR EACH ROW EXECUTE FUNCTION site_stats_tournaments_trigger();
+
+DROP TRIGGER IF EXISTS trg_site_stats_challenges ON challenges;
+CREATE TRIGGER trg_site_stats_challenges
+AFTER INSERT OR DELETE OR UPDATE OF status, stake ON challenges
+FOR EACH ROW EXECUTE FUNCTION site_stats_challenges_trigger();
+
+SELECT refresh_site_stats();
+
+-- Для подсчёта "онлайн" по недавним записям друзей
+CREATE INDEX IF NOT EXISTS idx_friends_accepted_created ON friends(created_at) WHERE status = 'accepted';
+
+INSERT INTO schema_version (version) VALUES (9) ON CONFLICT DO NOTHING;
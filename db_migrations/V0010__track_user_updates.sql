@@ -0,0 +1,19 @@
+-- updated_at обновляется при любом изменении пользователя, чтобы
+-- лидерборд в памяти мог дочитывать только изменившиеся строки
+
+CREATE OR REPLACE FUNCTION users_touch_updated_at() RETURNS TRIGGER AS $$
+BEGIN
+    NEW.updated_at := NOW();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_users_touch_updated_at ON users;
+CREATE TRIGGER trg_users_touch_updated_at
+BEFORE UPDATE ON users
+FOR EACH ROW EXECUTE FUNCTION users_touch_updated_at();
+
+CREATE INDEX IF NOT EXISTS idx_users_updated_at ON users(updated_at);
+CREATE INDEX IF NOT EXISTS idx_users_region_points ON users(region, points DESC, id) WHERE is_active = true;
+
+INSERT INTO schema_version (version) VALUES (10) ON CONFLICT DO NOTHING;
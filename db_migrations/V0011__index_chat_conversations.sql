@@ -0,0 +1,25 @@
+-- Сообщения адресуются по каноническому ключу диалога (меньший id, больший id)
+
+CREATE INDEX IF NOT EXISTS idx_messages_conversation
+    ON messages (LEAST(sender_id, receiver_id), GREATEST(sender_id, receiver_id), id);
+
+CREATE INDEX IF NOT EXISTS idx_messages_unread
+    ON messages (receiver_id, sender_id) WHERE is_read = false;
+
+-- Уведомление для long-poll клиентов: канал chat_<меньший id>_<больший id>
+CREATE OR REPLACE FUNCTION messages_notify() RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify(
+        'chat_' || LEAST(NEW.sender_id, NEW.receiver_id) || '_' || GREATEST(NEW.sender_id, NEW.receiver_id),
+        NEW.id::text
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_messages_notify ON messages;
+CREATE TRIGGER trg_messages_notify
+AFTER INSERT ON messages
+FOR EACH ROW EXECUTE FUNCTION messages_notify();
+
+INSERT INTO schema_version (version) VALUES (11) ON CONFLICT DO NOTHING;
@@ -0,0 +1,12 @@
+-- Отозванные сессионные токены (logout); функции кэшируют активные jti в памяти
+
+CREATE TABLE IF NOT EXISTS revoked_tokens (
+    jti VARCHAR(32) PRIMARY KEY,
+    user_id INTEGER REFERENCES users(id),
+    expires_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    revoked_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_revoked_tokens_expires ON revoked_tokens(expires_at);
+
+INSERT INTO schema_version (version) VALUES (12) ON CONFLICT DO NOTHING;
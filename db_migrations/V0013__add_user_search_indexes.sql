@@ -0,0 +1,10 @@
+-- Поиск пользователей: триграммы для подстрок и индекс для префиксов
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_users_username_trgm ON users USING gin (username gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_users_display_name_trgm ON users USING gin (display_name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_users_username_prefix ON users (lower(username) text_pattern_ops);
+CREATE INDEX IF NOT EXISTS idx_users_display_name_prefix ON users (lower(display_name) text_pattern_ops);
+
+INSERT INTO schema_version (version) VALUES (13) ON CONFLICT DO NOTHING;
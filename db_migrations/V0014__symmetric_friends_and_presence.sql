@@ -0,0 +1,23 @@
+-- Дружба хранится двумя направленными строками, чтобы список друзей
+-- читался по индексу (user_id, status) без OR в JOIN
+
+INSERT INTO friends (user_id, friend_id, status, created_at)
+SELECT friend_id, user_id, 'accepted', created_at
+FROM friends
+WHERE status = 'accepted'
+ON CONFLICT (user_id, friend_id) DO UPDATE SET status = 'accepted';
+
+CREATE INDEX IF NOT EXISTS idx_friends_user_status ON friends(user_id, status, friend_id);
+CREATE INDEX IF NOT EXISTS idx_friends_friend_status ON friends(friend_id, status);
+
+DROP INDEX IF EXISTS idx_friends_accepted_created;
+
+-- Присутствие пользователей (heartbeat)
+CREATE TABLE IF NOT EXISTS user_presence (
+    user_id INTEGER PRIMARY KEY REFERENCES users(id),
+    last_seen_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_user_presence_last_seen ON user_presence(last_seen_at);
+
+INSERT INTO schema_version (version) VALUES (14) ON CONFLICT DO NOTHING;
@@ -0,0 +1,7 @@
+-- Индексы для серверного подбора игроков
+
+CREATE INDEX IF NOT EXISTS idx_matchmaking_mode_rating ON matchmaking_queue(game_mode, skill_rating);
+CREATE INDEX IF NOT EXISTS idx_matches_player1_status ON matches(player1_id, status);
+CREATE INDEX IF NOT EXISTS idx_matches_player2_status ON matches(player2_id, status);
+
+INSERT INTO schema_version (version) VALUES (15) ON CONFLICT DO NOTHING;
@@ -0,0 +1,13 @@
+-- Рейтинг Glicko-2 игроков и отметка об учтённых матчах
+
+ALTER TABLE users
+ADD COLUMN IF NOT EXISTS rating DOUBLE PRECISION DEFAULT 1500,
+ADD COLUMN IF NOT EXISTS rating_deviation DOUBLE PRECISION DEFAULT 350,
+ADD COLUMN IF NOT EXISTS rating_volatility DOUBLE PRECISION DEFAULT 0.06;
+
+ALTER TABLE matches ADD COLUMN IF NOT EXISTS rated_at TIMESTAMP WITH TIME ZONE;
+
+CREATE INDEX IF NOT EXISTS idx_matches_unrated
+    ON matches(finished_at, id) WHERE status = 'completed' AND rated_at IS NULL;
+
+INSERT INTO schema_version (version) VALUES (16) ON CONFLICT DO NOTHING;
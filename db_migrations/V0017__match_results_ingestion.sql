@@ -0,0 +1,20 @@
+-- Статистика матчей хранится в JSONB вместо TEXT
+
+-- Старые строки с невалидным JSON сохраняются как JSON-строка, чтобы приведение типа не прервало миграцию
+CREATE OR REPLACE FUNCTION pg_temp.is_valid_json(value TEXT) RETURNS BOOLEAN AS $$
+BEGIN
+    PERFORM value::jsonb;
+    RETURN true;
+EXCEPTION WHEN others THEN
+    RETURN false;
+END;
+$$ LANGUAGE plpgsql;
+
+UPDATE matches SET match_stats = to_jsonb(match_stats)::text
+WHERE match_stats IS NOT NULL AND match_stats <> '' AND NOT pg_temp.is_valid_json(match_stats);
+
+ALTER TABLE matches
+ALTER COLUMN match_stats TYPE JSONB
+USING CASE WHEN match_stats IS NULL OR match_stats = '' THEN NULL ELSE match_stats::jsonb END;
+
+INSERT INTO schema_version (version) VALUES (17) ON CONFLICT DO NOTHING;
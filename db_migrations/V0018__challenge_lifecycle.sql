@@ -0,0 +1,15 @@
+-- Жизненный цикл вызовов: open -> accepted -> in_progress -> completed,
+-- ставки списываются при создании/принятии и выплачиваются победителю
+
+ALTER TABLE challenges
+ADD COLUMN IF NOT EXISTS reward INTEGER,
+ADD COLUMN IF NOT EXISTS escrowed BOOLEAN NOT NULL DEFAULT false,
+ADD COLUMN IF NOT EXISTS accepted_at TIMESTAMP WITH TIME ZONE,
+ADD COLUMN IF NOT EXISTS completed_at TIMESTAMP WITH TIME ZONE;
+
+UPDATE challenges SET reward = FLOOR(COALESCE(stake, 0) * 1.8) WHERE reward IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_challenges_status_created ON challenges(status, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_challenges_creator_created ON challenges(creator_id, created_at DESC);
+
+INSERT INTO schema_version (version) VALUES (18) ON CONFLICT DO NOTHING;
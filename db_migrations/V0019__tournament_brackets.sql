@@ -0,0 +1,25 @@
+-- Сетка турниров: формат, компактная структура сетки и привязка матчей к турниру
+
+ALTER TABLE tournaments
+ADD COLUMN IF NOT EXISTS format VARCHAR(32) DEFAULT 'single-elimination',
+ADD COLUMN IF NOT EXISTS bracket JSONB;
+
+-- Турниры создаются из админки без tournament_id и game_mode
+ALTER TABLE tournaments ALTER COLUMN tournament_id SET DEFAULT 't_' || md5(random()::text);
+ALTER TABLE tournaments ALTER COLUMN game_mode SET DEFAULT '1v1';
+
+ALTER TABLE matches
+ADD COLUMN IF NOT EXISTS tournament_id INTEGER REFERENCES tournaments(id),
+ADD COLUMN IF NOT EXISTS tournament_round INTEGER,
+ADD COLUMN IF NOT EXISTS bracket_slot INTEGER;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_matches_tournament_slot
+    ON matches(tournament_id, bracket_slot) WHERE tournament_id IS NOT NULL;
+
+-- Постраничный список турниров по (COALESCE(start_date, created_at), id)
+CREATE INDEX IF NOT EXISTS idx_tournaments_listing
+    ON tournaments((COALESCE(start_date, created_at)) DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_tournaments_status_listing
+    ON tournaments(status, (COALESCE(start_date, created_at)) DESC, id DESC);
+
+INSERT INTO schema_version (version) VALUES (19) ON CONFLICT DO NOTHING;
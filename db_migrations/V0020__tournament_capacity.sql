@@ -0,0 +1,18 @@
+-- Счётчик участников турнира и лист ожидания
+
+ALTER TABLE tournaments ADD COLUMN IF NOT EXISTS participants_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE tournament_participants ADD COLUMN IF NOT EXISTS waitlisted BOOLEAN NOT NULL DEFAULT false;
+
+UPDATE tournaments t
+SET participants_count = c.total
+FROM (
+    SELECT tournament_id, COUNT(*) AS total
+    FROM tournament_participants
+    GROUP BY tournament_id
+) c
+WHERE t.id = c.tournament_id;
+
+CREATE INDEX IF NOT EXISTS idx_tournament_participants_waitlist
+    ON tournament_participants(tournament_id, joined_at, id) WHERE waitlisted;
+
+INSERT INTO schema_version (version) VALUES (20) ON CONFLICT DO NOTHING;
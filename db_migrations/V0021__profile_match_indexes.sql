@@ -0,0 +1,8 @@
+-- Последние матчи игрока для профиля: по индексу на каждую сторону матча
+
+CREATE INDEX IF NOT EXISTS idx_matches_player1_finished
+    ON matches(player1_id, finished_at DESC) WHERE status = 'completed';
+CREATE INDEX IF NOT EXISTS idx_matches_player2_finished
+    ON matches(player2_id, finished_at DESC) WHERE status = 'completed';
+
+INSERT INTO schema_version (version) VALUES (21) ON CONFLICT DO NOTHING;
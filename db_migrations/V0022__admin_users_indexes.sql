@@ -0,0 +1,12 @@
+-- Админский список пользователей: keyset-пагинация по (created_at, id) и фильтры
+
+CREATE INDEX IF NOT EXISTS idx_users_created_id
+    ON users(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_users_region_created_id
+    ON users(region, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_users_inactive_created_id
+    ON users(created_at DESC, id DESC) WHERE NOT is_active;
+CREATE INDEX IF NOT EXISTS idx_users_admin_created_id
+    ON users(created_at DESC, id DESC) WHERE is_admin;
+
+INSERT INTO schema_version (version) VALUES (22) ON CONFLICT DO NOTHING;
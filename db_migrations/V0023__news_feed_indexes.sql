@@ -0,0 +1,8 @@
+-- Лента новостей: keyset-пагинация по (created_at, id) и фильтр по категории
+
+CREATE INDEX IF NOT EXISTS idx_news_created_id
+    ON news(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_news_category_created_id
+    ON news(category, created_at DESC, id DESC);
+
+INSERT INTO schema_version (version) VALUES (23) ON CONFLICT DO NOTHING;
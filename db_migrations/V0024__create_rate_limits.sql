@@ -0,0 +1,15 @@
+-- Общие token bucket'ы для ограничения частоты входа/регистрации между инстансами auth.
+-- UNLOGGED: счётчики не нужны после сбоя, зато запись не идёт в WAL
+
+CREATE UNLOGGED TABLE IF NOT EXISTS rate_limits (
+    key VARCHAR(64) PRIMARY KEY,
+    tokens DOUBLE PRECISION NOT NULL,
+    capacity DOUBLE PRECISION NOT NULL,
+    refill_rate DOUBLE PRECISION NOT NULL,
+    allowed BOOLEAN NOT NULL DEFAULT true,
+    updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_rate_limits_updated_at ON rate_limits(updated_at);
+
+INSERT INTO schema_version (version) VALUES (24) ON CONFLICT DO NOTHING;
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+In-process load test for the auth rate limiter: legitimate logins at a
+steady rate while an attacker bursts wrong-password attempts from a small
+pool of IPs. Each attempt goes through ratelimit.check and, if allowed,
+a real bcrypt check, which is the CPU cost the limiter protects. The
+database lookup is left out, so run it next to the bcrypt settings you
+deploy with.
+
+What the limiter promises is scoped to what one instance can do. Every
+attacking IP gets a few wrong guesses hashed before its failure bucket
+empties, and those hashes compete with legitimate logins for the CPU. So
+p99 does not stay flat. The check is that under an attack from a handful
+of IPs, no legitimate login fails and p99 rises by at most --p99-budget-ms
+over the baseline. An attack spread over many IPs costs more than one
+vCPU can hash and is out of scope here. It needs the shared store
+(RATE_LIMIT_STORE) or limiting in front of the function. The script
+exits non-zero when the budget is missed.
+
+    python scripts/auth_load_test.py --rounds 10 --attack-rps 200 --attack-ips 2
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend', 'auth'))
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(p / 100 * len(sorted_values)), len(sorted_values) - 1)]
+
+
+def run(phase: str, limited: bool, attack_rps: float, args, hashing, ratelimit, hashed: str) -> Tuple[int, float]:
+    ratelimit._local.clear()
+    latencies: List[float] = []
+    outcomes: Dict[str, int] = {}
+    lock = threading.Lock()
+    stop = time.monotonic() + args.duration
+
+    def attempt(ip: str, login: str, password: str, legit: bool) -> None:
+        started = time.perf_counter()
+        event = {'requestContext': {'identity': {'sourceIp': ip}}}
+        # Same sequence as auth dispatch: buckets, in-flight slot, bcrypt, failure accounting
+        if limited and (ratelimit.check(event, 'login', {'login': login}) or not ratelimit.admit(event)):
+            outcome = '429'
+        else:
+            try:
+                outcome = '200' if hashing.check_password(password, hashed) else '401'
+            except hashing.HashingBusy:
+                outcome = '503'
+            finally:
+                if limited:
+                    ratelimit.release(event)
+            if limited and outcome == '401':
+                ratelimit.record_failure(event)
+        elapsed = (time.perf_counter() - started) * 1000
+        with lock:
+            if legit:
+                latencies.append(elapsed if outcome == '200' else float('inf'))
+            else:
+                outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+    def drive(pool: ThreadPoolExecutor, rps: float, make) -> None:
+        if rps <= 0:
+            return
+        next_at = time.monotonic()
+        while next_at < stop:
+            pool.submit(attempt, *make())
+            next_at += 1 / rps
+            time.sleep(max(next_at - time.monotonic(), 0))
+
+    attack_ips = [f'203.0.113.{i}' for i in range(args.attack_ips)]
+    with ThreadPoolExecutor(max_workers=256) as pool:
+        drivers = [
+            threading.Thread(target=drive, args=(pool, args.legit_rps, lambda: (
+                f'198.51.100.{random.randrange(250)}', f'player{random.randrange(10000)}', 'correct-password', True))),
+            threading.Thread(target=drive, args=(pool, attack_rps, lambda: (
+                random.choice(attack_ips), f'victim{random.randrange(100000)}', 'guess', False))),
+        ]
+        for driver in drivers:
+            driver.start()
+        for driver in drivers:
+            driver.join()
+
+    latencies.sort()
+    failed = sum(1 for v in latencies if v == float('inf'))
+    served = [v for v in latencies if v != float('inf')]
+    print(f'{phase:<24} legit n={len(latencies):<4} failed={failed:<4} '
+          f'p50={percentile(served, 50):7.1f}ms p99={percentile(served, 99):7.1f}ms  attack={outcomes}')
+    return failed, percentile(served, 99)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--legit-rps', type=float, default=5)
+    parser.add_argument('--attack-rps', type=float, default=200)
+    parser.add_argument('--attack-ips', type=int, default=2)
+    parser.add_argument('--rounds', type=int, default=10, help='BCRYPT_ROUNDS for the test')
+    parser.add_argument('--p99-budget-ms', type=float, default=100, help='allowed p99 rise under attack')
+    args = parser.parse_args()
+
+    os.environ['BCRYPT_ROUNDS'] = str(args.rounds)
+    import hashing
+    import ratelimit
+
+    hashed = hashing.hash_password('correct-password')
+    _, baseline = run('baseline', True, 0, args, hashing, ratelimit, hashed)
+    run('attack, no limiter', False, args.attack_rps, args, hashing, ratelimit, hashed)
+    failed, attacked = run('attack, limiter', True, args.attack_rps, args, hashing, ratelimit, hashed)
+
+    rise = attacked - baseline
+    ok = failed == 0 and rise <= args.p99_budget_ms
+    print(f'{"OK" if ok else "FAILED"}: p99 rose {rise:.0f}ms (budget {args.p99_budget_ms:.0f}ms), '
+          f'{failed} legitimate logins failed, {args.attack_ips} attacking IPs')
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Shared helpers for the benchmark and load-test scripts in this directory:
+timing, percentiles, thread fan-out and access to the backend modules.
+Scripts that need Postgres read DATABASE_URL and should be pointed at a
+scratch database; they create their own rows under a random prefix and
+delete them afterwards.
+"""
+import math
+import os
+import sys
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def use_backend(function: str) -> None:
+    """Makes backend/<function> importable, the way the function runtime does."""
+    path = os.path.join(ROOT, 'backend', function)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+def database_url() -> str:
+    dsn = os.environ.get('DATABASE_URL')
+    if not dsn:
+        sys.exit('DATABASE_URL is required (point it at a scratch database)')
+    return dsn
+
+
+def prefix(name: str) -> str:
+    return f'{name}_{uuid.uuid4().hex[:8]}_'
+
+
+def percentile(sorted_values: Sequence[float], p: float) -> float:
+    """Nearest-rank percentile of an already sorted sequence."""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(p / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def timed(fn: Callable[[], Any], repeat: int, warmup: int = 0) -> List[float]:
+    """Milliseconds per call, sorted."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return samples
+
+
+def concurrently(workers: int, fn: Callable[[int], Any]) -> List[Any]:
+    """Runs fn(worker_index) on `workers` threads released together; returns results in order."""
+    barrier = threading.Barrier(workers)
+    results: List[Any] = [None] * workers
+    errors: List[BaseException] = []
+
+    def run(i: int) -> None:
+        barrier.wait()
+        try:
+            results[i] = fn(i)
+        except BaseException as e:  # reported after join so one failure doesn't hang the barrier
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    return results
+
+
+def report(label: str, samples_ms: Sequence[float], extra: Optional[Dict[str, Any]] = None) -> None:
+    samples = sorted(samples_ms)
+    line = (f'{label:<36} n={len(samples):<6} p50={percentile(samples, 50):9.3f}ms '
+            f'p99={percentile(samples, 99):9.3f}ms max={(samples[-1] if samples else 0):9.3f}ms')
+    if extra:
+        line += '  ' + ' '.join(f'{k}={v}' for k, v in extra.items())
+    print(line)
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Bracket generation and progression for large tournaments
+(backend/content/brackets.py), without a database. For each format it
+times what _start and _advance compute: elimination_layout once per
+tournament, then one resolve of the whole bracket per advance until a
+champion is decided, with every ready match won by a random side. For
+Swiss, swiss_pairings runs once per round over the full history for
+swiss_rounds(players) rounds.
+
+    python scripts/bracket_bench.py --players 4096
+"""
+import argparse
+import random
+import time
+
+import bench
+
+
+def elimination(brackets, players: int, double: bool, repeat: int) -> None:
+    label = 'double' if double else 'single'
+    seeds = list(range(1, players + 1))
+    samples = bench.timed(lambda: brackets.elimination_layout(players, double), repeat, warmup=1)
+    layout = brackets.elimination_layout(players, double)
+    bench.report(f'{label} x{players}: layout', samples, {'slots': len(layout['rounds'])})
+
+    rng = random.Random(1)
+    results = {}
+    resolves = []
+    started = time.perf_counter()
+    while True:
+        resolve_started = time.perf_counter()
+        state = brackets.resolve(layout, seeds, results)
+        resolves.append((time.perf_counter() - resolve_started) * 1000)
+        if state[-1][3]:
+            break
+        for slot, (a, b, _, done) in enumerate(state):
+            if not done and a is not None and b is not None:
+                results[slot] = rng.choice((a, b))
+    elapsed = (time.perf_counter() - started) * 1000
+    bench.report(f'{label} x{players}: resolve', resolves,
+                 {'advances': len(resolves), 'played': len(results), 'total_ms': round(elapsed, 1)})
+
+
+def swiss(brackets, players: int) -> None:
+    seeds = list(range(1, players + 1))
+    rng = random.Random(1)
+    history = []
+    rounds = []
+    for _ in range(brackets.swiss_rounds(players)):
+        started = time.perf_counter()
+        pairs = brackets.swiss_pairings(seeds, history)
+        rounds.append((time.perf_counter() - started) * 1000)
+        history += [(p1, p2, p1 if p2 is None else rng.choice((p1, p2, None))) for p1, p2 in pairs]
+    rematches = len(history) - len({frozenset(m[:2]) for m in history})
+    bench.report(f'swiss x{players}: pairings', rounds,
+                 {'rounds': len(rounds), 'matches': len(history), 'rematches': rematches,
+                  'total_ms': round(sum(rounds), 1)})
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--players', type=int, nargs='+', default=[4096])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    bench.use_backend('content')
+    import brackets
+
+    for players in args.players:
+        elimination(brackets, players, False, args.repeat)
+        elimination(brackets, players, True, args.repeat)
+        swiss(brackets, players)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Concurrency test for challenge escrow (backend/content/challenges.py)
+against a real database. Races the lifecycle steps from separate
+connections and checks that points are neither created nor lost:
+
+- many players accepting the same open challenge at once;
+- accept racing the creator's cancel;
+- a result arriving while the timeout sweep aborts the challenge;
+- a player accepting a new challenge while an earlier one pays them out.
+
+Creates its own throwaway users (prefixed cc_test_) and deletes them
+afterwards. Point it at a scratch database:
+
+    DATABASE_URL=postgresql://... python scripts/challenge_concurrency_test.py --rounds 50
+"""
+import argparse
+import os
+import sys
+import threading
+import uuid
+from typing import Callable, Dict, List, Sequence
+
+import psycopg2
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend', 'content'))
+
+import challenges  # noqa: E402
+
+START_POINTS = 1000
+STAKE = 100
+
+
+def race(dsn: str, calls: Sequence[Callable]) -> List:
+    """
+    Runs each call(conn) on its own connection, released together by a
+    barrier. A database error (e.g. DeadlockDetected) is returned in place
+    of the result so the checks can report it.
+    """
+    conns = [psycopg2.connect(dsn) for _ in calls]
+    barrier = threading.Barrier(len(calls))
+    results: List = [None] * len(calls)
+
+    def run(i: int) -> None:
+        barrier.wait()
+        try:
+            results[i] = calls[i](conns[i])
+        except psycopg2.Error as e:
+            conns[i].rollback()
+            results[i] = (type(e).__name__, {'error': str(e)})
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(len(calls))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for conn in conns:
+        conn.close()
+    return results
+
+
+class Fixture:
+    def __init__(self, dsn: str, players: int) -> None:
+        self.dsn = dsn
+        self.conn = psycopg2.connect(dsn)
+        self.prefix = f'cc_test_{uuid.uuid4().hex[:8]}_'
+        cur = self.conn.cursor()
+        cur.execute("""
+            INSERT INTO users (username, email, password_hash, display_name, points)
+            SELECT %s || n, %s || n || '@example.invalid', 'x', %s || n, %s
+            FROM generate_series(1, %s) n
+            RETURNING id
+        """, (self.prefix, self.prefix, self.prefix, START_POINTS, players))
+        self.ids = sorted(row[0] for row in cur.fetchall())
+        self.conn.commit()
+        cur.close()
+
+    def points(self) -> Dict[int, int]:
+        cur = self.conn.cursor()
+        cur.execute("SELECT id, points FROM users WHERE id = ANY(%s)", (self.ids,))
+        result = dict(cur.fetchall())
+        self.conn.commit()
+        cur.close()
+        return result
+
+    def challenge(self, creator_id: int) -> int:
+        status, result = challenges.create(self.conn, creator_id, '1v1', STAKE)
+        assert status == 201, result
+        return result['id']
+
+    def accept(self, challenge_id: int, user_id: int) -> None:
+        status, result = challenges.accept(self.conn, challenge_id, user_id)
+        assert status == 201, result
+
+    def age(self, challenge_id: int) -> None:
+        cur = self.conn.cursor()
+        cur.execute("UPDATE challenges SET accepted_at = NOW() - INTERVAL '1 day' WHERE id = %s", (challenge_id,))
+        self.conn.commit()
+        cur.close()
+
+    def close(self) -> None:
+        cur = self.conn.cursor()
+        cur.execute("DELETE FROM challenges WHERE creator_id = ANY(%s)", (self.ids,))
+        cur.execute("DELETE FROM users WHERE id = ANY(%s)", (self.ids,))
+        self.conn.commit()
+        cur.close()
+        self.conn.close()
+
+
+def check(failures: List[str], condition: bool, message: str) -> None:
+    if not condition:
+        failures.append(message)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--acceptors', type=int, default=16)
+    args = parser.parse_args()
+    dsn = os.environ.get('DATABASE_URL')
+    if not dsn:
+        sys.exit('DATABASE_URL is required')
+
+    fixture = Fixture(dsn, max(args.acceptors, 4) + 1)
+    failures: List[str] = []
+    fee = STAKE * 2 - challenges.reward_for(STAKE)
+    creator, others = fixture.ids[0], fixture.ids[1:]
+    try:
+        for n in range(args.rounds):
+            # Many accepts on one challenge: exactly one wins, and only the winner pays
+            before = fixture.points()
+            challenge_id = fixture.challenge(creator)
+            results = race(dsn, [lambda conn, u=u: challenges.accept(conn, challenge_id, u) for u in others])
+            winners = [u for u, (status, _) in zip(others, results) if status == 201]
+            after = fixture.points()
+            check(failures, len(winners) == 1, f'accept round {n}: {len(winners)} acceptors won')
+            check(failures, sum(after.values()) == sum(before.values()) - 2 * STAKE,
+                  f'accept round {n}: escrow does not hold exactly both stakes')
+            check(failures, min(after.values()) >= 0, f'accept round {n}: negative balance')
+            challenges.abort(fixture.conn, challenge_id)
+
+            # Accept against cancel: one of them, never both
+            before = fixture.points()
+            challenge_id = fixture.challenge(creator)
+            (accepted, _), (cancelled, _) = race(dsn, [
+                lambda conn: challenges.accept(conn, challenge_id, others[0]),
+                lambda conn: challenges.cancel(conn, challenge_id, creator),
+            ])
+            after = fixture.points()
+            check(failures, (accepted == 201) != (cancelled == 201),
+                  f'cancel round {n}: accept={accepted} cancel={cancelled}')
+            expected = sum(before.values()) - (2 * STAKE if accepted == 201 else 0)
+            check(failures, sum(after.values()) == expected, f'cancel round {n}: points not conserved')
+            if accepted == 201:
+                challenges.abort(fixture.conn, challenge_id)
+
+            # Result against the timeout sweep: paid out or refunded, never both
+            before = fixture.points()
+            challenge_id = fixture.challenge(creator)
+            fixture.accept(challenge_id, others[1])
+            fixture.age(challenge_id)
+            (completed, _), _ = race(dsn, [
+                lambda conn: challenges.complete(conn, challenge_id, creator),
+                lambda conn: challenges.expire(conn, 3600),
+            ])
+            after = fixture.points()
+            expected = sum(before.values()) - (fee if completed == 201 else 0)
+            check(failures, sum(after.values()) == expected,
+                  f'expire round {n}: complete={completed}, points off by {sum(after.values()) - expected}')
+
+            # Accept by X against the payout of X's previous challenge: both go
+            # through, in either order, without a deadlock between them
+            player, other_creator = others[2], others[3]
+            before = fixture.points()
+            paying = fixture.challenge(creator)
+            fixture.accept(paying, player)
+            challenge_id = fixture.challenge(other_creator)
+            (completed, _), (accepted, _) = race(dsn, [
+                lambda conn: challenges.complete(conn, paying, player),
+                lambda conn: challenges.accept(conn, challenge_id, player),
+            ])
+            after = fixture.points()
+            check(failures, completed == 201 and accepted == 201,
+                  f'payout round {n}: complete={completed} accept={accepted}')
+            expected = sum(before.values()) - fee - 2 * STAKE
+            check(failures, sum(after.values()) == expected, f'payout round {n}: points not conserved')
+            if accepted == 201:
+                challenges.abort(fixture.conn, challenge_id)
+    finally:
+        fixture.close()
+
+    for failure in failures:
+        print('FAIL', failure)
+    print(f'{args.rounds} rounds x 4 races, {args.acceptors} concurrent acceptors: '
+          f'{"ok" if not failures else f"{len(failures)} failures"}')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Concurrent GET ?resource=chat through the content handler(), once as the
+handlers run now (schema checked once per process) and once with the
+per-request CREATE TABLE IF NOT EXISTS + COMMIT that handle_chat used to
+issue before every read. A sampler thread counts ungranted locks in
+pg_locks while each run is going, which is where the catalog lock
+contention shows up.
+
+    DATABASE_URL=postgresql://... python scripts/chat_ddl_load.py --concurrency 16 --requests 4000
+"""
+import argparse
+import os
+import threading
+import time
+from typing import List
+
+import psycopg2
+
+import bench
+
+# What handle_chat ran on every request before the DDL moved to db_migrations
+LEGACY_DDL = """
+    CREATE TABLE IF NOT EXISTS messages (
+        id SERIAL PRIMARY KEY,
+        sender_id INTEGER REFERENCES users(id),
+        receiver_id INTEGER REFERENCES users(id),
+        message TEXT NOT NULL,
+        is_read BOOLEAN DEFAULT FALSE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=4000, help='requests per run')
+    parser.add_argument('--messages', type=int, default=200, help='messages in the seeded conversation')
+    args = parser.parse_args()
+
+    dsn = bench.database_url()
+    os.environ['DATABASE_URL'] = dsn
+    os.environ.setdefault('LOG_REQUESTS', '0')
+    os.environ.setdefault('DB_POOL_MAX_SIZE', str(args.concurrency))
+    bench.use_backend('content')
+    import db
+    import index
+
+    tag = bench.prefix('chatddl')
+    setup = psycopg2.connect(dsn)
+    cur = setup.cursor()
+    cur.execute("""
+        INSERT INTO users (username, email, password_hash, display_name)
+        SELECT %s || n, %s || n || '@example.invalid', 'x', %s || n FROM generate_series(1, 2) n
+        RETURNING id
+    """, (tag, tag, tag))
+    alice, bob = [row[0] for row in cur.fetchall()]
+    cur.execute("""
+        INSERT INTO messages (sender_id, receiver_id, message)
+        SELECT CASE WHEN n %% 2 = 0 THEN %s ELSE %s END, CASE WHEN n %% 2 = 0 THEN %s ELSE %s END, 'message ' || n
+        FROM generate_series(1, %s) n
+    """, (alice, bob, bob, alice, args.messages))
+    setup.commit()
+
+    event = {'httpMethod': 'GET', 'headers': {},
+             'queryStringParameters': {'resource': 'chat', 'user_id': str(alice), 'friend_id': str(bob)}}
+
+    def legacy_request() -> None:
+        with db.connection(dsn) as conn:
+            with conn.cursor() as ddl:
+                ddl.execute(LEGACY_DDL)
+            conn.commit()
+        index.handler(dict(event), None)
+
+    try:
+        for label, request in (('per-request DDL', legacy_request),
+                               ('schema check once', lambda: index.handler(dict(event), None))):
+            waiting: List[int] = []
+            done = threading.Event()
+
+            def sample() -> None:
+                monitor = psycopg2.connect(dsn)
+                monitor.autocommit = True
+                with monitor.cursor() as c:
+                    while not done.is_set():
+                        c.execute('SELECT COUNT(*) FROM pg_locks WHERE NOT granted')
+                        waiting.append(c.fetchone()[0])
+                        time.sleep(0.01)
+                monitor.close()
+
+            sampler = threading.Thread(target=sample)
+            sampler.start()
+            started = time.monotonic()
+            per_worker = max(args.requests // args.concurrency, 1)
+            try:
+                results = bench.concurrently(args.concurrency, lambda _: bench.timed(request, per_worker, warmup=2))
+            finally:
+                done.set()
+                sampler.join()
+            elapsed = time.monotonic() - started
+            samples = [v for r in results for v in r]
+            bench.report(label, samples, {
+                'req/s': round(len(samples) / elapsed),
+                'lock_waiters_max': max(waiting, default=0),
+                'lock_waiters_avg': round(sum(waiting) / max(len(waiting), 1), 2),
+            })
+    finally:
+        cur.execute("DELETE FROM messages WHERE sender_id IN (%s, %s)", (alice, bob))
+        cur.execute("DELETE FROM users WHERE id IN (%s, %s)", (alice, bob))
+        setup.commit()
+        setup.close()
+        db.get_pool(dsn).close_all()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+History fetch latency for one conversation with a million messages
+(backend/content/index.py fetch_conversation), next to the OR-of-pairs
+query handle_chat ran before the conversation index. Pages are timed at
+the newest end, deep in the middle via before=, near the end via after=,
+plus the per-friend unread summary. Seeding is done in SQL and takes a
+minute or so; the rows are deleted afterwards.
+
+    DATABASE_URL=postgresql://... python scripts/chat_history_bench.py --messages 1000000 --repeat 200
+"""
+import argparse
+
+import psycopg2
+
+import bench
+
+LEGACY_QUERY = """
+    SELECT m.*, u1.username as sender_username, u2.username as receiver_username
+    FROM messages m
+    LEFT JOIN users u1 ON m.sender_id = u1.id
+    LEFT JOIN users u2 ON m.receiver_id = u2.id
+    WHERE (m.sender_id = %s AND m.receiver_id = %s) OR (m.sender_id = %s AND m.receiver_id = %s)
+    ORDER BY m.created_at ASC LIMIT 100
+"""
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=1000000)
+    parser.add_argument('--limit', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    dsn = bench.database_url()
+    bench.use_backend('content')
+    import index
+
+    tag = bench.prefix('chathist')
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute("""
+        INSERT INTO users (username, email, password_hash, display_name)
+        SELECT %s || n, %s || n || '@example.invalid', 'x', %s || n FROM generate_series(1, 2) n
+        RETURNING id
+    """, (tag, tag, tag))
+    alice, bob = sorted(row[0] for row in cur.fetchall())
+    cur.execute("""
+        INSERT INTO messages (sender_id, receiver_id, message, is_read, created_at)
+        SELECT CASE WHEN n %% 2 = 0 THEN %s ELSE %s END, CASE WHEN n %% 2 = 0 THEN %s ELSE %s END,
+               'message ' || n, n < %s - 50, NOW() - (%s - n) * INTERVAL '1 second'
+        FROM generate_series(1, %s) n
+    """, (alice, bob, bob, alice, args.messages, args.messages, args.messages))
+    conn.commit()
+    cur.execute('ANALYZE messages')
+    conn.commit()
+    cur.execute("SELECT MIN(id), MAX(id) FROM messages WHERE sender_id IN (%s, %s)", (alice, bob))
+    first, last = cur.fetchone()
+
+    try:
+        cases = [
+            ('legacy OR query (oldest 100)', lambda: (cur.execute(LEGACY_QUERY, (alice, bob, bob, alice)), cur.fetchall())),
+            ('latest page', lambda: index.fetch_conversation(cur, alice, bob, None, None, args.limit)),
+            ('before= middle', lambda: index.fetch_conversation(cur, alice, bob, (first + last) // 2, None, args.limit)),
+            ('after= near end', lambda: index.fetch_conversation(cur, alice, bob, None, last - 10, args.limit)),
+            ('unread summary', lambda: (cur.execute("""
+                SELECT sender_id, COUNT(*), MAX(id) FROM messages
+                WHERE receiver_id = %s AND is_read = false GROUP BY sender_id
+            """, (alice,)), cur.fetchall())),
+        ]
+        for label, fetch in cases:
+            repeat = max(args.repeat // 20, 5) if label.startswith('legacy') else args.repeat
+            bench.report(label, bench.timed(fetch, repeat, warmup=3), {'messages': args.messages})
+            conn.rollback()
+    finally:
+        conn.rollback()
+        cur.execute("DELETE FROM messages WHERE sender_id IN (%s, %s)", (alice, bob))
+        cur.execute("DELETE FROM users WHERE id IN (%s, %s)", (alice, bob))
+        conn.commit()
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Cold start of the content function: each sample is a fresh interpreter
+that times `import index` and then the first handler() call, the two
+costs a new instance pays before answering. It runs twice. The first
+run is as deployed, with news_writes, ratings (NumPy) and admin_users
+left to routes.lazy. The second run imports those modules up front,
+inside the same timer, which is what every cold start paid before the
+route registry.
+
+Without DATABASE_URL the first request stops at the handler's
+missing-database response, so it only covers instrument and routing.
+With it, the request is a real GET ?resource=news that opens the pool.
+
+    python scripts/cold_start_bench.py --runs 20
+    DATABASE_URL=postgresql://... python scripts/cold_start_bench.py --runs 20
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+import bench
+
+CHILD = """
+import json, sys, time
+sys.path.insert(0, {path!r})
+started = time.perf_counter()
+for module in {eager!r}:
+    __import__(module)
+import index
+imported = time.perf_counter()
+response = index.handler({{'httpMethod': 'GET', 'headers': {{}},
+                          'queryStringParameters': {{'resource': 'news'}}}}, None)
+done = time.perf_counter()
+print(json.dumps({{'import_ms': (imported - started) * 1000, 'first_ms': (done - imported) * 1000,
+                  'status': response['statusCode'], 'modules': len(sys.modules)}}))
+"""
+LAZY_MODULES = ('news_writes', 'ratings', 'admin_users')
+
+
+def sample(eager: tuple) -> dict:
+    path = os.path.join(bench.ROOT, 'backend', 'content')
+    env = dict(os.environ, LOG_REQUESTS='0')
+    out = subprocess.run([sys.executable, '-c', CHILD.format(path=path, eager=eager)],
+                         env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f'first request: {"GET news" if os.environ.get("DATABASE_URL") else "no DATABASE_URL, error path"}')
+    for label, eager in (('lazy', ()), ('eager', LAZY_MODULES)):
+        samples = [sample(eager) for _ in range(args.runs)]
+        statuses = sorted({s['status'] for s in samples})
+        bench.report(f'{label}: import index', [s['import_ms'] for s in samples],
+                     {'modules': samples[-1]['modules']})
+        bench.report(f'{label}: first handler()', [s['first_ms'] for s in samples], {'status': statuses})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Repeated polling of news and the leaderboard through the content
+handler(), the way an open News page or lobby does it
+(backend/content/http_cache.py). Each resource is polled three ways:
+with the body cache invalidated before every request (a DB query and
+serialization each time, as before the cache), from the cache without
+a validator (200 with the full body), and with If-None-Match set to the
+ETag of the previous response (304 with no body). Reports p99 and the
+body bytes sent per poll and in total.
+
+    DATABASE_URL=postgresql://... python scripts/conditional_get_bench.py --polls 2000
+"""
+import argparse
+import os
+
+import psycopg2
+
+import bench
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--polls', type=int, default=2000)
+    parser.add_argument('--users', type=int, default=1000, help='ranked users to seed for the leaderboard')
+    parser.add_argument('--articles', type=int, default=200)
+    args = parser.parse_args()
+
+    dsn = bench.database_url()
+    os.environ['DATABASE_URL'] = dsn
+    os.environ.setdefault('LOG_REQUESTS', '0')
+    bench.use_backend('content')
+    import db
+    import http_cache
+    import index
+
+    tag = bench.prefix('etag')
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute("""
+        INSERT INTO users (username, email, password_hash, display_name, points)
+        SELECT %s || n, %s || n || '@example.invalid', 'x', %s || n, (random() * 100000)::int
+        FROM generate_series(1, %s) n
+        RETURNING id
+    """, (tag, tag, tag, args.users))
+    ids = [row[0] for row in cur.fetchall()]
+    cur.execute("""
+        INSERT INTO news (title, category, content, author_id)
+        SELECT %s || n, 'update', repeat('Patch notes. ', 100), %s FROM generate_series(1, %s) n
+    """, (tag, ids[0], args.articles))
+    conn.commit()
+
+    def poll(resource: str, etag=None) -> dict:
+        headers = {'If-None-Match': etag} if etag else {}
+        response = index.handler({'httpMethod': 'GET', 'headers': headers,
+                                  'queryStringParameters': {'resource': resource}}, None)
+        assert response['statusCode'] in (200, 304), response['body']
+        return response
+
+    try:
+        for resource in ('news', 'leaderboard'):
+            modes = (
+                ('uncached', lambda: (http_cache.invalidate(resource), poll(resource))[1]),
+                ('cached 200', lambda: poll(resource)),
+                ('If-None-Match 304', lambda: poll(resource, etag)),
+            )
+            for label, request in modes:
+                etag = poll(resource)['headers']['ETag']
+                sent = []
+
+                def timed_poll() -> None:
+                    sent.append(len(request()['body'].encode('utf-8')))
+
+                samples = bench.timed(timed_poll, args.polls, warmup=5)
+                bench.report(f'{resource}: {label}', samples,
+                             {'body_bytes/poll': sent[-1], 'total_kb': round(sum(sent[5:]) / 1024)})
+    finally:
+        cur.execute("DELETE FROM news WHERE author_id = %s", (ids[0],))
+        cur.execute("DELETE FROM users WHERE id = ANY(%s)", (ids,))
+        conn.commit()
+        conn.close()
+        db.get_pool(dsn).close_all()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Friend-list latency for a user with 5k accepted friends, through the
+content handler() (GET ?resource=friends), next to the OR-join query
+handle_friends ran before the symmetric edges of V0014. Background users
+with a handful of friends each keep the friends table from being
+trivially small, and half of the friends get a recent heartbeat so the
+presence join has rows to find.
+
+    DATABASE_URL=postgresql://... python scripts/friends_bench.py --friends 5000 --background 50000
+"""
+import argparse
+import os
+
+import psycopg2
+
+import bench
+
+LEGACY_QUERY = """
+    SELECT u.id, u.username, u.display_name, u.points, u.level, f.status
+    FROM friends f
+    JOIN users u ON (f.friend_id = u.id OR f.user_id = u.id)
+    WHERE (f.user_id = %s OR f.friend_id = %s) AND u.id != %s AND f.status = 'accepted'
+"""
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--friends', type=int, default=5000)
+    parser.add_argument('--background', type=int, default=50000, help='other users, 5 friends each')
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    dsn = bench.database_url()
+    os.environ['DATABASE_URL'] = dsn
+    os.environ.setdefault('LOG_REQUESTS', '0')
+    bench.use_backend('content')
+    import db
+    import index
+
+    tag = bench.prefix('friends')
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute("""
+        INSERT INTO users (username, email, password_hash, display_name)
+        SELECT %s || n, %s || n || '@example.invalid', 'x', %s || n FROM generate_series(0, %s) n
+        RETURNING id
+    """, (tag, tag, tag, args.friends + args.background))
+    ids = sorted(row[0] for row in cur.fetchall())
+    owner, friends, others = ids[0], ids[1:args.friends + 1], ids[args.friends + 1:]
+    # Accepted friendships are stored in both directions
+    cur.execute("""
+        INSERT INTO friends (user_id, friend_id, status)
+        SELECT a, b, 'accepted' FROM unnest(%s::int[]) f, LATERAL (VALUES (%s, f), (f, %s)) AS e(a, b)
+    """, (friends, owner, owner))
+    cur.execute("""
+        INSERT INTO friends (user_id, friend_id, status)
+        SELECT a, b, 'accepted'
+        FROM unnest(%s::int[]) WITH ORDINALITY AS o(id, i), generate_series(1, 5) k,
+             LATERAL (SELECT (%s::int[])[1 + (i + k) %% array_length(%s::int[], 1)] AS other) p,
+             LATERAL (VALUES (o.id, p.other), (p.other, o.id)) AS e(a, b)
+        WHERE p.other <> o.id
+        ON CONFLICT DO NOTHING
+    """, (others, others, others))
+    cur.execute("""
+        INSERT INTO user_presence (user_id, last_seen_at)
+        SELECT f, NOW() FROM unnest(%s::int[]) f WHERE f %% 2 = 0
+        ON CONFLICT (user_id) DO UPDATE SET last_seen_at = EXCLUDED.last_seen_at
+    """, (friends,))
+    conn.commit()
+    cur.execute('ANALYZE friends')
+    cur.execute('ANALYZE user_presence')
+    conn.commit()
+
+    event = {'httpMethod': 'GET', 'headers': {},
+             'queryStringParameters': {'resource': 'friends', 'user_id': str(owner)}}
+    returned = []
+
+    def current() -> None:
+        response = index.handler(dict(event), None)
+        assert response['statusCode'] == 200, response['body']
+        returned.append(len(response['body']))
+
+    def legacy() -> None:
+        cur.execute(LEGACY_QUERY, (owner, owner, owner))
+        cur.fetchall()
+
+    try:
+        bench.report(f'{args.friends} friends: OR join', bench.timed(legacy, max(args.repeat // 10, 10), warmup=2))
+        conn.rollback()
+        bench.report(f'{args.friends} friends: handler()', bench.timed(current, args.repeat, warmup=5),
+                     {'body_bytes': returned[-1]})
+    finally:
+        conn.rollback()
+        cur.execute("DELETE FROM user_presence WHERE user_id = ANY(%s)", (ids,))
+        cur.execute("DELETE FROM friends WHERE user_id = ANY(%s) OR friend_id = ANY(%s)", (ids, ids))
+        cur.execute("DELETE FROM users WHERE id = ANY(%s)", (ids,))
+        conn.commit()
+        conn.close()
+        db.get_pool(dsn).close_all()
+
+
+if __name__ == '__main__':
+    main()
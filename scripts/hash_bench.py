@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Logins/sec against bcrypt cost and hashing worker count
+(backend/auth/hashing.py). Each configuration runs a fresh executor and
+saturates it with password checks from more client threads than it has
+workers, the way a login burst does. No database needed.
+
+    python scripts/hash_bench.py --rounds 8 10 12 --workers 1 2 4 --seconds 5
+"""
+import argparse
+import os
+import threading
+import time
+from typing import List
+
+import bench
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rounds', type=int, nargs='+', default=[8, 10, 12])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, os.cpu_count() or 1])
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+
+    bench.use_backend('auth')
+    import hashing
+
+    print(f'cpus={os.cpu_count()}')
+    for rounds in args.rounds:
+        for workers in sorted(set(args.workers)):
+            hashing.BCRYPT_ROUNDS = rounds
+            hashing.HASH_WORKERS = workers
+            hashing.HASH_QUEUE_LIMIT = workers * 4
+            if hashing._executor is not None:
+                hashing._executor.shutdown()
+                hashing._executor = None
+            hashed = hashing.hash_password('correct-password')
+
+            latencies: List[float] = []
+            busy = [0]
+            lock = threading.Lock()
+            stop = time.monotonic() + args.seconds
+
+            def client() -> None:
+                while time.monotonic() < stop:
+                    started = time.perf_counter()
+                    try:
+                        hashing.check_password('correct-password', hashed)
+                    except hashing.HashingBusy:
+                        with lock:
+                            busy[0] += 1
+                        time.sleep(0.01)
+                        continue
+                    with lock:
+                        latencies.append((time.perf_counter() - started) * 1000)
+
+            clients = [threading.Thread(target=client) for _ in range(workers * 4)]
+            for thread in clients:
+                thread.start()
+            for thread in clients:
+                thread.join()
+            bench.report(f'rounds={rounds} workers={workers}', latencies, {
+                'logins/s': round(len(latencies) / args.seconds, 1), 'busy_503': busy[0]
+            })
+
+
+if __name__ == '__main__':
+    main()
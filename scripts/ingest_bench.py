@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Rows/sec for single-row against batched ingestion of chat messages and
+news posts. Chat goes through the content handler() (POST
+?resource=chat with one message, or with messages=[...]); news calls
+news_writes.handle directly, since the route sits behind the admin
+check. Each batch is one multi-row INSERT ... RETURNING in one
+transaction (backend/content/batch.py).
+
+    DATABASE_URL=postgresql://... python scripts/ingest_bench.py --rows 20000 --batch 1 10 100 1000
+"""
+import argparse
+import json
+import os
+import time
+
+import psycopg2
+
+import bench
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=20000, help='rows per run')
+    parser.add_argument('--batch', type=int, nargs='+', default=[1, 10, 100, 1000])
+    args = parser.parse_args()
+
+    dsn = bench.database_url()
+    os.environ['DATABASE_URL'] = dsn
+    os.environ.setdefault('LOG_REQUESTS', '0')
+    bench.use_backend('content')
+    import db
+    import index
+    import news_writes
+
+    tag = bench.prefix('ingest')
+    setup = psycopg2.connect(dsn)
+    cur = setup.cursor()
+    cur.execute("""
+        INSERT INTO users (username, email, password_hash, display_name)
+        SELECT %s || n, %s || n || '@example.invalid', 'x', %s || n FROM generate_series(1, 2) n
+        RETURNING id
+    """, (tag, tag, tag))
+    alice, bob = [row[0] for row in cur.fetchall()]
+    setup.commit()
+
+    def chat(size: int, n: int) -> None:
+        items = [{'sender_id': alice, 'receiver_id': bob, 'message': f'{tag}{n}_{i}'} for i in range(size)]
+        body = items[0] if size == 1 else {'messages': items}
+        response = index.handler({'httpMethod': 'POST', 'headers': {}, 'body': json.dumps(body),
+                                  'queryStringParameters': {'resource': 'chat'}}, None)
+        assert response['statusCode'] == 201, response['body']
+
+    def news(size: int, n: int) -> None:
+        items = [{'title': f'{tag}{n}_{i}', 'category': 'update', 'content': 'bench', 'author_id': alice}
+                 for i in range(size)]
+        body = items[0] if size == 1 else {'items': items}
+        with db.connection(dsn) as conn:
+            response = news_writes.handle({'body': json.dumps(body)}, 'POST', conn, {})
+        assert response['statusCode'] == 201, response['body']
+
+    try:
+        for label, send in (('chat', chat), ('news', news)):
+            for size in args.batch:
+                requests = max(args.rows // size, 1)
+                latencies = []
+                started = time.perf_counter()
+                for n in range(requests):
+                    request_started = time.perf_counter()
+                    send(size, n)
+                    latencies.append((time.perf_counter() - request_started) * 1000)
+                elapsed = time.perf_counter() - started
+                bench.report(f'{label} batch={size}', latencies, {'rows/s': round(requests * size / elapsed)})
+    finally:
+        cur.execute("DELETE FROM messages WHERE sender_id = %s", (alice,))
+        cur.execute("DELETE FROM news WHERE title LIKE %s", (tag + '%',))
+        cur.execute("DELETE FROM users WHERE id IN (%s, %s)", (alice, bob))
+        setup.commit()
+        setup.close()
+        db.get_pool(dsn).close_all()
+
+
+if __name__ == '__main__':
+    main()
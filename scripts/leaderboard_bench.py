@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Leaderboard at a million players: the in-memory engine
+(backend/content/leaderboard.py) against the SQL a request needs without
+it. The in-memory half runs on synthetic rows and needs no database.
+With --sql it also seeds the same number of users into DATABASE_URL and
+times the SQL path: the old top-50 query, rank-of-user by COUNT(*),
+OFFSET paging and a players-around-me window.
+
+    python scripts/leaderboard_bench.py --players 1000000
+    DATABASE_URL=postgresql://... python scripts/leaderboard_bench.py --players 1000000 --sql
+"""
+import argparse
+import random
+import time
+
+import bench
+
+REGIONS = ('eu', 'na', 'asia', 'sa', 'oce', None)
+
+
+def synthetic_rows(count: int, rng: random.Random):
+    for player_id in range(1, count + 1):
+        wins, losses = rng.randint(0, 500), rng.randint(0, 500)
+        yield (player_id, f'player{player_id}', f'Player {player_id}', rng.randint(0, 100000),
+               rng.randint(1, 100), wins, losses, None, rng.choice(REGIONS))
+
+
+def in_memory(args, leaderboard) -> None:
+    rng = random.Random(1)
+    board = leaderboard.Leaderboard()
+    started = time.perf_counter()
+    for row in synthetic_rows(args.players, rng):
+        board.upsert(row)
+    print(f'load {args.players} players: {time.perf_counter() - started:.1f}s')
+
+    ids = lambda: rng.randint(1, args.players)
+    deep = board.board(None)
+    deep_key = next(deep.iter_from(len(deep) // 2))
+    repeat = args.repeat
+    bench.report('memory: top 50', bench.timed(lambda: board.page(None, 50), repeat))
+    bench.report('memory: rank of user', bench.timed(lambda: board.rank_of(ids()), repeat))
+    bench.report('memory: page 50 after mid cursor', bench.timed(
+        lambda: board.page(None, 50, (-deep_key[0], deep_key[1])), repeat))
+    bench.report('memory: around user, radius 5', bench.timed(lambda: board.around(ids(), None, 5), repeat))
+    bench.report('memory: regional top 50', bench.timed(lambda: board.page('eu', 50), repeat))
+
+    def update() -> None:
+        player = board.players[ids()]
+        board.upsert((*player[:3], player[3] + rng.randint(-25, 25), *player[4:9]))
+    bench.report('memory: points update', bench.timed(update, repeat))
+
+
+def sql(args) -> None:
+    import psycopg2
+
+    dsn = bench.database_url()
+    tag = bench.prefix('lb')
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    started = time.perf_counter()
+    cur.execute("""
+        INSERT INTO users (username, email, password_hash, display_name, points, level, wins, losses, region)
+        SELECT %s || n, %s || n || '@example.invalid', 'x', %s || n, (random() * 100000)::int,
+               1 + (random() * 99)::int, (random() * 500)::int, (random() * 500)::int,
+               (ARRAY['eu', 'na', 'asia', 'sa', 'oce'])[1 + (random() * 4)::int]
+        FROM generate_series(1, %s) n
+        RETURNING id
+    """, (tag, tag, tag, args.players))
+    ids = [row[0] for row in cur.fetchall()]
+    conn.commit()
+    cur.execute('ANALYZE users')
+    conn.commit()
+    print(f'seed {args.players} users: {time.perf_counter() - started:.1f}s')
+
+    rng = random.Random(1)
+    repeat = max(args.repeat // 100, 20)
+
+    def run(query, params=None):
+        return lambda: (cur.execute(query, params() if params else None), cur.fetchall())
+
+    try:
+        bench.report('sql: top 50 (old handler)', bench.timed(run("""
+            SELECT id, username, display_name, points, level, wins, losses, avatar_url
+            FROM users WHERE is_active = true ORDER BY points DESC LIMIT 50
+        """), repeat))
+        bench.report('sql: rank of user', bench.timed(run("""
+            SELECT COUNT(*) + 1 FROM users
+            WHERE is_active = true AND points > (SELECT points FROM users WHERE id = %s)
+        """, lambda: (rng.choice(ids),)), repeat))
+        bench.report('sql: OFFSET page at the middle', bench.timed(run("""
+            SELECT id, points FROM users WHERE is_active = true
+            ORDER BY points DESC, id OFFSET %s LIMIT 50
+        """, lambda: (len(ids) // 2,)), repeat))
+        bench.report('sql: around user, radius 5', bench.timed(run("""
+            WITH ranked AS (
+                SELECT id, points, ROW_NUMBER() OVER (ORDER BY points DESC, id) AS rank
+                FROM users WHERE is_active = true
+            )
+            SELECT * FROM ranked WHERE rank BETWEEN
+                (SELECT rank FROM ranked WHERE id = %s) - 5 AND (SELECT rank FROM ranked WHERE id = %s) + 5
+        """, lambda: (lambda i: (i, i))(rng.choice(ids))), max(repeat // 4, 5)))
+    finally:
+        conn.rollback()
+        cur.execute("DELETE FROM users WHERE id = ANY(%s)", (ids,))
+        conn.commit()
+        conn.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--players', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=20000)
+    parser.add_argument('--sql', action='store_true', help='also time the SQL path against DATABASE_URL')
+    args = parser.parse_args()
+
+    bench.use_backend('content')
+    import leaderboard
+
+    in_memory(args, leaderboard)
+    if args.sql:
+        sql(args)
+
+
+if __name__ == '__main__':
+    main()
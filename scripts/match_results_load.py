@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Stand-in game servers for match result ingestion
+(backend/content/match_results.py). Each worker is one server with its
+own connection. It reports batches of finished matches between players
+from a shared pool, so concurrent batches keep touching the same users,
+and it resends some of its earlier results to exercise match_id
+idempotency. Reports sustained results/sec, batch latency and deadlocks.
+
+    DATABASE_URL=postgresql://... python scripts/match_results_load.py --servers 8 --batch 100 --duration 30
+"""
+import argparse
+import random
+import time
+from typing import Dict, List
+
+import psycopg2
+import psycopg2.errors
+
+import bench
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--servers', type=int, default=8, help='concurrent game servers')
+    parser.add_argument('--batch', type=int, default=100, help='results per request')
+    parser.add_argument('--players', type=int, default=200, help='shared player pool; smaller means more overlap')
+    parser.add_argument('--duplicates', type=float, default=0.1, help='share of results resent')
+    parser.add_argument('--duration', type=float, default=30)
+    args = parser.parse_args()
+
+    dsn = bench.database_url()
+    bench.use_backend('content')
+    import match_results
+
+    tag = bench.prefix('mrload')
+    setup = psycopg2.connect(dsn)
+    cur = setup.cursor()
+    cur.execute("""
+        INSERT INTO users (username, email, password_hash, display_name)
+        SELECT %s || n, %s || n || '@example.invalid', 'x', %s || n FROM generate_series(1, %s) n
+        RETURNING id
+    """, (tag, tag, tag, args.players))
+    players = [row[0] for row in cur.fetchall()]
+    setup.commit()
+
+    def server(index: int) -> Dict[str, object]:
+        conn = psycopg2.connect(dsn)
+        rng = random.Random(index)
+        sent: List[dict] = []
+        latencies: List[float] = []
+        recorded = duplicates = deadlocks = 0
+        stop = time.monotonic() + args.duration
+        n = 0
+        while time.monotonic() < stop:
+            batch = []
+            for _ in range(args.batch):
+                if sent and rng.random() < args.duplicates:
+                    batch.append(rng.choice(sent))
+                    continue
+                n += 1
+                p1, p2 = rng.sample(players, 2)
+                item = {'match_id': f'{tag}{index}_{n}', 'player1_id': p1, 'player2_id': p2,
+                        'winner_id': rng.choice((p1, p2)), 'player1_score': rng.randint(0, 16),
+                        'player2_score': rng.randint(0, 16), 'duration_seconds': rng.randint(300, 2400),
+                        'stats': {'kills': rng.randint(0, 40), 'deaths': rng.randint(0, 40)}}
+                sent.append(item)
+                batch.append(item)
+            started = time.perf_counter()
+            try:
+                result = match_results.ingest(conn, batch)
+            except psycopg2.errors.DeadlockDetected:
+                conn.rollback()
+                deadlocks += 1
+                continue
+            latencies.append((time.perf_counter() - started) * 1000)
+            recorded += result['recorded']
+            duplicates += result['duplicates']
+        conn.close()
+        return {'latencies': latencies, 'recorded': recorded, 'duplicates': duplicates, 'deadlocks': deadlocks}
+
+    started = time.monotonic()
+    try:
+        results = bench.concurrently(args.servers, server)
+    finally:
+        elapsed = time.monotonic() - started
+        cur.execute("DELETE FROM matches WHERE match_id LIKE %s", (tag + '%',))
+        cur.execute("DELETE FROM users WHERE id = ANY(%s)", (players,))
+        setup.commit()
+        setup.close()
+
+    recorded = sum(r['recorded'] for r in results)
+    bench.report(f'ingest batch of {args.batch}', [v for r in results for v in r['latencies']], {
+        'results/s': round(recorded / elapsed),
+        'recorded': recorded,
+        'duplicates': sum(r['duplicates'] for r in results),
+        'deadlocks': sum(r['deadlocks'] for r in results),
+    })
+
+
+if __name__ == '__main__':
+    main()
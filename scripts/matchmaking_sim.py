@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Matchmaking simulation with 10k queued players
+(backend/content/matchmaking.py). Reports matches/sec and median wait.
+
+The default run needs no database. It drives QueueIndex on a simulated
+clock: every tick each waiting player takes its best candidate, new
+players arrive to keep the queue at --players, and wait time is
+simulated seconds in queue. matches/s is how fast the index pairs them
+on this machine.
+
+With --db it runs the real path against DATABASE_URL. It seeds users,
+queues them with matchmaking.join, and has --workers threads call
+try_match (SKIP LOCKED claims) until the queue drains. Wait is
+wall-clock seconds from join to match.
+
+    python scripts/matchmaking_sim.py --players 10000 --seconds 30
+    DATABASE_URL=postgresql://... python scripts/matchmaking_sim.py --db --players 10000 --workers 8
+"""
+import argparse
+import random
+import statistics
+import threading
+import time
+from typing import Dict, List
+
+import bench
+
+GAME_MODES = ('1v1', '2v2', '5v5')
+
+
+def rating(rng: random.Random) -> int:
+    return int(min(max(rng.gauss(1500, 300), 0), 3000))
+
+
+def simulate(args, matchmaking) -> None:
+    rng = random.Random(1)
+    index = matchmaking.QueueIndex()
+    next_id = 0
+    clock = 0.0
+
+    def arrive() -> None:
+        nonlocal next_id
+        next_id += 1
+        index.add(next_id, rng.choice(GAME_MODES), rating(rng), clock)
+
+    for _ in range(args.players):
+        arrive()
+
+    waits: List[float] = []
+    gaps: List[int] = []
+    busy = 0.0
+    while clock < args.seconds:
+        started = time.perf_counter()
+        for user_id in rng.sample(list(index.entries), len(index.entries)):
+            entry = index.entries.get(user_id)
+            if entry is None:
+                continue
+            other_id = next(index.candidates(user_id, clock), None)
+            if other_id is None:
+                continue
+            other = index.entries[other_id]
+            waits += [clock - entry[2], clock - other[2]]
+            gaps.append(abs(entry[1] - other[1]))
+            index.remove(user_id)
+            index.remove(other_id)
+        while len(index.entries) < args.players:
+            arrive()
+        busy += time.perf_counter() - started
+        clock += args.tick
+
+    waits.sort()
+    print(f'simulated {args.seconds:.0f}s, tick {args.tick}s, {args.players} queued')
+    print(f'matches={len(gaps)} matches/s={len(gaps) / busy:,.0f} (index cpu time {busy:.2f}s) '
+          f'simulated matches/s={len(gaps) / args.seconds:,.0f}')
+    print(f'wait p50={bench.percentile(waits, 50):.1f}s p99={bench.percentile(waits, 99):.1f}s '
+          f'rating gap median={statistics.median(gaps) if gaps else 0}')
+
+
+def run_db(args, matchmaking) -> None:
+    import psycopg2
+
+    dsn = bench.database_url()
+    tag = bench.prefix('mm')
+    rng = random.Random(1)
+    setup = psycopg2.connect(dsn)
+    cur = setup.cursor()
+    cur.execute("""
+        INSERT INTO users (username, email, password_hash, display_name)
+        SELECT %s || n, %s || n || '@example.invalid', 'x', %s || n FROM generate_series(1, %s) n
+        RETURNING id
+    """, (tag, tag, tag, args.players))
+    ids = [row[0] for row in cur.fetchall()]
+    cur.execute("UPDATE users SET rating = r FROM unnest(%s::int[], %s::int[]) AS v(id, r) WHERE users.id = v.id",
+                (ids, [rating(rng) for _ in ids]))
+    setup.commit()
+
+    joined: Dict[int, float] = {}
+    for user_id in ids:
+        matchmaking.join(setup, user_id, rng.choice(GAME_MODES))
+        joined[user_id] = time.monotonic()
+    matchmaking._index.refresh(setup, force=True)
+
+    waits: List[float] = []
+    matched = set()
+    lock = threading.Lock()
+    queued = list(ids)
+    stop = time.monotonic() + args.seconds
+
+    def worker(i: int) -> int:
+        conn = psycopg2.connect(dsn)
+        local = random.Random(i)
+        count = misses = 0
+        while time.monotonic() < stop and misses < 200:
+            user_id = local.choice(queued)
+            if user_id in matched:
+                misses += 1
+                continue
+            match = matchmaking.try_match(conn, user_id)
+            if match is None:
+                misses += 1
+                continue
+            misses = 0
+            now = time.monotonic()
+            with lock:
+                for player in (match[4], match[5]):
+                    matched.add(player)
+                    waits.append(now - joined[player])
+            count += 1
+        conn.close()
+        return count
+
+    started = time.monotonic()
+    try:
+        counts = bench.concurrently(args.workers, worker)
+    finally:
+        elapsed = time.monotonic() - started
+        cur.execute("DELETE FROM matches WHERE player1_id = ANY(%s) OR player2_id = ANY(%s)", (ids, ids))
+        cur.execute("DELETE FROM matchmaking_queue WHERE user_id = ANY(%s)", (ids,))
+        cur.execute("DELETE FROM users WHERE id = ANY(%s)", (ids,))
+        setup.commit()
+        setup.close()
+
+    waits.sort()
+    total = sum(counts)
+    print(f'{args.players} queued, {args.workers} workers: matches={total} matches/s={total / elapsed:,.0f} '
+          f'unmatched={args.players - len(matched)} duplicate_claims={len(waits) - len(matched)}')
+    print(f'wait p50={bench.percentile(waits, 50):.2f}s p99={bench.percentile(waits, 99):.2f}s')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--players', type=int, default=10000)
+    parser.add_argument('--seconds', type=float, default=30, help='simulated seconds, or the wall-clock cap with --db')
+    parser.add_argument('--tick', type=float, default=1.0, help='simulated seconds between matching passes')
+    parser.add_argument('--db', action='store_true', help='run try_match against DATABASE_URL')
+    parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args()
+
+    bench.use_backend('content')
+    import matchmaking
+
+    if args.db:
+        run_db(args, matchmaking)
+    else:
+        simulate(args, matchmaking)
+
+
+if __name__ == '__main__':
+    main()
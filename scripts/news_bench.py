@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+News feed payload and latency at 100k articles (backend/content/index.py
+handle_news). Full pages and summary=1 pages are timed at the newest end,
+at a shallow cursor and at a deep cursor from X-Next-Cursor, and with a
+category filter. The old unpaged query (latest 50 with every body and
+the author join) is timed first for comparison. Articles get ~2 KB
+bodies so the difference in bytes shows. Seeding is done in SQL; the
+rows are deleted afterwards.
+
+    DATABASE_URL=postgresql://... python scripts/news_bench.py --articles 100000 --repeat 200
+"""
+import argparse
+
+import psycopg2
+
+import bench
+
+LEGACY_QUERY = """
+    SELECT n.*, u.username, u.display_name
+    FROM news n
+    LEFT JOIN users u ON n.author_id = u.id
+    ORDER BY n.created_at DESC LIMIT 50
+"""
+CATEGORIES = ('update', 'tournament', 'event', 'patch')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--articles', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    dsn = bench.database_url()
+    bench.use_backend('content')
+    import index
+    import serialize
+
+    tag = bench.prefix('news')
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    cur.execute("""
+        INSERT INTO users (username, email, password_hash, display_name)
+        VALUES (%s, %s || '@example.invalid', 'x', %s) RETURNING id
+    """, (tag, tag, tag))
+    author = cur.fetchone()[0]
+    cur.execute("""
+        INSERT INTO news (title, category, content, author_id, created_at)
+        SELECT %s || n, (%s::text[])[1 + n %% 4], repeat('Patch notes and tournament results. ', 60) || n,
+               %s, NOW() - n * INTERVAL '1 minute'
+        FROM generate_series(1, %s) n
+    """, (tag, list(CATEGORIES), author, args.articles))
+    conn.commit()
+    cur.execute('ANALYZE news')
+    conn.commit()
+
+    def cursor_at(n: int) -> str:
+        cur.execute("SELECT created_at, id FROM news WHERE title = %s", (f'{tag}{n}',))
+        return serialize.cursor(*cur.fetchone())
+
+    shallow, deep = cursor_at(index.NEWS_PAGE * 2), cursor_at(args.articles * 9 // 10)
+    conn.rollback()
+
+    def page(**params) -> dict:
+        event = {'httpMethod': 'GET', 'queryStringParameters': {'resource': 'news', **params}}
+        response = index.handle_news(event, 'GET', conn, {})
+        assert response['statusCode'] == 200, response['body']
+        return response
+
+    try:
+        bench.report('legacy latest 50', bench.timed(lambda: (cur.execute(LEGACY_QUERY), cur.fetchall()),
+                                                     args.repeat, warmup=3))
+        conn.rollback()
+        for mode, extra in (('full', {}), ('summary', {'summary': '1'})):
+            for position, params in (('latest', {}), ('shallow', {'after': shallow}), ('deep', {'after': deep}),
+                                     ('category', {'category': 'patch'})):
+                body_bytes = len(page(**extra, **params)['body'].encode('utf-8'))
+                bench.report(f'{mode} {position}', bench.timed(lambda: page(**extra, **params), args.repeat, warmup=3),
+                             {'body_bytes': body_bytes})
+                conn.rollback()
+    finally:
+        conn.rollback()
+        cur.execute("DELETE FROM news WHERE author_id = %s", (author,))
+        cur.execute("DELETE FROM users WHERE id = %s", (author,))
+        conn.commit()
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
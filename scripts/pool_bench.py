@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+p50/p99 of the content handler() with the warm-container connection pool
+(backend/content/db.py) and without it. The unpooled run sets the pool's
+idle timeout to zero, so every request opens and closes its own
+connection as the handlers did before the pool. http_cache is switched
+off for both runs so each request reaches the database.
+
+    DATABASE_URL=postgresql://... python scripts/pool_bench.py --requests 2000 --concurrency 4
+    DATABASE_URL=... python scripts/pool_bench.py --query resource=tournaments --query resource=news
+"""
+import argparse
+import os
+from typing import Dict, List
+
+import bench
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000, help='requests per run and query')
+    parser.add_argument('--concurrency', type=int, default=4, help='client threads; keep at or below DB_POOL_MAX_SIZE')
+    parser.add_argument('--query', action='append', help='query string of a GET, e.g. resource=leaderboard')
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = bench.database_url()
+    os.environ.setdefault('LOG_REQUESTS', '0')
+    bench.use_backend('content')
+    import db
+    import http_cache
+    import index
+
+    http_cache.POLICIES.clear()
+    pool = db.get_pool(os.environ['DATABASE_URL'])
+    pooled_idle_timeout = pool.idle_timeout
+
+    for query in args.query or ['resource=leaderboard', 'resource=tournaments']:
+        params = dict(pair.split('=', 1) for pair in query.split('&'))
+        event = {'httpMethod': 'GET', 'queryStringParameters': params, 'headers': {}}
+        for label, idle_timeout in (('no pool', 0.0), ('pool', pooled_idle_timeout)):
+            pool.idle_timeout = idle_timeout
+            pool.close_all()
+            statuses: Dict[int, int] = {}
+            per_worker = max(args.requests // args.concurrency, 1)
+
+            def count(response: Dict) -> None:
+                statuses[response['statusCode']] = statuses.get(response['statusCode'], 0) + 1
+
+            def client(_: int) -> List[float]:
+                return bench.timed(lambda: count(index.handler(dict(event), None)), per_worker, warmup=5)
+
+            results = bench.concurrently(args.concurrency, client)
+            bench.report(f'{query} [{label}]', [v for r in results for v in r], {'status': statuses})
+    pool.close_all()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Glicko-2 rating throughput (backend/content/ratings.py). First checks
+rate_matches against the worked example in Glickman's "Example of the
+Glicko-2 system": a 1500/200/0.06 player beats a 1400/30 player, then
+loses to 1550/100 and 1700/300. The result should be 1464.06 / 151.52 /
+0.05999 with tau = 0.5, give or take the paper's rounding of its
+intermediate steps. It then times one rating period of --matches
+synthetic results between --players players, both through rate_matches
+(dicts in, dicts out) and through glicko2_period on prebuilt arrays, to
+show how much of the cost is the Python-side conversion. No database
+needed.
+
+    python scripts/ratings_bench.py --matches 1000000 --players 100000
+"""
+import argparse
+import random
+import sys
+
+import bench
+
+EXPECTED = (1464.06, 151.52, 0.05999)
+
+
+def check_reference(ratings) -> bool:
+    players = {1: (1500.0, 200.0, 0.06), 2: (1400.0, 30.0, 0.06), 3: (1550.0, 100.0, 0.06), 4: (1700.0, 300.0, 0.06)}
+    matches = [(1, 2, 1), (1, 3, 3), (1, 4, 4)]
+    rating, deviation, volatility = ratings.rate_matches(players, matches)[1]
+    ok = (abs(rating - EXPECTED[0]) < 0.02 and abs(deviation - EXPECTED[1]) < 0.02
+          and abs(volatility - EXPECTED[2]) < 0.00001)
+    print(f'{"OK" if ok else "FAILED"}: Glickman example gives {rating:.3f} / {deviation:.3f} / {volatility:.6f} '
+          f'(expected {EXPECTED[0]} / {EXPECTED[1]} / {EXPECTED[2]})')
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--matches', type=int, default=1000000)
+    parser.add_argument('--players', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    bench.use_backend('content')
+    import numpy as np
+    import ratings
+
+    if ratings.TAU != 0.5:
+        sys.exit('unset RATING_TAU: the reference example uses tau = 0.5')
+    ok = check_reference(ratings)
+
+    rng = random.Random(1)
+    players = {user_id: (min(max(rng.gauss(1500, 300), 100), 3000), rng.uniform(50, 350), 0.06)
+               for user_id in range(1, args.players + 1)}
+    matches = []
+    for _ in range(args.matches):
+        a, b = rng.sample(range(1, args.players + 1), 2)
+        matches.append((a, b, rng.choice((a, b, a, b, None))))
+
+    bench.report(f'rate_matches x{args.matches}', bench.timed(lambda: ratings.rate_matches(players, matches), args.repeat),
+                 {'players': args.players})
+
+    state = np.array(list(players.values()))
+    p1 = np.array([m[0] - 1 for m in matches])
+    p2 = np.array([m[1] - 1 for m in matches])
+    s1 = np.array([1.0 if m[2] == m[0] else 0.0 if m[2] == m[1] else 0.5 for m in matches])
+    mu = (state[:, 0] - ratings.DEFAULT_RATING) / ratings.GLICKO_SCALE
+    phi = state[:, 1] / ratings.GLICKO_SCALE
+    player, opponent, score = np.concatenate([p1, p2]), np.concatenate([p2, p1]), np.concatenate([s1, 1.0 - s1])
+    samples = bench.timed(lambda: ratings.glicko2_period(mu, phi, state[:, 2], player, opponent, score), args.repeat)
+    bench.report(f'glicko2_period x{args.matches}', samples, {'matches/s': f'{args.matches / (samples[0] / 1000):,.0f}'})
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Burst registration for a capacity-limited tournament
+(backend/content/brackets.py register). 10k users register for a
+64-slot tournament within one second, spread over --connections
+threads with their own connections. Exits non-zero unless exactly 64
+seats were taken: 64 responses of 201, the rest 202 (waitlisted),
+participants_count = 64 and 64 non-waitlisted participant rows.
+
+    DATABASE_URL=postgresql://... python scripts/registration_burst.py --users 10000 --slots 64 --connections 32
+"""
+import argparse
+import sys
+import time
+from collections import Counter
+from typing import List
+
+import psycopg2
+
+import bench
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--slots', type=int, default=64)
+    parser.add_argument('--connections', type=int, default=32)
+    parser.add_argument('--window', type=float, default=1.0, help='seconds the registrations are spread over')
+    args = parser.parse_args()
+
+    dsn = bench.database_url()
+    bench.use_backend('content')
+    import brackets
+
+    tag = bench.prefix('burst')
+    setup = psycopg2.connect(dsn)
+    cur = setup.cursor()
+    cur.execute("""
+        INSERT INTO users (username, email, password_hash, display_name)
+        SELECT %s || n, %s || n || '@example.invalid', 'x', %s || n FROM generate_series(1, %s) n
+        RETURNING id
+    """, (tag, tag, tag, args.users))
+    ids = [row[0] for row in cur.fetchall()]
+    cur.execute("""
+        INSERT INTO tournaments (tournament_id, name, game_mode, status, max_participants)
+        VALUES (%s, %s, '5v5', 'registration', %s)
+        RETURNING id
+    """, (tag + 't', tag + 'tournament', args.slots))
+    tournament_id = cur.fetchone()[0]
+    setup.commit()
+
+    connections = [psycopg2.connect(dsn) for _ in range(args.connections)]
+    start_at = time.monotonic() + 0.5
+
+    def worker(i: int) -> List[tuple]:
+        conn = connections[i]
+        mine = ids[i::args.connections]
+        results = []
+        for n, user_id in enumerate(mine):
+            # Pace each thread so the whole burst lands inside the window
+            delay = start_at + args.window * n / max(len(mine), 1) - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            started = time.perf_counter()
+            status, _ = brackets.register(conn, tournament_id, user_id)
+            results.append((status, (time.perf_counter() - started) * 1000))
+        return results
+
+    try:
+        results = [r for rs in bench.concurrently(args.connections, worker) for r in rs]
+        elapsed = time.monotonic() - start_at
+        cur.execute("SELECT participants_count FROM tournaments WHERE id = %s", (tournament_id,))
+        counter = cur.fetchone()[0]
+        cur.execute("""
+            SELECT COUNT(*) FILTER (WHERE NOT waitlisted), COUNT(*) FILTER (WHERE waitlisted)
+            FROM tournament_participants WHERE tournament_id = %s
+        """, (tournament_id,))
+        seated, waitlisted = cur.fetchone()
+        setup.rollback()
+    finally:
+        for conn in connections:
+            conn.close()
+        cur.execute("DELETE FROM tournament_participants WHERE tournament_id = %s", (tournament_id,))
+        cur.execute("DELETE FROM tournaments WHERE id = %s", (tournament_id,))
+        cur.execute("DELETE FROM users WHERE id = ANY(%s)", (ids,))
+        setup.commit()
+        setup.close()
+
+    statuses = Counter(status for status, _ in results)
+    bench.report(f'register x{args.users} for {args.slots} slots', [ms for _, ms in results], {
+        'elapsed_s': round(elapsed, 2), 'status': dict(statuses),
+        'participants_count': counter, 'seated_rows': seated, 'waitlisted_rows': waitlisted,
+    })
+    ok = (statuses[201] == args.slots and statuses[202] == args.users - args.slots
+          and counter == seated == args.slots and waitlisted == args.users - args.slots)
+    print(f'OK: exactly {args.slots} registrations took a seat' if ok else 'FAILED: capacity was not enforced')
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Aggregates the JSON-lines request logs written by backend/*/instrument.py
+into per-resource latency percentiles and the slowest query shapes.
+
+    python scripts/request_report.py logs/*.jsonl
+    cat exported-logs.txt | python scripts/request_report.py --top 20
+"""
+import argparse
+import fileinput
+import json
+import math
+from collections import defaultdict
+from typing import Dict, List, Sequence, Tuple
+
+
+def percentile(sorted_values: Sequence[float], p: float) -> float:
+    """Nearest-rank percentile of an already sorted sequence."""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(p / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('files', nargs='*', help='JSON-lines log files (default: stdin)')
+    parser.add_argument('--top', type=int, default=10, help='slow query shapes to list')
+    args = parser.parse_args()
+
+    latency: Dict[Tuple[str, str, str], List[float]] = defaultdict(list)
+    db_time: Dict[Tuple[str, str, str], float] = defaultdict(float)
+    round_trips: Dict[Tuple[str, str, str], int] = defaultdict(int)
+    errors: Dict[Tuple[str, str, str], int] = defaultdict(int)
+    slow: Dict[str, List[float]] = defaultdict(list)
+
+    for raw in fileinput.input(args.files or ('-',)):
+        # Log collectors often prefix lines; the record starts at the first brace
+        start = raw.find('{')
+        if start < 0:
+            continue
+        try:
+            line = json.loads(raw[start:])
+        except ValueError:
+            continue
+        if line.get('type') == 'slow_query':
+            slow[line.get('sql', '')].append(line.get('ms', 0.0))
+        elif line.get('type') == 'request':
+            key = (line.get('function', '-'), line.get('resource', '-'), line.get('method', '-'))
+            latency[key].append(line.get('ms', 0.0))
+            db_time[key] += line.get('db_ms', 0.0)
+            round_trips[key] += line.get('round_trips', 0)
+            if (line.get('status') or 0) >= 500:
+                errors[key] += 1
+
+    header = f"{'function':10} {'resource':16} {'method':6} {'count':>7} {'p50':>8} {'p90':>8} {'p99':>8} " \
+             f"{'max':>8} {'db avg':>8} {'trips':>6} {'5xx':>5}"
+    print(header)
+    print('-' * len(header))
+    for key in sorted(latency, key=lambda k: -len(latency[k])):
+        values = sorted(latency[key])
+        count = len(values)
+        function, resource, method = key
+        print(f'{function:10} {resource:16} {method:6} {count:7d} {percentile(values, 50):8.1f} '
+              f'{percentile(values, 90):8.1f} {percentile(values, 99):8.1f} {values[-1]:8.1f} '
+              f'{db_time[key] / count:8.1f} {round_trips[key] / count:6.1f} {errors[key]:5d}')
+
+    if slow:
+        print(f'\nSlowest query shapes (>= SLOW_QUERY_MS), top {args.top} by total time:')
+        for sql, times in sorted(slow.items(), key=lambda item: -sum(item[1]))[:args.top]:
+            times.sort()
+            print(f'  {len(times):5d}x  p50 {percentile(times, 50):8.1f} ms  max {times[-1]:8.1f} ms  {sql[:120]}')
+
+
+if __name__ == '__main__':
+    main()
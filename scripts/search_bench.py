@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+User search latency at 100k and 1M users (backend/content/index.py
+search_users). Each size is timed three ways: the old unranked ILIKE
+query with index scans turned off for the transaction (the table as it
+was before the pg_trgm migration), the ranked search with its indexes
+and the query cache cleared, and the same search with repeated
+prefixes served from the cache.
+
+    DATABASE_URL=postgresql://... python scripts/search_bench.py --sizes 100000 1000000
+"""
+import argparse
+import random
+
+import psycopg2
+
+import bench
+
+LEGACY_QUERY = """
+    SELECT id, username, display_name, points, level
+    FROM users WHERE (username ILIKE %s OR display_name ILIKE %s) AND is_active = true LIMIT 20
+"""
+WORDS = ('shadow', 'wolf', 'sniper', 'ghost', 'nova', 'raven', 'blaze', 'viper', 'storm', 'frost')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=300)
+    args = parser.parse_args()
+
+    dsn = bench.database_url()
+    bench.use_backend('content')
+    import index
+
+    tag = bench.prefix('search')
+    conn = psycopg2.connect(dsn)
+    cur = conn.cursor()
+    rng = random.Random(1)
+    # Keystroke-style queries: short prefixes, word prefixes, longer substrings
+    queries = ['s', 'sh', 'sha', 'wolf', 'ghost7', 'nova1', 'raven', 'blaze42', 'vip', 'frost9']
+    seeded = 0
+
+    try:
+        for size in sorted(args.sizes):
+            cur.execute("""
+                INSERT INTO users (username, email, password_hash, display_name, points)
+                SELECT (%s::text[])[1 + n %% 10] || n || '_' || %s, %s || n || '@example.invalid', 'x',
+                       initcap((%s::text[])[1 + (n / 10) %% 10]) || ' ' || substr(md5(n::text), 1, 6),
+                       (random() * 100000)::int
+                FROM generate_series(%s, %s) n
+            """, (list(WORDS), tag.split('_')[1], tag, list(WORDS), seeded + 1, size))
+            seeded = size
+            conn.commit()
+            cur.execute('ANALYZE users')
+            conn.commit()
+
+            pick = lambda: rng.choice(queries)
+
+            def legacy() -> None:
+                q = pick()
+                cur.execute(LEGACY_QUERY, (f'%{q}%', f'%{q}%'))
+                cur.fetchall()
+
+            def ranked() -> None:
+                index._search_cache.clear()
+                index.search_users(cur, pick())
+
+            cur.execute('SET enable_indexscan = off')
+            cur.execute('SET enable_bitmapscan = off')
+            bench.report(f'{size} users: ILIKE, no index', bench.timed(legacy, max(args.repeat // 10, 10), warmup=2))
+            conn.rollback()
+            bench.report(f'{size} users: ranked, trigram', bench.timed(ranked, args.repeat, warmup=5))
+            conn.rollback()
+            bench.report(f'{size} users: ranked, cached', bench.timed(lambda: index.search_users(cur, pick()), args.repeat))
+            conn.rollback()
+    finally:
+        conn.rollback()
+        cur.execute("DELETE FROM users WHERE email LIKE %s", (tag + '%',))
+        conn.commit()
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Response serialization cost (backend/content/serialize.py) for the two
+row shapes the content handler emits: flat tournament rows
+(TOURNAMENT_COLUMNS, with a hidden sort key) and challenge rows with
+nested creator/opponent objects (CHALLENGE_COLUMNS). Each is timed as
+Columns.all + serialize.dumps against per-row hand-built dicts with
+isoformat() and json.dumps, which is how the handlers built bodies
+before. Rows are synthetic tuples in SELECT order, so no database is
+needed.
+
+    python scripts/serialize_bench.py --rows 1000 10000
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+
+import bench
+
+
+def tournament_rows(n: int, rng: random.Random) -> list:
+    start = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+    return [(i, f'Cup {i}', rng.choice(('upcoming', 'registration', 'active')), rng.randrange(100000), 64,
+             start + datetime.timedelta(hours=i), 'single-elimination', rng.randrange(65), start)
+            for i in range(n)]
+
+
+def challenge_rows(n: int, rng: random.Random) -> list:
+    created = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+    rows = []
+    for i in range(n):
+        opponent = rng.randrange(1, 100000) if i % 3 else None
+        rows.append((i, i + 7, f'user{i + 7}', f'User {i + 7}',
+                     opponent, opponent and f'user{opponent}', opponent and f'User {opponent}',
+                     '1v1', rng.randrange(10, 1000), 'open' if opponent is None else 'accepted', 0, None,
+                     created + datetime.timedelta(seconds=i)))
+    return rows
+
+
+def tournaments_by_hand(rows: list) -> str:
+    return json.dumps([{
+        'id': r[0], 'name': r[1], 'status': r[2], 'prize_pool': r[3], 'max_participants': r[4],
+        'start_date': r[5].isoformat() if r[5] else None, 'format': r[6], 'participants_count': r[7]
+    } for r in rows])
+
+
+def challenges_by_hand(rows: list) -> str:
+    return json.dumps([{
+        'id': r[0],
+        'creator': {'id': r[1], 'username': r[2], 'displayName': r[3]},
+        'opponent': {'id': r[4], 'username': r[5], 'displayName': r[6]} if r[4] else None,
+        'game_mode': r[7], 'stake': r[8], 'status': r[9], 'reward': r[10], 'winner_id': r[11],
+        'created_at': r[12].isoformat() if r[12] else None
+    } for r in rows])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    os.environ.setdefault('LOG_REQUESTS', '0')
+    bench.use_backend('content')
+    import index
+    import serialize
+
+    print(f'serialize.dumps backend: {"orjson" if serialize.orjson else "json"}')
+    rng = random.Random(1)
+    shapes = (
+        ('tournaments', tournament_rows, index.TOURNAMENT_COLUMNS, tournaments_by_hand),
+        ('challenges', challenge_rows, index.CHALLENGE_COLUMNS, challenges_by_hand),
+    )
+    for size in args.rows:
+        for label, make, columns, by_hand in shapes:
+            rows = make(size, rng)
+            assert json.loads(serialize.dumps(columns.all(rows))) == json.loads(by_hand(rows)), label
+            body = serialize.dumps(columns.all(rows))
+            bench.report(f'{label} x{size}: by hand', bench.timed(lambda: by_hand(rows), args.repeat, warmup=2))
+            bench.report(f'{label} x{size}: Columns + dumps',
+                         bench.timed(lambda: serialize.dumps(columns.all(rows)), args.repeat, warmup=2),
+                         {'body_bytes': len(body)})
+
+
+if __name__ == '__main__':
+    main()
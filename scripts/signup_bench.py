@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Database cost of a signup (backend/auth/index.py register_user): the old
+duplicate-check SELECT followed by an f-string INSERT, against the
+prepared auth_register statement (INSERT ... ON CONFLICT DO NOTHING
+RETURNING, plus auth_register_conflict only when a row already exists).
+Both run on the auth pool's instrumented connections inside an
+instrument request, so round trips are counted the way the request log
+counts them. The password hash is computed once up front; bcrypt costs
+the same on both paths and is measured by hash_bench.py.
+
+    DATABASE_URL=postgresql://... python scripts/signup_bench.py --signups 5000
+"""
+import argparse
+import os
+import time
+
+import bench
+
+LEGACY_SELECT = "SELECT id FROM users WHERE username = '{username}' OR email = '{email}'"
+LEGACY_INSERT = """
+    INSERT INTO users (username, email, password_hash, display_name, region, age, show_age, points, level)
+    VALUES ('{username}', '{email}', '{password_hash}', '{display_name}', '{region}', {age}, true, 100, 1)
+    RETURNING id, username, email, display_name, region, age, show_age, points, level, created_at, is_admin
+"""
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--signups', type=int, default=5000, help='new users per path')
+    args = parser.parse_args()
+
+    dsn = bench.database_url()
+    os.environ.setdefault('LOG_REQUESTS', '0')
+    bench.use_backend('auth')
+    import index
+    import instrument
+
+    # Importing index registers the auth_* prepared statements
+    db = index.db
+
+    tag = bench.prefix('signup')
+    password_hash = index.hashing.hash_password('bench-password')
+
+    def legacy(cur, username: str, email: str) -> None:
+        values = {'username': username.replace("'", "''"), 'email': email.replace("'", "''")}
+        cur.execute(LEGACY_SELECT.format(**values))
+        if cur.fetchone():
+            return
+        cur.execute(LEGACY_INSERT.format(password_hash=password_hash.replace("'", "''"), display_name=values['username'],
+                                         region='EU', age=30, **values))
+        cur.fetchone()
+
+    def prepared(cur, username: str, email: str) -> None:
+        db.execute(cur, 'auth_register', (username, email, password_hash, username, 'EU', 30))
+        if cur.fetchone() is None:
+            db.execute(cur, 'auth_register_conflict', (username, email, username, email))
+            cur.fetchone()
+
+    def run(label: str, signup, names) -> None:
+        latencies = []
+        with db.connection(dsn) as conn:
+            conn.autocommit = True
+            cur = conn.cursor()
+            request = instrument.begin(None, 'auth', 'register', 'POST')
+            for username, email in names:
+                started = time.perf_counter()
+                signup(cur, username, email)
+                latencies.append((time.perf_counter() - started) * 1000)
+            instrument.finish(request, {'statusCode': 200})
+            cur.close()
+        bench.report(label, latencies, {'round_trips/signup': f'{request.round_trips / len(names):.3f}'})
+
+    try:
+        for label, signup in (('SELECT + INSERT', legacy), ('prepared auth_register', prepared)):
+            key = tag + label.split()[0].lower()[:4]
+            names = [(f'{key}{n}', f'{key}{n}@example.invalid') for n in range(args.signups)]
+            run(f'{label}: new user', signup, names)
+            run(f'{label}: taken', signup, names[:max(args.signups // 10, 1)])
+    finally:
+        with db.connection(dsn) as conn:
+            cur = conn.cursor()
+            cur.execute("DELETE FROM users WHERE email LIKE %s", (tag + '%',))
+            conn.commit()
+        db.get_pool(dsn).close_all()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark for session tokens (backend/content/tokens.py): cost of
+issue() and of verify() as run by the content dispatch on every
+authenticated request, with a revocation set of realistic size. No
+database needed.
+
+    python scripts/token_bench.py --iterations 100000 --revoked 10000
+"""
+import argparse
+import os
+import secrets
+
+import bench
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=100000)
+    parser.add_argument('--revoked', type=int, default=10000, help='size of the cached revocation set')
+    args = parser.parse_args()
+
+    os.environ.setdefault('SESSION_KEYS', 'bench:' + secrets.token_hex(32) + ',old:' + secrets.token_hex(32))
+    bench.use_backend('content')
+    import tokens
+
+    tokens._revoked = {secrets.token_urlsafe(12) for _ in range(args.revoked)}
+    token = tokens.issue(42)['token']
+    forged = token[:-2] + ('AA' if not token.endswith('AA') else 'BB')
+
+    def rejected() -> None:
+        try:
+            tokens.verify(forged)
+        except tokens.TokenError:
+            pass
+
+    bench.report('issue', bench.timed(lambda: tokens.issue(42), args.iterations, warmup=1000))
+    bench.report('verify (valid)', bench.timed(lambda: tokens.verify(token), args.iterations, warmup=1000))
+    bench.report('verify (bad signature)', bench.timed(rejected, args.iterations, warmup=1000))
+    bench.report('bearer_token + verify', bench.timed(
+        lambda: tokens.verify(tokens.bearer_token({'headers': {'Authorization': f'Bearer {token}'}})),
+        args.iterations, warmup=1000))
+
+
+if __name__ == '__main__':
+    main()
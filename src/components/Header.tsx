@@ -36,7 +36,11 @@ export default function Header() {
   useEffect(() => {
     if (isAuthenticated && user) {
       loadFriendRequestsCount();
-      const interval = setInterval(loadFriendRequestsCount, 30000);
+      sendHeartbeat();
+      const interval = setInterval(() => {
+        loadFriendRequestsCount();
+        sendHeartbeat();
+      }, 30000);
       return () => clearInterval(interval);
     }
   }, [isAuthenticated, user]);
@@ -55,6 +59,20 @@ export default function Header() {
     }
   };
 
+  const sendHeartbeat = async () => {
+    if (!user) return;
+
+    try {
+      await fetch(`${funcUrls.content}?resource=presence`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ user_id: user.id })
+      });
+    } catch (error) {
+      console.error('Failed to send presence heartbeat:', error);
+    }
+  };
+
   const isActive = (path: string) => location.pathname === path;
 
   return (
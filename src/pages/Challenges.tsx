@@ -62,7 +62,7 @@ interface Challenge {
 }
 
 export default function Challenges() {
-  const { user, isAuthenticated } = useAuth();
+  const { user, isAuthenticated, token } = useAuth();
   const { toast } = useToast();
   const [selectedType, setSelectedType] = useState("1v1");
   const [betAmount, setBetAmount] = useState("");
@@ -150,7 +150,7 @@ export default function Challenges() {
     try {
       const response = await fetch(`${funcUrls.content}?resource=challenges`, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', Authorization: `Bearer ${token}` },
         body: JSON.stringify({
           action: 'create',
           creator_id: user.id,
@@ -187,7 +187,7 @@ export default function Challenges() {
     try {
       const response = await fetch(`${funcUrls.content}?resource=challenges`, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', Authorization: `Bearer ${token}` },
         body: JSON.stringify({
           action: 'cancel',
           challenge_id: challengeId,
@@ -234,7 +234,7 @@ export default function Challenges() {
     try {
       const response = await fetch(`${funcUrls.content}?resource=challenges`, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', Authorization: `Bearer ${token}` },
         body: JSON.stringify({
           action: 'accept',
           challenge_id: challengeId,
@@ -52,7 +52,7 @@ export default function Login() {
       const data = await response.json();
 
       if (response.ok) {
-        login(data.user);
+        login(data.user, data.token);
         toast({
           title: "Успешный вход!",
           description: `Добро пожаловать, ${data.user.displayName}!`,
@@ -213,7 +213,7 @@ export default function Register() {
       const data = await response.json();
 
       if (response.ok) {
-        login(data.user);
+        login(data.user, data.token);
         toast({
           title: "Регистрация успешна!",
           description: `Добро пожаловать, ${data.user.displayName}!`,